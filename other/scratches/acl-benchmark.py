@@ -0,0 +1,77 @@
+# Times ACL membership checks on a large ban list, comparing the old linear scans with the precomputed lookups
+# Usage: python acl-benchmark.py [ban count] [global ban count] [online players]
+from uuid import uuid4
+import tempfile
+import time
+import sys
+import os
+
+import constants
+import acl
+
+
+# Old check_global_acl(), one list comprehension over the global ACL per rule
+def old_check_global_acl(global_acl, acl_rule):
+    acl_rule.set_scope(acl_rule.rule.lower() in [rule['name'].lower() for rule in global_acl[acl_rule.acl_group]])
+    return acl_rule
+
+# Old AclManager.rule_in_acl(), one scan over the list per lookup
+def old_rule_in_acl(rules, rule_name, list_type):
+    user = acl.get_uuid(rule_name)
+    for rule in rules[list_type]:
+        if user['uuid'] and rule.extra_data.get('uuid') == user['uuid']:
+            return rule
+        if user['name'].lower() == rule.rule.lower():
+            return rule
+
+
+if __name__ == '__main__':
+    ban_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    global_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    player_count = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    # Keep lookups local, every player below is already in the UUID database
+    acl.uuid_database = acl.UuidDatabase(os.path.join(tempfile.mkdtemp(), 'uuid-db.sqlite'))
+    constants.app_online = False
+
+    users = [{'uuid': str(uuid4()), 'name': f'Player_{x}'} for x in range(ban_count)]
+    acl.uuid_database.upsert(users)
+    global_acl = acl.GlobalAcl({'ops': [], 'bans': users[:global_count], 'wl': [], 'subnets': []})
+    print(f"{ban_count:,} bans, {global_count:,} global, {player_count} online players")
+
+    # Scoping every rule while loading banned-players.json
+    check_count = min(ban_count, 5000)
+    start = time.perf_counter()
+    for user in users[:check_count]:
+        old_check_global_acl(global_acl, acl.AclRule(user['name'], acl_group='bans'))
+    old_time = (time.perf_counter() - start) * ban_count / check_count
+    print(f"check_global_acl, old: {round(old_time, 2)}s (extrapolated from {check_count:,} rules)")
+
+    start = time.perf_counter()
+    rule_list = []
+    for user in users:
+        rule = acl.check_global_acl(global_acl, acl.AclRule(user['name'], acl_group='bans'))
+        rule.extra_data['uuid'] = user['uuid']
+        rule_list.append(rule)
+    print(f"check_global_acl, new: {round(time.perf_counter() - start, 2)}s")
+
+    # Checking the online players, like ServerObject.performance_stats() does every few seconds
+    acl_object = acl.AclManager.__new__(acl.AclManager)
+    acl_object._rule_index = {}
+    acl_object.rules = {'ops': [], 'bans': rule_list, 'wl': [], 'subnets': []}
+    online = [users[-x]['name'].lower() for x in range(1, player_count + 1)]
+
+    start = time.perf_counter()
+    for player in online:
+        old_rule_in_acl(acl_object.rules, player, 'bans')
+    print(f"rule_in_acl, old:      {round((time.perf_counter() - start) * 1000, 1)}ms")
+
+    start = time.perf_counter()
+    for player in online:
+        acl_object.rule_in_acl(player, 'bans')
+    print(f"rule_in_acl, cold:     {round((time.perf_counter() - start) * 1000, 1)}ms (includes building the index)")
+
+    start = time.perf_counter()
+    for player in online:
+        acl_object.rule_in_acl(player, 'bans')
+    print(f"rule_in_acl, warm:     {round((time.perf_counter() - start) * 1000, 1)}ms")
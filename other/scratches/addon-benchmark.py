@@ -0,0 +1,48 @@
+# Times add-on metadata scans over a folder of synthetic jars, cold with threads, cold with processes, and cached
+# Usage: python addon-benchmark.py "path/to/scratch/folder" [jar count]
+from zipfile import ZipFile
+import time
+import json
+import sys
+import os
+
+import constants
+import addons
+
+
+if __name__ == '__main__':
+    scratch_path = sys.argv[1]
+    jar_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    os.makedirs(scratch_path, exist_ok=True)
+
+    # Fabric-style jars with some padding classes, so opening the zip isn't free
+    for x in range(jar_count):
+        with ZipFile(os.path.join(scratch_path, f'test-mod-{x}.jar'), 'w') as jar_file:
+            jar_file.writestr('fabric.mod.json', json.dumps({
+                'id': f'test-mod-{x}', 'name': f'Test Mod {x}', 'authors': ['auto-mcs'],
+                'version': f'1.{x}.0+1.20.1', 'description': 'Synthetic mod for benchmarking'
+            }))
+            for y in range(50):
+                jar_file.writestr(f'com/example/mod{x}/Class{y}.class', os.urandom(2048))
+
+    addon_paths = sorted(os.path.join(scratch_path, file) for file in os.listdir(scratch_path) if file.endswith('.jar'))
+    print(f"{len(addon_paths)} jars, {os.cpu_count()} cores")
+
+    # Threads only
+    threshold = addons.process_scan_threshold
+    addons.process_scan_threshold = len(addon_paths) + 1
+    start = time.perf_counter()
+    addons.scan_addon_metadata(addon_paths, 'fabric')
+    print(f"cold (threads):   {round(time.perf_counter() - start, 3)}s")
+
+    # Processes
+    addons.process_scan_threshold = threshold
+    start = time.perf_counter()
+    metadata = addons.scan_addon_metadata(addon_paths, 'fabric')
+    print(f"cold (processes): {round(time.perf_counter() - start, 3)}s")
+
+    # Cached, what enumerate_addons() does on every later open
+    constants.addon_cache.update({addons.addon_cache_key(addon_path): data for addon_path, data in metadata.items()})
+    start = time.perf_counter()
+    missing = [addon_path for addon_path in addon_paths if addons.addon_cache_key(addon_path) not in constants.addon_cache]
+    print(f"cached:           {round(time.perf_counter() - start, 3)}s ({len(missing)} misses)")
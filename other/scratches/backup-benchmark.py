@@ -0,0 +1,41 @@
+# Compares the old copy + "tar" back-up path against backup.write_archive() on a server folder
+# Compressed formats are run with 1 thread and with backup.compression_workers() threads, since the server stays in
+# "save-off" for as long as the archive is being written, the wall time is also the length of the save-off window
+# Usage: python backup-benchmark.py "path/to/server" "path/to/scratch/folder"
+import subprocess
+import shutil
+import time
+import sys
+import os
+
+import backup
+
+
+server_path = sys.argv[1]
+scratch_path = sys.argv[2]
+os.makedirs(scratch_path, exist_ok=True)
+
+file_list = backup.list_archive_files(server_path)
+total_mb = sum(item[2] for item in file_list) / 1048576
+print(f"Source: {len(file_list)} entries, {round(total_mb, 2)} MB")
+
+
+# Previous implementation: copy the whole server, then archive the copy
+copy_path = os.path.join(scratch_path, 'copy-bkup')
+start = time.perf_counter()
+shutil.copytree(server_path, copy_path)
+subprocess.run(f'tar --exclude="*session.lock" -cf "{os.path.join(scratch_path, "copy.amb")}" .', shell=True, cwd=copy_path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+elapsed = time.perf_counter() - start
+shutil.rmtree(copy_path)
+print(f"copy + tar:    {round(elapsed, 2)}s, {round(total_mb / elapsed, 2)} MB/s")
+
+
+# Streaming implementation
+workers = backup.compression_workers()
+for compression in backup.compression_types:
+    if compression == 'zstd' and not backup.zstandard:
+        continue
+    for thread_count in ([1] if compression == 'none' or workers == 1 else [1, workers]):
+        archive_path = os.path.join(scratch_path, f'stream-{compression}-{thread_count}.amb')
+        stats = backup.write_archive(server_path, archive_path, compression, file_list=file_list, workers=thread_count)
+        print(f"stream ({compression}, {thread_count} thread(s)): {round(stats['seconds'], 2)}s save-off window, {stats['throughput']} MB/s, {round(os.path.getsize(archive_path) / 1048576, 2)} MB on disk")
@@ -0,0 +1,77 @@
+# Times and measures IP ban checks on large subnet lists, comparing the old expanded address list with acl.IpRuleSet
+# Usage: python ip-benchmark.py [/16 subnet count] [whitelist count] [lookups]
+from concurrent.futures import ThreadPoolExecutor
+import tracemalloc
+import ipaddress
+import random
+import time
+import sys
+
+import acl
+
+
+# Old gen_iplist(), every address in every subnet as a string, with whitelists removed one address at a time
+def old_gen_iplist(rule_list):
+    final_list = []
+
+    def iter_network(network_addr):
+        network_object = ipaddress.IPv4Network(network_addr)
+        return [str(ip) for ip in network_object if str(ip) not in [str(network_object.network_address), str(network_object.broadcast_address)]]
+
+    def check_wl(addr):
+        for ip in (iter_network(addr) if "/" in addr else [addr]):
+            if ip in final_list:
+                final_list.remove(ip)
+
+    with ThreadPoolExecutor(max_workers=15) as pool:
+        pool.map(lambda network: final_list.extend(iter_network(network)), [rule for rule in rule_list if "!w" not in rule])
+    with ThreadPoolExecutor(max_workers=15) as pool:
+        pool.map(check_wl, [rule.replace("!w", "") for rule in rule_list if "!w" in rule])
+    return final_list
+
+# Runs func() and returns (result, seconds, peak MB)
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1048576
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == '__main__':
+    subnet_count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    whitelist_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    lookup_count = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+
+    random.seed(0)
+    rule_list = [f'10.{x}.0.0/16' for x in range(subnet_count)]
+    rule_list.extend(f'!w10.{random.randrange(subnet_count)}.{random.randrange(256)}.{random.randrange(256)}' for x in range(whitelist_count))
+    lookups = [f'10.{random.randrange(subnet_count + 1)}.{random.randrange(256)}.{random.randrange(256)}' for x in range(lookup_count)]
+    print(f"{subnet_count} /16 subnets, {whitelist_count} whitelisted IPs, {lookup_count} lookups")
+
+    old_list, old_build, old_peak = measure(lambda: old_gen_iplist(rule_list))
+    start = time.perf_counter()
+    old_hits = sum(ip in old_list for ip in lookups[:100])
+    old_lookup = (time.perf_counter() - start) / 100 * 1000000
+    print(f"gen_iplist: {round(old_build, 2)}s to build, {round(old_peak, 1)}MB peak, {round(old_lookup, 1)}us per lookup")
+
+    rule_set, new_build, new_peak = measure(lambda: acl.IpRuleSet(rule_list))
+    start = time.perf_counter()
+    new_hits = sum(ip in rule_set for ip in lookups)
+    new_lookup = (time.perf_counter() - start) / lookup_count * 1000000
+    print(f"IpRuleSet:  {round(new_build * 1000, 2)}ms to build, {round(new_peak, 3)}MB peak, {round(new_lookup, 2)}us per lookup ({len(rule_set.ranges())} ranges)")
+
+    # Both should agree on every address
+    assert len(rule_set) == len(old_list)
+    assert [ip in rule_set for ip in lookups[:100]] == [ip in old_list for ip in lookups[:100]]
+
+    # Large lists the old version couldn't handle, a thousand /16s with whitelisted /24s
+    rule_list = [f'{x // 256 + 1}.{x % 256}.0.0/16' for x in range(1000)]
+    rule_list.extend(f'!w{x // 256 + 1}.{x % 256}.{random.randrange(256)}.0/24' for x in range(0, 1000, 2))
+    rule_set, new_build, new_peak = measure(lambda: acl.IpRuleSet(rule_list))
+    start = time.perf_counter()
+    for x in range(100000):
+        rule_set.is_banned(random.getrandbits(32))
+    print(f"1000 /16s:  {round(new_build * 1000, 2)}ms to build, {round(new_peak, 3)}MB peak, {round((time.perf_counter() - start) * 10, 2)}us per lookup, {len(rule_set):,} addresses")
@@ -0,0 +1,46 @@
+# Replays a captured 'latest.log' through ServerObject.update_log() and reports lines per second
+# Usage: python log-benchmark.py "path/to/latest.log" [passes]
+# Run it against an older checkout to compare before and after numbers
+import time
+import sys
+
+import svrmgr
+from svrmgr import ServerObject
+
+
+class _AclStub():
+    def reload_list(self, *a):
+        pass
+
+    def _process_log(self, *a):
+        pass
+
+
+log_path = sys.argv[1]
+passes = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+with open(log_path, 'rb') as f:
+    lines = f.read().splitlines(keepends=True)
+
+# Don't hit the network for player UUIDs during the replay
+svrmgr.get_uuid = lambda *a: {'uuid': None}
+
+# Build a bare ServerObject without touching the server folder
+server_obj = ServerObject.__new__(ServerObject)
+server_obj.name = 'log-benchmark'
+server_obj.version = '1.20.4'
+server_obj.max_log_size = 800
+server_obj.script_object = None
+server_obj.acl = _AclStub()
+server_obj.check_for_deadlock = lambda *a: None
+
+total = 0
+start = time.perf_counter()
+for x in range(passes):
+    server_obj.run_data = {'log': svrmgr.LogBuffer(server_obj.max_log_size), 'player-list': {}, 'process-hooks': []}
+    for line in lines:
+        server_obj.update_log(line)
+    total += len(lines)
+elapsed = time.perf_counter() - start
+
+print(f"update_log(): {total} lines in {round(elapsed, 3)}s --> {round(total / elapsed)} lines/s")
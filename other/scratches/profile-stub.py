@@ -0,0 +1,111 @@
+# Local stand-in for the Mojang profile API to test acl.resolve_users() without hitting the real one
+# Half of the names are "offline-mode" players that don't exist, so the second pass should only use the negative cache
+# Usage: python profile-stub.py [name count] [latency in ms]
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+import tempfile
+import hashlib
+import time
+import json
+import sys
+import os
+
+import constants
+import acl
+
+
+request_count = 0
+
+# Players with an even number exist online
+def profile(name):
+    if int(name.rsplit('_', 1)[-1]) % 2:
+        return None
+    return {'id': hashlib.md5(name.lower().encode()).hexdigest(), 'name': name}
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.05
+    uuids = {}
+
+    def send_json(self, data, code=200):
+        content = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    # POST /profiles/minecraft, up to 10 names at once
+    def do_POST(self):
+        global request_count
+        request_count += 1
+        time.sleep(self.latency)
+
+        name_list = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if len(name_list) > 10:
+            return self.send_json({'error': 'Too many names'}, 400)
+
+        profiles = [p for p in map(profile, name_list) if p]
+        self.uuids.update({p['id']: p for p in profiles})
+        self.send_json(profiles)
+
+    # GET /session/minecraft/profile/<uuid>
+    def do_GET(self):
+        global request_count
+        request_count += 1
+        time.sleep(self.latency)
+
+        found = self.uuids.get(self.path.rsplit('/', 1)[-1])
+        if not found:
+            self.send_response(204)
+            self.end_headers()
+            return
+        self.send_json(found)
+
+    def log_message(self, *a):
+        pass
+
+
+if __name__ == '__main__':
+    name_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    StubHandler.latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    Thread(target=httpd.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{httpd.server_address[1]}'
+
+    # Use a scratch database and the stub API, and lift the rate limit so only the batching is measured
+    acl.uuid_database = acl.UuidDatabase(os.path.join(tempfile.mkdtemp(), 'uuid-db.sqlite'))
+    acl.profile_api = acl.ProfileApi(f'{base_url}/profiles/minecraft', f'{base_url}/session/minecraft/profile/{{}}')
+    acl.profile_limiter = acl.RateLimiter(100000, 1, burst=100)
+    acl.update_global_names = lambda renamed: None
+    constants.app_online = True
+
+    name_list = [f'Player_{x}' for x in range(name_count)]
+    print(f"{name_count} names, {int(StubHandler.latency * 1000)}ms latency")
+
+    start = time.perf_counter()
+    resolved = acl.resolve_users(name_list)
+    found = len([user for user in resolved.values() if user['uuid']])
+    print(f"cold:      {round(time.perf_counter() - start, 2)}s ({request_count} requests, {found} found)")
+
+    # Found users come from the database, missing ones from the negative cache
+    request_count = 0
+    start = time.perf_counter()
+    acl.resolve_users(name_list)
+    print(f"warm:      {round(time.perf_counter() - start, 2)}s ({request_count} requests)")
+
+    # UUIDs go through the single profile endpoint
+    request_count = 0
+    uuid_list = [hashlib.md5(f'player_{x}'.encode()).hexdigest() for x in range(name_count, name_count + 20)]
+    start = time.perf_counter()
+    acl.resolve_users(uuid_list)
+    print(f"uuids:     {round(time.perf_counter() - start, 2)}s ({request_count} requests)")
+
+    # The real limit, 600 requests every 10 minutes with a burst of 10
+    acl.profile_limiter = acl.RateLimiter(acl.profile_rate_limit, acl.profile_rate_period)
+    request_count = 0
+    start = time.perf_counter()
+    acl.resolve_users([f'Player_{x}' for x in range(name_count, name_count + 150)])
+    print(f"limited:   {round(time.perf_counter() - start, 2)}s ({request_count} requests)")
+
+    httpd.shutdown()
@@ -0,0 +1,89 @@
+# Times add-on update checks across many servers against a local mock API with artificial latency
+# Compares the old sequential per-server walk with addons.check_updates(), cold and with ETag revalidation
+# Usage: python update-benchmark.py [server count] [add-ons per server] [latency in ms]
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from types import SimpleNamespace
+from threading import Thread
+import random
+import time
+import json
+import sys
+
+import constants
+import addons
+
+
+request_count = 0
+
+class MockHandler(BaseHTTPRequestHandler):
+    latency = 0.05
+
+    def do_GET(self):
+        global request_count
+        request_count += 1
+        time.sleep(self.latency)
+
+        etag = '"1.2.0"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        content = json.dumps({'version': '1.2.0'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *a):
+        pass
+
+
+if __name__ == '__main__':
+    server_count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    addon_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    MockHandler.latency = (int(sys.argv[3]) if len(sys.argv) > 3 else 50) / 1000
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+    Thread(target=httpd.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{httpd.server_address[1]}'
+
+    # Route lookups to the mock API, everything else in check_updates() stays the same
+    def get_update_url(addon, new_version, force_type=None):
+        data = constants.get_url(f'{base_url}/project/{addon.id}?version={new_version}', return_response=True).json()
+        return addons.AddonWebObject(addon.name, addon.type, addon.author, addon.subtitle, None, addon.id, data['version'])
+    addons.get_update_url = get_update_url
+    constants.app_online = True
+
+    # Servers share most of their mods, and every mod is up-to-date so nothing returns early
+    random.seed(0)
+    pool = [SimpleNamespace(id=f'mod-{x}', name=f'Mod {x}', author='auto-mcs', type='fabric', subtitle='', addon_version='1.2.0') for x in range(addon_count * 3)]
+    server_list = [({'name': f'Server {x}', 'type': 'fabric', 'version': '1.20.1'}, random.sample(pool, addon_count)) for x in range(server_count)]
+    unique = len({addons.update_lookup_key(addon, properties) for properties, addon_list in server_list for addon in addon_list})
+    print(f"{server_count} servers, {addon_count} add-ons each, {unique} unique lookups, {int(MockHandler.latency * 1000)}ms latency")
+
+    # Old behavior, one request at a time for every add-on on every server
+    constants.url_cache.clear()
+    start = time.perf_counter()
+    for server_properties, addon_list in server_list:
+        for addon in addon_list:
+            addons.latest_addon_version(addons.update_lookup_key(addon, server_properties), addon, server_properties)
+    print(f"sequential:    {round(time.perf_counter() - start, 2)}s ({request_count} requests)")
+
+    # Bulk check, cold
+    constants.url_cache.clear()
+    request_count = 0
+    start = time.perf_counter()
+    addons.check_updates(server_list)
+    print(f"bulk (cold):   {round(time.perf_counter() - start, 2)}s ({request_count} requests)")
+
+    # Bulk check again, the mock API answers with 304 for cached ETags
+    request_count = 0
+    start = time.perf_counter()
+    addons.check_updates(server_list)
+    print(f"bulk (cached): {round(time.perf_counter() - start, 2)}s ({request_count} requests)")
+
+    httpd.shutdown()
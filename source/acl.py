@@ -1,14 +1,19 @@
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime as dt
 from urllib.request import urlopen
+from bisect import bisect_right
 from copy import deepcopy
+from uuid import UUID
 from glob import glob
 import json_repair
 import threading
+import requests
 import ipaddress
 import constants
+import sqlite3
 import socket
 import json
+import time
 import re
 import os
 
@@ -19,9 +24,305 @@ from amscript import PlayerScriptObject
 # ----------------------------------------------- Global Variables -----------------------------------------------------
 
 cache_folder = constants.cacheDir
-uuid_db = os.path.join(cache_folder, "uuid-db.json")
+uuid_db = os.path.join(cache_folder, "uuid-db.sqlite")
 global_acl_file = os.path.join(constants.configDir, "global-acl.json")
 
+# Profile lookups are shared by every server, Mojang allows about 600 requests every 10 minutes
+profile_rate_limit = 600
+profile_rate_period = 600
+
+# Names and UUIDs that weren't found (like offline-mode players) aren't looked up again until this many seconds pass
+profile_miss_ttl = 86400
+
+# ----------------------------------------------- UUID Database --------------------------------------------------------
+
+# Every player seen across all servers, indexed by UUID, lower-case name, and IP address as an integer
+# Each user is {'uuid': UUID, 'name': Name, ...}, and anything other than the UUID and name is stored as JSON
+# Lookups are a single indexed query instead of parsing the whole file, and upserts are written in one transaction
+class UuidDatabase():
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = None
+        self._lock = threading.RLock()
+
+    # Normalizes a UUID so lookups match with or without dashes
+    @staticmethod
+    def _uuid_key(uuid: str):
+        return uuid.lower().replace('-', '').strip()
+
+    # Converts 'latest-ip' to an integer for range queries, or None if it isn't an IPv4 address
+    @staticmethod
+    def _ip_key(ip: str):
+        try:
+            return int(ipaddress.IPv4Address(ip.split(':')[0].strip()))
+        except (ValueError, AttributeError):
+            return None
+
+    @staticmethod
+    def _to_dict(row):
+        user = {'uuid': row[0], 'name': row[1]}
+        user.update(json.loads(row[2]))
+        return user
+
+    def _connect(self):
+        if self._connection:
+            return self._connection
+
+        new_database = not os.path.isfile(self.path)
+        constants.folder_check(os.path.dirname(self.path))
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        with connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS users (uuid_key TEXT PRIMARY KEY, uuid TEXT NOT NULL, name TEXT NOT NULL, name_key TEXT NOT NULL, ip INTEGER, data TEXT NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS users_name ON users (name_key)')
+            connection.execute('CREATE INDEX IF NOT EXISTS users_ip ON users (ip)')
+            connection.execute('CREATE TABLE IF NOT EXISTS missing (key TEXT PRIMARY KEY, checked REAL NOT NULL)')
+        self._connection = connection
+
+        if new_database:
+            self.import_legacy()
+        return connection
+
+    # Name or UUID --> {'uuid': UUID, 'name': Name, ...} or None
+    def get(self, user: str):
+        user = user.strip()
+        if not user:
+            return None
+
+        with self._lock:
+            connection = self._connect()
+            if len(user.replace('-', '')) == 32:
+                row = connection.execute('SELECT uuid, name, data FROM users WHERE uuid_key = ?', (self._uuid_key(user),)).fetchone()
+                if row:
+                    return self._to_dict(row)
+
+            row = connection.execute('SELECT uuid, name, data FROM users WHERE name_key = ? ORDER BY rowid DESC', (user.lower(),)).fetchone()
+            return self._to_dict(row) if row else None
+
+    # Returns the UUIDs from uuid_list that are already stored
+    def known(self, uuid_list: list):
+        keys = {self._uuid_key(uuid): uuid for uuid in uuid_list if uuid}
+        key_list = list(keys)
+        found = set()
+
+        with self._lock:
+            connection = self._connect()
+            for x in range(0, len(key_list), 500):
+                chunk = key_list[x:x + 500]
+                query = f'SELECT uuid_key FROM users WHERE uuid_key IN ({",".join("?" * len(chunk))})'
+                found.update(keys[row[0]] for row in connection.execute(query, chunk))
+        return found
+
+    # Users with a 'latest-ip' inside of an IPv4Network
+    def in_network(self, network: ipaddress.IPv4Network):
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT uuid, name, data FROM users WHERE ip BETWEEN ? AND ?',
+                (int(network.network_address), int(network.broadcast_address))
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def count_network(self, network: ipaddress.IPv4Network):
+        with self._lock:
+            return self._connect().execute(
+                'SELECT COUNT(*) FROM users WHERE ip BETWEEN ? AND ?',
+                (int(network.network_address), int(network.broadcast_address))
+            ).fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    # Adds or merges users in one transaction, and returns [(old name, user), ...] for users that were renamed
+    def upsert(self, user_list: dict or list):
+        if isinstance(user_list, dict):
+            user_list = [user_list]
+
+        renamed = []
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                for user in user_list:
+                    if not (user.get('uuid') and user.get('name')):
+                        continue
+
+                    uuid_key = self._uuid_key(user['uuid'])
+                    row = connection.execute('SELECT uuid, name, data FROM users WHERE uuid_key = ?', (uuid_key,)).fetchone()
+                    final_user = self._to_dict(row) if row else {}
+                    final_user.update(user)
+
+                    if row and row[1] != final_user['name']:
+                        renamed.append((row[1], final_user))
+
+                    data = {key: value for key, value in final_user.items() if key not in ('uuid', 'name')}
+                    connection.execute(
+                        'INSERT OR REPLACE INTO users (uuid_key, uuid, name, name_key, ip, data) VALUES (?, ?, ?, ?, ?, ?)',
+                        (uuid_key, final_user['uuid'], final_user['name'], final_user['name'].lower(), self._ip_key(final_user.get('latest-ip')), json.dumps(data))
+                    )
+                    connection.execute('DELETE FROM missing WHERE key IN (?, ?)', (uuid_key, final_user['name'].lower()))
+
+        return renamed
+
+    # Normalizes a name or UUID for the "missing" table
+    def _missing_key(self, user: str):
+        return self._uuid_key(user) if len(user.replace('-', '')) == 32 else user.lower().strip()
+
+    # Returns the users from user_list that weren't found online in the last "ttl" seconds
+    def missing(self, user_list: list, ttl: int):
+        keys = {self._missing_key(user): user for user in user_list}
+        key_list = list(keys)
+        found = set()
+
+        with self._lock:
+            connection = self._connect()
+            for x in range(0, len(key_list), 500):
+                chunk = key_list[x:x + 500]
+                query = f'SELECT key FROM missing WHERE checked > ? AND key IN ({",".join("?" * len(chunk))})'
+                found.update(keys[row[0]] for row in connection.execute(query, [time.time() - ttl] + chunk))
+        return found
+
+    # Remembers users that don't exist online
+    def add_missing(self, user_list: list):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO missing (key, checked) VALUES (?, ?)', [(self._missing_key(user), now) for user in user_list])
+
+    # Imports 'uuid-db.json' and any 'uuid-temp' files left behind by older versions
+    def import_legacy(self):
+        legacy_path = os.path.join(os.path.dirname(self.path), 'uuid-db.json')
+        temp_folder = os.path.join(os.path.dirname(self.path), 'uuid-temp')
+        user_list = []
+
+        if os.path.isfile(legacy_path):
+            try:
+                with open(legacy_path, 'r') as f:
+                    content = f.read()
+                try:
+                    user_list = json.loads(content)
+                except:
+
+                    # If failure, try to repair the json file
+                    print("Attempting to fix 'uuid-db.json' due to formatting error")
+                    user_list = json_repair.loads(content) or []
+            except OSError:
+                pass
+
+        for item in glob(os.path.join(temp_folder, 'uuid-*.json')):
+            try:
+                with open(item, 'r') as f:
+                    user_list.append(json.load(f))
+            except Exception as e:
+                if constants.debug:
+                    print(e)
+
+        try:
+            self.upsert([user for user in user_list if isinstance(user, dict)])
+        except sqlite3.Error as e:
+            if constants.debug:
+                print(f"UUID database: couldn't import '{legacy_path}': {e}")
+            return
+
+        if os.path.isfile(legacy_path):
+            os.remove(legacy_path)
+        constants.safe_delete(temp_folder)
+
+uuid_database = UuidDatabase(uuid_db)
+
+# --------------------------------------------- Profile Resolution -----------------------------------------------------
+
+# Raised by ProfileApi when the API asks to slow down
+class RateLimited(Exception):
+    def __init__(self, retry_after=60):
+        super().__init__(f"Rate limited for {retry_after}s")
+        self.retry_after = retry_after
+
+# Token bucket shared by every lookup, acquire() blocks until a request is allowed
+class RateLimiter():
+
+    def __init__(self, rate: int, period: int, burst=10):
+        self.rate = rate
+        self.period = period
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate / self.period)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) * self.period / self.rate
+            time.sleep(delay)
+
+    # Stops every request for "seconds"
+    def pause(self, seconds: float):
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate / self.period
+
+# Mojang-style profile API, point the URLs somewhere else (or subclass it) and assign it to "profile_api" to swap it out
+# lookup_names() takes up to "batch_size" names per request, and lookup_uuid() takes one UUID
+class ProfileApi():
+
+    def __init__(self, names_url='https://api.mojang.com/profiles/minecraft', uuid_url='https://sessionserver.mojang.com/session/minecraft/profile/{}', batch_size=10):
+        self.names_url = names_url
+        self.uuid_url = uuid_url
+        self.batch_size = batch_size
+        self._session = None
+
+    def _request(self, method: str, url: str, **kwargs):
+        if not self._session:
+            self._session = requests.Session()
+            self._session.headers['User-Agent'] = f'auto-mcs/{constants.app_version}'
+
+        response = self._session.request(method, url, timeout=10, **kwargs)
+        if response.status_code == 429:
+            try:
+                raise RateLimited(float(response.headers.get('Retry-After', 60)))
+            except ValueError:
+                raise RateLimited()
+        return response
+
+    @staticmethod
+    def _to_dict(profile: dict):
+        return {'uuid': str(UUID(profile['id'])), 'name': profile['name']}
+
+    # [Name, ...] --> [{'uuid': UUID, 'name': Name}, ...], names that don't exist are left out
+    def lookup_names(self, name_list: list):
+        response = self._request('POST', self.names_url, json=name_list)
+        response.raise_for_status()
+        return [self._to_dict(profile) for profile in response.json()]
+
+    # UUID --> {'uuid': UUID, 'name': Name}, or None if it doesn't exist
+    def lookup_uuid(self, uuid: str):
+        response = self._request('GET', self.uuid_url.format(uuid.replace('-', '')))
+        if response.status_code in (204, 400, 404):
+            return None
+        response.raise_for_status()
+        return self._to_dict(response.json())
+
+profile_api = ProfileApi()
+profile_limiter = RateLimiter(profile_rate_limit, profile_rate_period)
+
+# Runs func(*args) through the rate limit, and waits out a "429 Too Many Requests" once before giving up
+def _limited_request(func, *args):
+    for attempt in range(2):
+        profile_limiter.acquire()
+        try:
+            return func(*args)
+        except RateLimited as e:
+            profile_limiter.pause(e.retry_after)
+            if attempt:
+                raise
+
 # ------------------------------------------------- ACL Objects --------------------------------------------------------
 
 # Used to house an ACL rule, stored in AclManager lists
@@ -70,6 +371,7 @@ class AclManager():
 
         # Check if config file exists to determine new server status
         self._new_server = (not constants.server_path(server_name, constants.server_ini))
+        self._rule_index = {}
 
         self._server = dump_config(server_name, self._new_server)
         self.rules = self._load_acl(new_server=self._new_server)
@@ -100,54 +402,18 @@ class AclManager():
 
             playerdata_list.append(acl_object)
 
-        # Function to process playerdata in threads
-        def iter_playerdata(player):
-
-            player_info = get_uuid(player)
-
-            if player_info:
-                add_user(player_info)
-
-        # Function to process usercache.json file in threads
-        def iter_usercache(item):
-
-            # if usercache exists
-            if usercache:
-
-                player_info = {
-                    "uuid": f"{item['uuid']}",
-                    "name": f"{item['name']}"
-                }
-
-                add_user(player_info)
-
-                if item['uuid'] in uuid_list:
-                    return player_info
-
-                else:
-                    temp_folder = os.path.join(cache_folder, 'uuid-temp')
-                    constants.folder_check(temp_folder)
-
-                    with open(
-                        os.path.join(temp_folder, f"uuid-{item['uuid'].lower().replace('-', '')}.json"),
-                        "w"
-                    ) as user_file:
-
-                        user_file.write(json.dumps(player_info, indent=2))
-
-            else:
-                iter_playerdata(item)
+        # Resolves playerdata file names in batches
+        def add_playerdata(player_list):
+            for player_info in resolve_users(player_list).values():
+                if player_info['name']:
+                    add_user(player_info)
 
 
         # Check cached world playerdata for old versions
         if constants.version_check(version, "<", "1.8"):
             data_path = os.path.join(server_path, server_world, 'players')
 
-            with ThreadPoolExecutor(max_workers=15) as pool:
-                pool.map(
-                    iter_playerdata,
-                    [os.path.basename(item).lower().split(".dat")[0] for item in glob(os.path.join(data_path, '*'))]
-                )
+            add_playerdata([os.path.basename(item).lower().split(".dat")[0] for item in glob(os.path.join(data_path, '*'))])
 
         # Check cached world playerdata for modern versions
         else:
@@ -172,17 +438,18 @@ class AclManager():
                 usercache = [os.path.basename(item).lower().split(".dat")[0] for item in glob(os.path.join(data_path, '*'))]
 
             if usercache:
-                try:
-                    with open(f"{cache_folder}\\uuid-db.json", "r") as f:
-                        db = json.load(f)
-                        uuid_list = [x['uuid'] for x in db]
-                except FileNotFoundError:
-                    uuid_list = []
 
-                with ThreadPoolExecutor(max_workers=15) as pool:
-                    pool.map(iter_usercache, usercache)
+                # Entries from usercache.json already have a name and UUID, so only new users are added to the database
+                cached_users = [{"uuid": f"{item['uuid']}", "name": f"{item['name']}"} for item in usercache if isinstance(item, dict)]
+                for player_info in cached_users:
+                    add_user(player_info)
+
+                known_users = uuid_database.known([user['uuid'] for user in cached_users])
+                update_global_names(uuid_database.upsert([user for user in cached_users if user['uuid'] not in known_users]))
+
+                # Playerdata files only have a UUID
+                add_playerdata([item for item in usercache if not isinstance(item, dict)])
 
-        concat_db()
         return playerdata_list
 
 
@@ -237,17 +504,7 @@ class AclManager():
                 user_dict['ip-geo'] = location
 
             if user_dict['name'] and user_dict['uuid']:
-                temp_folder = os.path.join(cache_folder, 'uuid-temp')
-                constants.folder_check(temp_folder)
-
-                with open(
-                    os.path.join(temp_folder, f"uuid-{user_dict['uuid'].lower().replace('-', '')}.json"),
-                    "w"
-                ) as f:
-
-                    f.write(json.dumps(user_dict, indent=2))
-
-            concat_db()
+                update_global_names(uuid_database.upsert(user_dict))
 
             # Update playerdata internally
             if log_object['logged-in']:
@@ -269,9 +526,9 @@ class AclManager():
         }
 
         try:
-            banned_ips = gen_iplist(self.rules['subnets'])
+            banned_ips = IpRuleSet(self.rules['subnets'])
         except AttributeError:
-            banned_ips = []
+            banned_ips = IpRuleSet()
 
         def create_list(list_name):
             sub_list = {'enabled': [], 'disabled': []}
@@ -439,7 +696,6 @@ class AclManager():
     def _process_query(self, search_list: str or list, list_type=None):
 
         final_list = {'global': [], 'local': []}
-        cache_lookup = None
 
         # Adds items to final_list without collisions
         def add_entry(rule):
@@ -502,19 +758,8 @@ class AclManager():
                 # Ignore IPs outside a ban list, else find a username in usercache.json
                 if list_type not in ['bans', 'subnets']:
 
-                    if not cache_lookup:
-                        with open(uuid_db, 'r') as f:
-                            cache_lookup = json.loads(f.read())
-
-                    for item in cache_lookup:
-                        try:
-                            found_ip = item['latest-ip'] if ":" not in item['latest-ip'] else item['latest-ip'].split(':')[0]
-
-                            if ipaddress.IPv4Address(found_ip) in ipaddress.ip_network(entry, False):
-                                add_entry(item['name'])
-
-                        except KeyError:
-                            pass
+                    for item in uuid_database.in_network(ipaddress.ip_network(entry, False)):
+                        add_entry(item['name'])
 
                     continue
 
@@ -609,18 +854,8 @@ class AclManager():
             display_data['ip_range'] = f"{ip_obj.network_address} - {ip_obj.broadcast_address}"
             display_data['subnet_mask'] = str(ip_obj.netmask)
 
-            # Check uuid-db for affected users
-            try:
-                with open(uuid_db, 'r') as f:
-                    for user in json.loads(f.read()):
-                        try:
-                            if ipaddress.IPv4Address(user['latest-ip'].split(':')[0]) in ip_obj:
-                                display_data['affected_users'] += 1
-                        except KeyError:
-                            continue
-
-            except FileNotFoundError:
-                pass
+            # Check the UUID database for affected users
+            display_data['affected_users'] += uuid_database.count_network(ip_obj)
 
             # Build AclRule object
             final_rule = AclRule(rule=rule_name, acl_group='view')
@@ -707,7 +942,7 @@ class AclManager():
 
                 # If new server, generate the rules and then check
                 elif self.rules['subnets']:
-                    banned_ips = gen_iplist(self.rules['subnets'])
+                    banned_ips = IpRuleSet(self.rules['subnets'])
 
                 if ip_test in banned_ips:
                     display_data['ip_ban'] = True
@@ -750,6 +985,28 @@ class AclManager():
         return final_rule
 
 
+    # Lower-case name and UUID lookups for self.rules[list_type]
+    # Rebuilt when the list is replaced, and cleared with self._invalidate_rules() when it's edited in place
+    def _get_rule_index(self, list_type: str):
+        rule_list = self.rules[list_type]
+        cached = self._rule_index.get(list_type)
+        if cached and cached[0] is rule_list:
+            return cached[1]
+
+        names = {}
+        uuids = {}
+        for rule in rule_list:
+            names.setdefault(rule.rule.lower(), rule)
+            if rule.extra_data.get('uuid'):
+                uuids.setdefault(rule.extra_data['uuid'], rule)
+
+        self._rule_index[list_type] = (rule_list, (names, uuids))
+        return names, uuids
+
+    def _invalidate_rules(self):
+        self._rule_index = {}
+
+
     # Checks if rule name is inside of self.rules[list_type]
     # Returns None or rule if found
     def rule_in_acl(self, rule_name: str, list_type: str):
@@ -758,29 +1015,17 @@ class AclManager():
         rule_name = rule_name.strip()
 
         if list_type in ['ops', 'bans', 'wl', 'subnets']:
+            names, uuids = self._get_rule_index(list_type)
+            found_rule = names.get(rule_name.lower())
 
-            if list_type == 'subnets':
-                for rule in self.rules[list_type]:
-                    if rule_name.lower() == rule.rule.lower():
-                        found_rule = rule
-                        break
-
-            else:
+            # Only resolve the player if the name doesn't match, in case they were renamed
+            if found_rule is None and list_type != 'subnets':
                 user = get_uuid(rule_name)
 
-                for rule in self.rules[list_type]:
-                    try:
-                        if user['uuid'] and rule.extra_data['uuid'] == user['uuid']:
-                            found_rule = rule
-                            break
-
-                    except KeyError:
-                        pass
-
-                    if found_rule is None:
-                        if user['name'].lower() == rule.rule.lower():
-                            found_rule = rule
-                            break
+                if user['uuid']:
+                    found_rule = uuids.get(user['uuid'])
+                if found_rule is None and user['name']:
+                    found_rule = names.get(user['name'].lower())
 
         return found_rule
 
@@ -1006,6 +1251,8 @@ class AclManager():
                             acl_object = AclRule(rule, acl_group='subnets')
                             self.rules['subnets'].append(check_global_acl(global_acl, acl_object))
 
+                        self._invalidate_rules()
+
 
                 # If rule is a player, edit list_type
                 else:
@@ -1022,6 +1269,8 @@ class AclManager():
 
                         self.rules[list_type].append(acl_object)
 
+                    self._invalidate_rules()
+
 
         # # Dirty fix to prevent IPs from filling ban list for some reason
         # if list_type == 'bans':
@@ -1050,6 +1299,7 @@ class AclManager():
             self.whitelist_player(', '.join([rule.rule for rule in self.rules['wl']]), force_version=self._server['version'], temp_server=new_server)
 
         self._new_server = new_server
+        self._invalidate_rules()
 
 # ---------------------------------------------- General Functions -----------------------------------------------------
 
@@ -1190,72 +1440,155 @@ def dump_config(server_name: str, new_server=False):
     return server_dict
 
 
-# Generates list of IP addresses from a list of AclRule rules
-# rule_list --> [for IP in subnet if not in whitelist]
-def gen_iplist(rule_list: list):
-
-    final_list = []
-
-    # Finds every address on a subnet
-    def iter_network(network_addr):
+# "1.2.3.4", "1.2.3.0/24", or "1.2.3.4-20" --> (first, last) as integers, or None if it's not valid
+# hosts_only leaves out the network and broadcast addresses of a subnet
+def ip_range(rule: str, hosts_only=False):
+    rule = rule.replace(' ', '').replace('!w', '')
 
-        ip, sm = network_addr.split("/")
-
-        if constants.check_ip(ip, False):
-            network_object = ipaddress.IPv4Network(network_addr)
-            return [str(ip) for ip in ipaddress.IPv4Network(network_addr, strict=False) if str(ip) not in [str(network_object.network_address), str(network_object.broadcast_address)]]
-
-
-    # Multithreaded iter_network to final list
-    def gen_range(network):
-        final_list.extend(iter_network(network))
-
-
-    # Multithreaded remove whitelists from final list
-    def check_wl(addr):
-
-        if "/" in addr:
-            for ip in iter_network(addr):
-                if ip in final_list:
-                    final_list.remove(ip)
+    try:
+        if '/' in rule:
+            network = ipaddress.IPv4Network(rule, strict=False)
+            first, last = int(network.network_address), int(network.broadcast_address)
+            if hosts_only and network.prefixlen < 31:
+                first, last = first + 1, last - 1
+            return first, last
+
+        if '-' in rule:
+            ip_a, ip_b = rule.split('-', 1)
+            if ip_b.count('.') != 3:
+                ip_b = ip_a.rsplit('.', 1)[0] + '.' + ip_b
+            return tuple(sorted((int(ipaddress.IPv4Address(ip_a)), int(ipaddress.IPv4Address(ip_b)))))
+
+        address = int(ipaddress.IPv4Address(rule))
+        return address, address
+
+    except ValueError:
+        return None
 
-        if addr in final_list:
-            final_list.remove(addr)
 
+# Bans and "!w" whitelist exceptions from a list of AclRule rules (or strings), stored as sorted integer ranges
+# Whitelists are subtracted from the bans once, so checking an address is a binary search instead of a list scan
+class IpRuleSet():
+
+    def __init__(self, rule_list: list = (), hosts_only=True):
+        bans = []
+        whitelists = []
+
+        # Single IP bans keep their AclRule to preserve ban metadata
+        self._singles = {}
+
+        for rule in rule_list:
+            name = rule if isinstance(rule, str) else rule.rule
+            if '!w' in name:
+                ip_rule = ip_range(name)
+                if ip_rule:
+                    whitelists.append(ip_rule)
+                continue
+
+            ip_rule = ip_range(name, hosts_only=hosts_only)
+            if ip_rule:
+                bans.append(ip_rule)
+                if ip_rule[0] == ip_rule[1] and '/' not in name and '-' not in name:
+                    self._singles[ip_rule[0]] = rule
+
+        ranges = self._subtract(self._merge(bans), self._merge(whitelists))
+        self._starts = [first for first, last in ranges]
+        self._ends = [last for first, last in ranges]
+
+    # Sorts ranges and joins the ones that overlap or touch
+    @staticmethod
+    def _merge(ranges: list):
+        merged = []
+        for first, last in sorted(ranges):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        return merged
+
+    # Removes every range in "allowed" from "ranges", both have to be merged
+    @staticmethod
+    def _subtract(ranges: list, allowed: list):
+        final_ranges = []
+        x = 0
+
+        for first, last in ranges:
+            while x < len(allowed) and allowed[x][1] < first:
+                x += 1
+
+            y = x
+            while y < len(allowed) and allowed[y][0] <= last:
+                if allowed[y][0] > first:
+                    final_ranges.append((first, allowed[y][0] - 1))
+                first = max(first, allowed[y][1] + 1)
+                y += 1
+
+            if first <= last:
+                final_ranges.append((first, last))
+
+        return final_ranges
+
+    # IP address --> boolean
+    def is_banned(self, ip: str or int):
+        if not isinstance(ip, int):
+            try:
+                ip = int(ipaddress.IPv4Address(ip.split(':')[0].strip()))
+            except ValueError:
+                return False
 
-    # Run multithreaded functions
+        x = bisect_right(self._starts, ip) - 1
+        return x >= 0 and ip <= self._ends[x]
 
-    # List of strings
-    subnets = [x.rule for x in rule_list if ("/" in x.rule) and ("!w" not in x.rule)]
+    def __contains__(self, ip):
+        return self.is_banned(ip)
 
-    # List of strings
-    whitelists = [x.rule.replace("!w", "") for x in [x for x in rule_list if "!w" in x.rule]]
+    # Number of banned addresses
+    def __len__(self):
+        return sum(last - first + 1 for first, last in self.ranges())
 
-    # List of AclObjects
-    ip_list = [x for x in rule_list if (x.rule.count('.') == 3) and ("!w" not in x.rule) and ("/" not in x.rule)]
+    def ranges(self):
+        return list(zip(self._starts, self._ends))
 
+    # Yields every banned address for the server's IP ban list, one at a time
+    # Single IP bans are yielded as their AclRule, and everything else as a string
+    def iter_addresses(self):
+        for first, last in self.ranges():
+            for ip in range(first, last + 1):
+                yield self._singles.get(ip) or socket.inet_ntoa(ip.to_bytes(4, 'big'))
 
-    if subnets:
-        with ThreadPoolExecutor(max_workers=15) as pool:
-            pool.map(gen_range, subnets)
 
-    if ip_list:
-        no_object_list = list(tuple(final_list))
-        for addr in ip_list:
-            if addr.rule not in no_object_list:
-                final_list.append(addr if isinstance(addr, str) else addr.rule)
-                no_object_list.append(addr.rule)
+# Writes an ACL file next to its destination first and then swaps it in, so it's never read half-written
+def write_acl_file(path: str, content: str):
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "w") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+# Filters single IPs from a server's ban list against the rules in "banned-subnets.json"
+# An IP is listed on its own if it's outside of every subnet rule, and isn't the only address with a rule
+# [AclRule, ...] --> function(IP) --> boolean
+def ip_rule_filter(ip_rules: list):
+    addresses = {rule.rule.replace("!w", "") for rule in ip_rules}
+    networks = IpRuleSet([address for address in addresses if "/" in address], hosts_only=False)
+
+    def check_ip(ip: str):
+        if not addresses or ip in networks:
+            return False
+        return len(addresses) > 1 or ip not in addresses
 
-    if whitelists:
-        with ThreadPoolExecutor(max_workers=15) as pool:
-            pool.map(check_wl, whitelists)
+    return check_ip
 
-    # print(subnets, whitelists, ip_list)
-    # print(final_list)
 
-    # Note:  ip_list will mix strings and AclObjects to preserve ban metadata for singular IP bans,
-    # and strings to optimize speed/memory for calculating large subnets
-    return final_list
+# Generates list of IP addresses from a list of AclRule rules
+# rule_list --> [for IP in subnet if not in whitelist]
+# Note:  this builds every address, use IpRuleSet to check addresses
+def gen_iplist(rule_list: list):
+    return list(IpRuleSet(rule_list).iter_addresses())
 
 
 # Specifically for testing/viewing load_acl() objects
@@ -1302,55 +1635,62 @@ def check_online(user):
 # Retrieves and returns contents of global ACL
 def load_global_acl():
 
-    global_acl = {
+    global_acl = GlobalAcl({
         'ops': [],
         'bans': [],
         'wl': [],
         'subnets': []
-    }
+    })
 
     if os.path.isfile(global_acl_file):
         with open(global_acl_file, 'r') as f:
-            global_acl = json.load(f)
+            global_acl = GlobalAcl(json.load(f))
 
     return global_acl
 
 
+# Global ACL dict that keeps a set of lower-case names for each list, so check_global_acl() doesn't scan every rule
+# Call invalidate() after editing the lists in place
+class GlobalAcl(dict):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rule_sets = None
+
+    def rule_sets(self):
+        if self._rule_sets is None:
+            self._rule_sets = {list_type: {rule['name'].lower() for rule in self.get(list_type, []) if 'name' in rule} for list_type in ('ops', 'bans', 'wl')}
+            self._rule_sets['subnets'] = set(self.get('subnets', []))
+        return self._rule_sets
+
+    def invalidate(self):
+        self._rule_sets = None
+
+
 # Check if global_acl contains AclRule
 # global_acl, AclRule --> AclRule
 def check_global_acl(global_acl: dict, acl_rule: AclRule):
+    if not isinstance(global_acl, GlobalAcl):
+        global_acl = GlobalAcl(global_acl)
+    rule_sets = global_acl.rule_sets()
 
-    # Check OPs
-    if acl_rule.acl_group == "ops":
-        try:
-            acl_rule.set_scope(acl_rule.rule.lower() in [rule['name'].lower() for rule in global_acl["ops"]])
-        except KeyError:
-            pass
-
-    # Check banned users
-    elif acl_rule.acl_group == "bans":
-        try:
-            acl_rule.set_scope(acl_rule.rule.lower() in [rule['name'].lower() for rule in global_acl["bans"]])
-        except KeyError:
-            pass
-
-    # Check whitelisted users
-    elif acl_rule.acl_group == "wl":
-        try:
-            acl_rule.set_scope(acl_rule.rule.lower() in [rule['name'].lower() for rule in global_acl["wl"]])
-        except KeyError:
-            pass
+    # Check OPs, banned users, and whitelisted users
+    if acl_rule.acl_group in ("ops", "bans", "wl"):
+        acl_rule.set_scope(acl_rule.rule.lower() in rule_sets[acl_rule.acl_group])
 
     # Check banned IPs/subnets
     else:
-        acl_rule.set_scope(acl_rule.rule in global_acl["subnets"])
+        acl_rule.set_scope(acl_rule.rule in rule_sets["subnets"])
 
 
     return acl_rule
 
 
 # Adds rule list to global ACL, then to every server (use similar to the *_user functions)
-# add_global_rule("BlUe_KAZoo, kchicken, test", list_type="ops", remove=False) --> global_acl dict
+# add_global_rule("BlUe_KAZoo, kchicken, test", list_type="ops", remove=False) --> {
+#    'Server 1': {'running': bool, 'success': bool, 'error': str or None},
+#    ...
+# }
 # List Types: ops, bans, wl
 def add_global_rule(rule_list: str or list, list_type: str, remove=False):
 
@@ -1379,19 +1719,20 @@ def add_global_rule(rule_list: str or list, list_type: str, remove=False):
             op_user(server_name, name_list, remove=remove)
 
         if list_type == 'bans':
-            ban_user(server_name, name_list, remove=remove)
+            ban_user(server_name, name_list, remove=remove, reason='')
 
         if list_type == 'wl':
             wl_user(server_name, name_list, remove=remove)
 
 
     # Iterate over every user in rule_list and filter them to create final_rule_list
+    resolved = resolve_users([rule for rule in rule_list if rule.count(".") != 3])
     for rule in rule_list:
 
         if rule.count(".") == 3:
             user_info = {'uuid': None, 'name': rule}
         else:
-            user_info = get_uuid(rule)
+            user_info = resolved[rule]
             user_info = {'uuid': user_info['uuid'], 'name': user_info['name']}
 
         # Only remove rules that already exist
@@ -1417,6 +1758,31 @@ def add_global_rule(rule_list: str or list, list_type: str, remove=False):
                 final_rule_list.append(user_info)
 
 
+    # Nothing to propagate if every rule is already (or no longer) global
+    if not final_rule_list:
+        return {}
+
+
+    # Apply the delta to every server at once, before the global ACL is written so that load_acl() doesn't merge the new
+    # rules in early, and running servers still get the live commands. Each server's files are replaced atomically
+    name_list = ', '.join([rule['name'] for rule in final_rule_list])
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(20, len(server_list)))) as pool:
+        futures = {pool.submit(iter_server, server_name): server_name for server_name in server_list}
+        for future in as_completed(futures):
+            server_name = futures[future]
+            server_obj = constants.server_manager.running_servers.get(server_name)
+            results[server_name] = {'running': bool(server_obj and server_obj.running), 'success': True, 'error': None}
+
+            try:
+                future.result()
+            except Exception as e:
+                results[server_name]['success'] = False
+                results[server_name]['error'] = str(e)
+                if constants.debug:
+                    print(f"Couldn't apply global {list_type} to '{server_name}': {e}")
+
+
     # Apply rules to global_acl and write file
     for rule in final_rule_list:
         if remove:
@@ -1431,203 +1797,145 @@ def add_global_rule(rule_list: str or list, list_type: str, remove=False):
             else:
                 global_acl[list_type].append(rule)
 
+    global_acl.invalidate()
+
 
     # Write to global acl file
     constants.folder_check(constants.configDir)
-    with open(global_acl_file, "w") as f:
-        f.write(json.dumps(global_acl, indent=2))
+    write_acl_file(global_acl_file, json.dumps(global_acl, indent=2))
 
-
-    # Thread rule processing for all servers
-    name_list = ', '.join([rule['name'] for rule in final_rule_list])
-    with ThreadPoolExecutor(max_workers=20) as pool:
-        pool.map(iter_server, server_list)
-
-
-    # print(global_acl)
-    concat_db()
-    return global_acl
+    return results
 
 
 
 # ------------------------------------------- ACL specific functions ---------------------------------------------------
 
-# Name or UUID --> {'name': Name, 'uuid': UUID}
-def get_uuid(user: str):
-
-    found_item = False
-    if len(user.replace("-", "")) == 32:
-        final_dict = {'uuid': user, 'name': None}
-        user_is_uuid = True
-    else:
-        final_dict = {'uuid': None, 'name': user}
-        user_is_uuid = False
+# [Name or UUID, ...] --> {Name or UUID: {'name': Name, 'uuid': UUID}, ...}
+# Users that aren't in the UUID database are looked up in batches, and ones that don't exist online are remembered
+def resolve_users(user_list: list):
+    results = {}
+    unknown = []
 
+    # First, check if the users exist in the UUID database
+    for user in user_list:
+        key = user.strip()
+        if key in results:
+            continue
 
-    # First, check if the user exists in uuid-db.json
-    if os.path.exists(uuid_db):
         try:
-            with open(uuid_db, "r") as f:
-                content = f.read()
-                try:
-                    file = json.loads(content)
-                except:
+            item = uuid_database.get(key)
+        except sqlite3.Error as e:
+            if constants.debug:
+                print(f"UUID database: {e}")
+            item = None
 
-                    # If failure, try to repair the json file
-                    try:
-                        print("Attempting to fix 'uuid-db.json' due to formatting error")
-                        file = json_repair.loads(content)
-                        if not file:
-                            raise TypeError
-                    except:
-                        print("'uuid-db.json' reset due to formatting error")
-                        file = None
-        except OSError:
-            file = None
-
-        if file:
-            for item in file:
-                if (item['uuid'].lower() == user.lower()) or (item['name'].lower() == user.lower()):
-                    final_dict = item
-                    found_item = True
-
-
-    # If the user has not been found, check the internet
-    if (constants.app_online) and (not found_item):
-
-        try:
-            check_url = f"https://mcuuid.net/?q={user.strip()}"
-            soup = constants.get_url(check_url)
-
-            final_dict = {
-                'uuid': soup.find('input', id='results_id').get('value'),
-                'name': soup.find('input', id='results_username').get('value')
-            }
+        results[key] = item
+        if not item and key:
+            unknown.append(key)
 
-            if not final_dict['name'] and not user_is_uuid:
-                final_dict['name'] = user
 
-            if final_dict['name'] and final_dict['uuid']:
-                temp_folder = os.path.join(cache_folder, 'uuid-temp')
-                constants.folder_check(temp_folder)
-
-                with open(
-                    os.path.join(temp_folder, f"uuid-{final_dict['uuid'].lower().replace('-', '')}.json"),
-                    "w"
-                ) as f:
-
-                    f.write(json.dumps(final_dict, indent=2))
-
-        except ConnectionRefusedError:
-            pass
-
-    if final_dict['uuid'] is None:
-        final_dict['uuid'] = ""
-
-    return final_dict
-
-
-# Concatenates all files in ..\Cache\uuid-temp\* --> ..\Cache\uuid-db.json
-def concat_db(only_delete=False):
-
-    try:
-        temp_file = os.path.join(cache_folder, 'uuid-temp')
-        uuid_list = []
-        final_db = []
-        added_items = []
-
-
-        # Load current uuid-db.json into final_db
+    # If some users have not been found, check the profile API
+    if constants.app_online and unknown:
         try:
-            with open(uuid_db, "r") as f:
-                content = f.read()
-                try:
-                    current_db = json.loads(content)
-                except:
-
-                    # If failure, try to repair the json file
-                    try:
-                        print("Attempting to fix 'uuid-db.json' due to formatting error")
-                        current_db = json_repair.loads(content)
-                        if not current_db:
-                            raise TypeError
-                    except:
-                        print("'uuid-db.json' reset due to formatting error")
-                        current_db = {}
-                uuid_list = [item['uuid'] for item in current_db]
-
-        except OSError:
-            current_db = []
+            skip = uuid_database.missing(unknown, profile_miss_ttl)
+            unknown = [user for user in unknown if user not in skip]
+        except sqlite3.Error:
+            pass
 
-        final_db = current_db
+        name_list = [user for user in unknown if len(user.replace('-', '')) != 32]
+        uuid_list = [user for user in unknown if len(user.replace('-', '')) == 32]
+        batches = [name_list[x:x + profile_api.batch_size] for x in range(0, len(name_list), profile_api.batch_size)]
 
+        found = []
+        missing = []
+        def lookup_batch(batch):
+            try:
+                profiles = _limited_request(profile_api.lookup_names, batch)
+
+            # One invalid name rejects the whole batch, so split it until the invalid names are found and skip those
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or not 400 <= e.response.status_code < 500:
+                    raise
+                if len(batch) == 1:
+                    missing.extend(batch)
+                    return
+                lookup_batch(batch[:len(batch) // 2])
+                lookup_batch(batch[len(batch) // 2:])
+                return
 
-        # Iterate over every file in uuid-temp
-        if os.path.exists(temp_file):
-            for item in glob(os.path.join(temp_file, 'uuid-*.json')):
+            found.extend(profiles)
+            found_names = [profile['name'].lower() for profile in profiles]
+            missing.extend(name for name in batch if name.lower() not in found_names)
 
-                if not only_delete:
-                    try:
-                        with open(item, 'r') as f:
-                            user = json.load(f)
-                            added_items.append(user)
-
-                            if user['uuid'] in uuid_list:
-                                found_user = final_db[uuid_list.index(user['uuid'])]
-                                found_user['name'] = user['name']
-                                try:
-                                    found_user['latest-ip'] = user['latest-ip']
-                                    found_user['latest-login'] = user['latest-login']
-                                    found_user['ip-geo'] = user['ip-geo']
-                                except KeyError:
-                                    pass
-
-                            else:
-                                final_db.append(user)
-                                uuid_list = [item['uuid'] for item in final_db]
-                    except Exception as e:
-                        if constants.debug:
-                            print(e)
+        def lookup_uuid(uuid):
+            profile = _limited_request(profile_api.lookup_uuid, uuid)
+            if profile:
+                found.append(profile)
+            else:
+                missing.append(uuid)
 
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(lookup_batch, batch) for batch in batches]
+            futures.extend(pool.submit(lookup_uuid, uuid) for uuid in uuid_list)
+            for future in futures:
                 try:
-                    os.remove(item)
-                except PermissionError:
+                    future.result()
+                except Exception as e:
                     if constants.debug:
-                        print("Error: could not delete cache")
+                        print(f"Profile lookup failed: {e}")
 
-            with open(uuid_db, "w+") as f:
-                f.write(json.dumps(final_db, indent=2))
+        try:
+            update_global_names(uuid_database.upsert(found))
+            uuid_database.add_missing(missing)
+        except sqlite3.Error as e:
+            if constants.debug:
+                print(f"UUID database: {e}")
+
+        profiles = {}
+        for profile in found:
+            profiles[profile['name'].lower()] = profile
+            profiles[profile['uuid'].replace('-', '').lower()] = profile
+
+        for user in unknown:
+            results[user] = profiles.get(user.replace('-', '').lower() if len(user.replace('-', '')) == 32 else user.lower())
+
+
+    # Fill in whatever is left with the original input
+    final_dict = {}
+    for user in user_list:
+        item = results[user.strip()]
+        if not item:
+            item = {'uuid': user, 'name': None} if len(user.replace("-", "")) == 32 else {'uuid': None, 'name': user}
+        else:
+            item = dict(item)
 
-            constants.safe_delete(temp_file)
+        if item['uuid'] is None:
+            item['uuid'] = ""
+        final_dict[user] = item
 
+    return final_dict
 
-            # Check added_items against global ACL to update names
-            global_acl = load_global_acl()
-            added_uuid_list = [item['uuid'] for item in added_items]
 
-            for user in global_acl['ops']:
-                if user['uuid'] in added_uuid_list:
-                    updated_user = added_items[added_uuid_list.index(user['uuid'])]
-                    if user['name'] != updated_user['name']:
-                        add_global_rule(user['name'], list_type='ops', remove=True)
-                        add_global_rule(updated_user['name'], list_type='ops')
+# Name or UUID --> {'name': Name, 'uuid': UUID}
+def get_uuid(user: str):
+    return resolve_users([user])[user]
+
 
-            for user in global_acl['bans']:
-                if user['uuid'] in added_uuid_list:
-                    updated_user = added_items[added_uuid_list.index(user['uuid'])]
-                    if user['name'] != updated_user['name']:
-                        add_global_rule(user['name'], list_type='bans', remove=True)
-                        add_global_rule(updated_user['name'], list_type='bans')
+# Renames global rules for users that changed their name, from UuidDatabase.upsert()
+def update_global_names(renamed: list):
+    if not renamed:
+        return
 
-            for user in global_acl['wl']:
-                if user['uuid'] in added_uuid_list:
-                    updated_user = added_items[added_uuid_list.index(user['uuid'])]
-                    if user['name'] != updated_user['name']:
-                        add_global_rule(user['name'], list_type='wl', remove=True)
-                        add_global_rule(updated_user['name'], list_type='wl')
+    global_acl = load_global_acl()
+    renamed = {user['uuid']: user for old_name, user in renamed}
 
-    except FileNotFoundError:
-        pass
+    for list_type in ('ops', 'bans', 'wl'):
+        for user in global_acl[list_type]:
+            if user['uuid'] in renamed:
+                updated_user = renamed[user['uuid']]
+                if user['name'] != updated_user['name']:
+                    add_global_rule(user['name'], list_type=list_type, remove=True)
+                    add_global_rule(updated_user['name'], list_type=list_type)
 
 
 # Generates AclRule objects from server files
@@ -1651,9 +1959,6 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
     global_acl = load_global_acl()
     original_ip_rules = []
 
-    def finalize():
-        concat_db()
-
     # Check for subnets
     if (list_type == "subnets") or not list_type:
         final_path = os.path.join(server_path, "banned-subnets.json")
@@ -1664,9 +1969,11 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                     file_contents = json.load(f)
 
                     # Check that global rules are applied
+                    file_rules = set(file_contents)
                     for rule in global_acl['subnets']:
-                        if rule.lower().replace(" ", "") not in file_contents:
+                        if rule.lower().replace(" ", "") not in file_rules:
                             file_contents.append(rule.lower().replace(" ", ""))
+                            file_rules.add(rule.lower().replace(" ", ""))
 
                     if file_contents:
                         for subnet in file_contents:
@@ -1697,12 +2004,15 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                     file = f.read().splitlines()
 
                     # Check that global rules are applied
+                    file_names = set(file)
                     for rule in global_acl['ops']:
-                        if rule['name'].lower() not in file:
+                        if rule['name'].lower() not in file_names:
                             file.append(rule['name'].lower())
+                            file_names.add(rule['name'].lower())
 
+                    resolved = resolve_users([user.strip() for user in file])
                     for user in file:
-                        user = get_uuid(user.strip())
+                        user = resolved[user.strip()]
 
                         if len(user) != 0:
                             acl_object = check_global_acl(
@@ -1716,7 +2026,6 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                             server_acl['ops'].append(acl_object)
 
             if list_type == "ops":
-                finalize()
                 return server_acl['ops']
 
         # Check for bans
@@ -1730,12 +2039,15 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                     file = f.read().splitlines()
 
                     # Check that global rules are applied
+                    file_names = set(file)
                     for rule in global_acl['bans']:
-                        if rule['name'].lower() not in file:
+                        if rule['name'].lower() not in file_names:
                             file.append(rule['name'].lower())
+                            file_names.add(rule['name'].lower())
 
+                    resolved = resolve_users([user.strip() for user in file])
                     for user in file:
-                        user = get_uuid(user.strip())
+                        user = resolved[user.strip()]
 
                         if len(user) != 0:
                             acl_object = check_global_acl(
@@ -1749,7 +2061,6 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                             server_acl['bans'].append(acl_object)
 
             if list_type == "bans":
-                finalize()
                 return server_acl['bans']
 
         # Check for whitelist
@@ -1761,12 +2072,15 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                     file = f.read().splitlines()
 
                     # Check that global rules are applied
+                    file_names = set(file)
                     for rule in global_acl['wl']:
-                        if rule['name'].lower() not in file:
+                        if rule['name'].lower() not in file_names:
                             file.append(rule['name'].lower())
+                            file_names.add(rule['name'].lower())
 
+                    resolved = resolve_users([user.strip() for user in file])
                     for user in file:
-                        user = get_uuid(user.strip())
+                        user = resolved[user.strip()]
 
                         if len(user) != 0:
                             acl_object = check_global_acl(
@@ -1780,7 +2094,6 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                             server_acl['wl'].append(acl_object)
 
             if list_type == "wl":
-                finalize()
                 return server_acl['wl']
 
         # Check for banned IPs
@@ -1791,24 +2104,10 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                 with open(final_path, "r") as f:
                     file = f.read().splitlines()
 
+                    # IP rule determination logic
+                    check_ip = ip_rule_filter(original_ip_rules)
                     for user in file:
-
-                        valid_ip = False
-                        checked_ip = user
-
-                        # IP rule determination logic
-                        for rule in original_ip_rules:
-                            rule = rule.rule
-
-                            # Allow singular IP if it's not also whitelisted
-                            if rule.replace("!w", "") != checked_ip:
-                                valid_ip = True
-
-                            # Allow singular IP if it's not already in an IP range
-                            if "/" in rule:
-                                valid_ip = not in_subnet(checked_ip, rule.replace("!w", ""))
-                                if not valid_ip:
-                                    break
+                        valid_ip = check_ip(user)
 
                         if len(user) != 0 and valid_ip:
                             acl_object = check_global_acl(
@@ -1819,7 +2118,6 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                             server_acl['subnets'].append(acl_object)
 
             if list_type == "subnets":
-                finalize()
                 return server_acl['subnets']
 
 
@@ -1838,9 +2136,11 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                         file = []
 
                     # Check that global rules are applied
+                    file_uuids = {user['uuid'] for user in file}
                     for rule in global_acl['ops']:
-                        if rule['uuid'] not in [user['uuid'] for user in file]:
+                        if rule['uuid'] not in file_uuids:
                             file.append(rule)
+                            file_uuids.add(rule['uuid'])
 
                     if file:
                         for user in file:
@@ -1861,7 +2161,6 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                             server_acl['ops'].append(acl_object)
 
             if list_type == "ops":
-                finalize()
                 return server_acl['ops']
 
         # Check for bans
@@ -1878,9 +2177,11 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                         file = []
 
                     # Check that global rules are applied
+                    file_uuids = {user['uuid'] for user in file}
                     for rule in global_acl['bans']:
-                        if rule['uuid'] not in [user['uuid'] for user in file]:
+                        if rule['uuid'] not in file_uuids:
                             file.append(rule)
+                            file_uuids.add(rule['uuid'])
 
                     for user in file:
                         acl_object = check_global_acl(
@@ -1904,7 +2205,6 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                         server_acl['bans'].append(acl_object)
 
             if list_type == "bans":
-                finalize()
                 return server_acl['bans']
 
         # Check for whitelist
@@ -1919,9 +2219,11 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                         file = []
 
                     # Check that global rules are applied
+                    file_uuids = {user['uuid'] for user in file}
                     for rule in global_acl['wl']:
-                        if rule['uuid'] not in [user['uuid'] for user in file]:
+                        if rule['uuid'] not in file_uuids:
                             file.append(rule)
+                            file_uuids.add(rule['uuid'])
 
                     for user in file:
                         acl_object = check_global_acl(
@@ -1933,7 +2235,6 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                         server_acl['wl'].append(acl_object)
 
             if list_type == "wl":
-                finalize()
                 return server_acl['wl']
 
         # Check for banned IPs
@@ -1947,24 +2248,10 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                     except json.decoder.JSONDecodeError:
                         file = []
 
+                    # IP rule determination logic
+                    check_ip = ip_rule_filter(original_ip_rules)
                     for user in file:
-
-                        valid_ip = False
-                        checked_ip = user['ip']
-
-                        # IP rule determination logic
-                        for rule in original_ip_rules:
-                            rule = rule.rule
-
-                            # Allow singular IP if it's not also whitelisted
-                            if rule.replace("!w", "") != checked_ip:
-                                valid_ip = True
-
-                            # Allow singular IP if it's not already in an IP range
-                            if "/" in rule:
-                                valid_ip = not in_subnet(checked_ip, rule.replace("!w", ""))
-                                if not valid_ip:
-                                    break
+                        valid_ip = check_ip(user['ip'])
 
                         if valid_ip:
                             acl_object = check_global_acl(
@@ -1980,12 +2267,10 @@ def load_acl(server_name: str, list_type=None, force_version=None, temp_server=F
                             server_acl['subnets'].append(acl_object)
 
             if list_type == "subnets":
-                finalize()
                 return server_acl['subnets']
 
     # Return entire list if list_type is unspecified ---------------------------------------------------------------
     if not list_type:
-        finalize()
         return server_acl
 
 
@@ -2069,8 +2354,7 @@ def op_user(server_name: str, rule_list: str or list, remove=False, force_versio
                     if user.rule:
                         final_list = final_list + user.rule + "\n"
 
-                with open(os.path.join(server_path, "ops.txt"), "w+") as f:
-                    f.write(final_list.lower())
+                write_acl_file(os.path.join(server_path, "ops.txt"), final_list.lower())
 
 
             # Edit new .json files
@@ -2096,10 +2380,8 @@ def op_user(server_name: str, rule_list: str or list, remove=False, force_versio
                     else:
                         continue
 
-                with open(os.path.join(server_path, "ops.json"), "w+") as f:
-                    f.write(json.dumps(final_list, indent=2))
+                write_acl_file(os.path.join(server_path, "ops.json"), json.dumps(final_list, indent=2))
 
-    concat_db()
     return op_list
 
 
@@ -2306,19 +2588,12 @@ def ban_user(server_name: str, rule_list: str or list, remove=False, force_versi
                     if user.rule:
                         final_list = final_list + user.rule + "\n"
 
-                with open(os.path.join(server_path, "banned-players.txt"), "w+") as f:
-                    f.write(final_list.lower())
+                write_acl_file(os.path.join(server_path, "banned-players.txt"), final_list.lower())
 
                 # Add banned IPs -----------------------------------------------------------------------------------
-                final_list = ""
-
-                # write final_list to file
-                for ip_addr in gen_iplist(subnet_list):
-                    if ip_addr:
-                        final_list = final_list + ip_addr + "\n"
+                final_list = "".join(f"{ip_addr if isinstance(ip_addr, str) else ip_addr.rule}\n" for ip_addr in IpRuleSet(subnet_list).iter_addresses())
 
-                with open(os.path.join(server_path, "banned-ips.txt"), "w+") as f:
-                    f.write(final_list.lower())
+                write_acl_file(os.path.join(server_path, "banned-ips.txt"), final_list.lower())
 
 
             # Edit new .json files
@@ -2349,14 +2624,13 @@ def ban_user(server_name: str, rule_list: str or list, remove=False, force_versi
                     else:
                         continue
 
-                with open(os.path.join(server_path, "banned-players.json"), "w+") as f:
-                    f.write(json.dumps(final_list, indent=2))
+                write_acl_file(os.path.join(server_path, "banned-players.json"), json.dumps(final_list, indent=2))
 
                 # Add banned IPs -----------------------------------------------------------------------------------
                 final_list = []
 
                 # write new users to file
-                for ip_addr in gen_iplist(subnet_list):
+                for ip_addr in IpRuleSet(subnet_list).iter_addresses():
 
                     if ip_addr:
 
@@ -2385,14 +2659,11 @@ def ban_user(server_name: str, rule_list: str or list, remove=False, force_versi
                     else:
                         continue
 
-                with open(os.path.join(server_path, "banned-ips.json"), "w+") as f:
-                    f.write(json.dumps(final_list, indent=2))
+                write_acl_file(os.path.join(server_path, "banned-ips.json"), json.dumps(final_list, indent=2))
 
             # Write subnet rules to file
-            with open(os.path.join(server_path, "banned-subnets.json"), "w+") as f:
-                f.write(json.dumps([rule.rule for rule in subnet_list], indent=2))
+            write_acl_file(os.path.join(server_path, "banned-subnets.json"), json.dumps([rule.rule for rule in subnet_list], indent=2))
 
-    concat_db()
     return ban_list, subnet_list
 
 
@@ -2449,7 +2720,7 @@ def wl_user(server_name: str, rule_list: str or list, remove=False, force_versio
                                 if server_obj.running:
                                     server_obj.silent_command(f'whitelist remove {user}', log=False)
                                     server_obj.silent_command(f'whitelist reload', log=False)
-                                    if server_obj.acl.server['whitelist']:
+                                    if server_obj.acl.whitelist_enabled:
                                         server_obj.silent_command(f'kick {user} You are not whitelisted on this server!', log=False)
 
                             break
@@ -2488,8 +2759,7 @@ def wl_user(server_name: str, rule_list: str or list, remove=False, force_versio
                     if user.rule:
                         final_list = final_list + user.rule + "\n"
 
-                with open(os.path.join(server_path, "white-list.txt"), "w+") as f:
-                    f.write(final_list.lower())
+                write_acl_file(os.path.join(server_path, "white-list.txt"), final_list.lower())
 
 
             # Edit new .json files
@@ -2513,10 +2783,8 @@ def wl_user(server_name: str, rule_list: str or list, remove=False, force_versio
                     else:
                         continue
 
-                with open(os.path.join(server_path, "whitelist.json"), "w+") as f:
-                    f.write(json.dumps(final_list, indent=2))
+                write_acl_file(os.path.join(server_path, "whitelist.json"), json.dumps(final_list, indent=2))
 
-    concat_db()
     return wl_list, new_op_list
 
 
@@ -1,15 +1,28 @@
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from itertools import repeat
 from difflib import SequenceMatcher
 from zipfile import ZipFile
 from copy import deepcopy
 from glob import glob
 import constants
 import requests
+import threading
 import hashlib
+import time
 import json
 import os
 import re
 
+# Optional, add-on folders are polled instead when it's missing
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
 
 # Auto-MCS Add-on API
 # ----------------------------------------------- Addon Objects --------------------------------------------------------
@@ -61,8 +74,7 @@ class AddonFileObject(AddonObject):
         self.enabled = True
 
         # Generate Hash
-        hash_data = int(hashlib.md5(f'{os.path.getsize(addon_path)}/{os.path.basename(addon_path)}'.encode()).hexdigest(), 16)
-        self.hash = str(hash_data)[:8]
+        self.hash = addon_file_hash(addon_path)
 
 # AddonObject for housing downloadable modpacks
 class ModpackWebObject(AddonWebObject):
@@ -78,7 +90,6 @@ class AddonManager():
         self.update_required = False
         self.installed_addons = enumerate_addons(self._server)
         self.geyser_support = self.check_geyser()
-        self._addon_hash = self._set_hash()
 
         # Setup paths
         addon_folder = "plugins" if constants.server_type(self._server['type']) == 'bukkit' else 'mods'
@@ -86,6 +97,11 @@ class AddonManager():
         self.addon_path = constants.server_path(self._server['name'], addon_folder)
         self.disabled_addon_path = constants.server_path(self._server['name'], disabled_addon_folder)
 
+        # Watch add-on folders so the hash doesn't need a rescan
+        folder_path = os.path.join(constants.server_path(self._server['name']), addon_folder)
+        self._watcher = get_addon_watcher(folder_path, os.path.join(os.path.dirname(folder_path), disabled_addon_folder))
+        self._addon_hash = self._set_hash()
+
         # Set addon hash if server is running
         try:
             if self._server['name'] in constants.server_manager.running_servers:
@@ -98,17 +114,13 @@ class AddonManager():
 
     # Sets addon hash to determine changes
     def _set_hash(self):
-        addon_hash = ""
-
-        for addon in sorted(self.installed_addons['enabled'], key=lambda x: x.name):
-            addon_hash += addon.hash
-
-        return addon_hash
+        return self._watcher.get_hash()
 
     # Checks addon hash in running config to see if it's changed
     def _hash_changed(self):
         hash_changed = False
         server_name = self._server['name']
+        self._addon_hash = self._set_hash()
 
         if server_name in constants.server_manager.running_servers:
             hash_changed = constants.server_manager.running_servers[server_name].run_data['addon-hash'] != self._addon_hash
@@ -123,6 +135,7 @@ class AddonManager():
         self._server = dump_config(self._server['name'])
         self.installed_addons = enumerate_addons(self._server)
         self.geyser_support = self.check_geyser()
+        self._watcher.sync(self.installed_addons['enabled'])
         self._addon_hash = self._set_hash()
 
     # Imports addon directly from file path
@@ -226,25 +239,9 @@ class AddonManager():
 
         # print("Checking for updates!!!")
         if constants.app_online:
-            for addon in self.installed_addons['enabled']:
-                try:
-                    # Check for Geyser updates
-                    if addon.author.lower() == 'geysermc':
-                        if addon.id == 'geyser':
-                            update = requests.get('https://download.geysermc.org/v2/projects/geyser/versions/latest/builds/latest').json()
-                            if constants.check_app_version(addon.addon_version, update['version'], limit=3):
-                                # print(addon.name, addon.addon_version, update.addon_version)
-                                self.update_required = True
-                                return True
-
-                    # Everything else
-                    update = get_update_url(addon, self._server['version'], self._server['type'])
-                    if constants.check_app_version(addon.addon_version, update.addon_version, limit=3):
-                        # print(addon.name, addon.addon_version, update.addon_version)
-                        self.update_required = True
-                        return True
-                except:
-                    continue
+            if check_updates([(self._server, self.installed_addons['enabled'])])[self._server['name']]:
+                self.update_required = True
+                return True
 
         return False
 
@@ -270,9 +267,22 @@ class AddonManager():
 
 # -------------------------------------------- Addon File Functions ----------------------------------------------------
 
-# Returns file object from addon jar file
-# addon.jar --> AddonFileObject
-def get_addon_file(addon_path: str, server_properties, enabled=False):
+# Key for constants.addon_cache, a jar is only read again if it's moved, resized or modified
+def addon_cache_key(addon_path: str):
+    stat = os.stat(addon_path)
+    return f'{addon_path}|{stat.st_size}|{stat.st_mtime_ns}'
+
+
+# Identifies an installed add-on for AddonManager change detection
+def addon_file_hash(addon_path: str):
+    hash_data = int(hashlib.md5(f'{os.path.getsize(addon_path)}/{os.path.basename(addon_path)}'.encode()).hexdigest(), 16)
+    return str(hash_data)[:8]
+
+
+# Reads add-on metadata straight from the jar in memory, without extracting anything to disk
+# This runs in worker processes for cold scans (see scan_addon_metadata), so it can only rely on module level data
+# addon.jar --> {'name', 'type', 'author', 'subtitle', 'id', 'addon_version'}
+def read_addon_metadata(addon_path: str, server_type: str):
     jar_name = os.path.basename(addon_path)
     addon_name = None
     addon_author = None
@@ -280,225 +290,233 @@ def get_addon_file(addon_path: str, server_properties, enabled=False):
     addon_version = None
     addon_type = None
     addon_id = None
-    cached = False
 
+    try:
+        with ZipFile(addon_path, 'r') as jar_file:
 
-    # Determine which addons to look for
-    server_type = constants.server_type(server_properties['type'])
+            # Raises KeyError if the file isn't in the jar
+            def read_file(file_name):
+                return jar_file.read(file_name).decode('utf-8-sig', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
 
-    # Get addon information
-    if jar_name.endswith(".jar"):
+            # Check if addon is actually a bukkit plugin
+            if server_type == "bukkit":
+                try:
+                    file_contents = read_file('plugin.yml')
+                    addon_type = server_type
+                    next_line_desc = False
+                    for line in file_contents.splitlines(True):
+                        if next_line_desc:
+                            addon_subtitle = line.replace("\"", "").strip()
+                            next_line_desc = False
+                        elif addon_author and addon_name and addon_version and addon_subtitle and addon_id:
+                            break
+                        elif line.strip().startswith("name:"):
+                            addon_name = line.split("name:")[1].replace("\"", "").strip()
+                        elif line.strip().startswith("author:"):
+                            addon_author = line.split("author:")[1].replace("\"", "").strip()
+                        elif line.strip().startswith("main:"):
+                            if not addon_author:
+                                if "com" in line:
+                                    try:
+                                        addon_author = line.split("com.")[1].split(".")[0].replace("\"", "").strip()
+                                    except IndexError:
+                                        addon_author = line.split(".")[1].replace("\"", "").strip()
+                                else:
+                                    addon_author = line.split(".")[1].replace("\"", "").strip()
+                            try:
+                                addon_id = line.split(".")[2].replace("\"", "").strip().lower()
+                            except IndexError:
+                                if line.startswith("main:"):
+                                    addon_id = line.split(".")[0].split(":")[1].strip().lower()
+                                else:
+                                    addon_id = addon_name.lower().replace(" ", "-")
+                        elif line.strip().startswith("description:"):
+                            addon_subtitle = line.split("description:")[1].replace("\"", "").strip()
+                            next_line_desc = addon_subtitle == ">"
+                        elif line.strip().startswith("version:"):
+                            addon_version = line.split("version:")[1].replace("\"", "").replace("-", " ").strip()
+                            if "+" in addon_version:
+                                addon_version = addon_version.split("+")[0]
+                            if ";" in addon_version:
+                                addon_version = addon_version.split(";")[0]
+                except KeyError:
+                    pass
 
-        # First, check if plugin is cached
-        hash_data = int(hashlib.md5(f'{os.path.getsize(addon_path)}/{os.path.basename(addon_path)}'.encode()).hexdigest(), 16)
-        hash_data = str(hash_data)[:8]
-        if hash_data in constants.addon_cache.keys():
-            cached = constants.addon_cache[hash_data]
-            addon_name = cached['name']
-            addon_type = cached['type']
-            addon_author = cached['author']
-            addon_subtitle = cached['subtitle']
-            addon_id = cached['id']
-            addon_version = cached['addon_version']
 
+            # Check if addon is actually a forge mod
+            elif server_type == "forge":
 
-        # Next, check plugin.yml if it exists
-        else:
-            try:
-                with ZipFile(addon_path, 'r') as jar_file:
-                    addon_tmp = os.path.join(constants.tempDir, constants.gen_rstring(6))
-                    constants.folder_check(addon_tmp)
+                # Check if mcmod.info exists
+                try:
+                    file_contents = read_file('mcmod.info')
+                    addon_type = server_type
+                    for line in file_contents.splitlines(True):
+                        if addon_author and addon_name and addon_version and addon_subtitle and addon_id:
+                            break
+                        elif line.strip().startswith("\"name\":"):
+                            addon_name = line.split("\"name\":")[1].replace("\"", "").replace(",", "").strip()
+                        elif line.strip().startswith("\"authorList\":"):
+                            addon_author = line.split("\"authorList\":")[1].replace("\"", "").replace("[", "").replace("]", "").strip()
+                            addon_author = addon_author[:-1] if addon_author.endswith(",") else addon_author
+                            addon_author = addon_author.split(',')[0].strip()
+                        elif line.strip().startswith("\"description\":"):
+                            addon_subtitle = line.split("\"description\":")[1].replace("\"", "").replace(",", "").strip()
+                        elif line.strip().startswith("\"modid\":"):
+                            addon_id = line.split("\"modid\":")[1].replace("\"", "").replace(",", "").strip().lower()
+                        elif line.strip().startswith("\"version\":"):
+                            addon_version = line.split("\"version\":")[1].replace("\"", "").replace(",", "").strip()
+                            if "+" in addon_version:
+                                addon_version = addon_version.split("+")[0]
+                            if ";" in addon_version:
+                                addon_version = addon_version.split(";")[0]
+                except KeyError:
+                    pass
 
-                    # Check if addon is actually a bukkit plugin
-                    if server_type == "bukkit":
-                        try:
-                            jar_file.extract('plugin.yml', addon_tmp)
-                            with open(os.path.join(addon_tmp, 'plugin.yml'), 'r') as yml:
-                                addon_type = server_type
-                                next_line_desc = False
-                                for line in yml.readlines():
-                                    if next_line_desc:
-                                        addon_subtitle = line.replace("\"", "").strip()
-                                        next_line_desc = False
-                                    elif addon_author and addon_name and addon_version and addon_subtitle and addon_id:
-                                        break
-                                    elif line.strip().startswith("name:"):
-                                        addon_name = line.split("name:")[1].replace("\"", "").strip()
-                                    elif line.strip().startswith("author:"):
-                                        addon_author = line.split("author:")[1].replace("\"", "").strip()
-                                    elif line.strip().startswith("main:"):
-                                        if not addon_author:
-                                            if "com" in line:
-                                                try:
-                                                    addon_author = line.split("com.")[1].split(".")[0].replace("\"", "").strip()
-                                                except IndexError:
-                                                    addon_author = line.split(".")[1].replace("\"", "").strip()
-                                            else:
-                                                addon_author = line.split(".")[1].replace("\"", "").strip()
-                                        try:
-                                            addon_id = line.split(".")[2].replace("\"", "").strip().lower()
-                                        except IndexError:
-                                            if line.startswith("main:"):
-                                                addon_id = line.split(".")[0].split(":")[1].strip().lower()
-                                            else:
-                                                addon_id = addon_name.lower().replace(" ", "-")
-                                    elif line.strip().startswith("description:"):
-                                        addon_subtitle = line.split("description:")[1].replace("\"", "").strip()
-                                        next_line_desc = addon_subtitle == ">"
-                                    elif line.strip().startswith("version:"):
-                                        addon_version = line.split("version:")[1].replace("\"", "").replace("-", " ").strip()
-                                        if "+" in addon_version:
-                                            addon_version = addon_version.split("+")[0]
-                                        if ";" in addon_version:
-                                            addon_version = addon_version.split(";")[0]
-                        except KeyError:
-                            pass
-
-
-                    # Check if addon is actually a forge mod
-                    elif server_type == "forge":
-
-                        # Check if mcmod.info exists
-                        try:
-                            jar_file.extract('mcmod.info', addon_tmp)
-                            with open(os.path.join(addon_tmp, 'mcmod.info'), 'r') as info:
-                                addon_type = server_type
-                                for line in info.readlines():
-                                    if addon_author and addon_name and addon_version and addon_subtitle and addon_id:
-                                        break
-                                    elif line.strip().startswith("\"name\":"):
-                                        addon_name = line.split("\"name\":")[1].replace("\"", "").replace(",", "").strip()
-                                    elif line.strip().startswith("\"authorList\":"):
-                                        addon_author = line.split("\"authorList\":")[1].replace("\"", "").replace("[", "").replace("]", "").strip()
-                                        addon_author = addon_author[:-1] if addon_author.endswith(",") else addon_author
-                                        addon_author = addon_author.split(',')[0].strip()
-                                    elif line.strip().startswith("\"description\":"):
-                                        addon_subtitle = line.split("\"description\":")[1].replace("\"", "").replace(",", "").strip()
-                                    elif line.strip().startswith("\"modid\":"):
-                                        addon_id = line.split("\"modid\":")[1].replace("\"", "").replace(",", "").strip().lower()
-                                    elif line.strip().startswith("\"version\":"):
-                                        addon_version = line.split("\"version\":")[1].replace("\"", "").replace(",", "").strip()
-                                        if "+" in addon_version:
-                                            addon_version = addon_version.split("+")[0]
-                                        if ";" in addon_version:
-                                            addon_version = addon_version.split(";")[0]
-                        except KeyError:
-                            pass
-
-                        # If mcmod.info is absent, check mods.toml
-                        if not addon_name:
-                            try:
-                                jar_file.extract('META-INF/mods.toml', addon_tmp)
-                                with open(os.path.join(addon_tmp, 'META-INF', 'mods.toml'), 'r') as toml:
-                                    addon_type = server_type
-                                    file_contents = toml.read().split("[[dependencies")[0].replace(' = ', '=')
-                                    for line in file_contents.splitlines():
-                                        if addon_author and addon_name and addon_version and addon_subtitle and addon_id:
-                                            break
-                                        elif line.strip().startswith("displayName="):
-                                            addon_name = line.split("displayName=")[1].replace("\"", "").strip()
-                                        elif line.strip().startswith("modId="):
-                                            addon_id = line.split("modId=")[1].replace("\"", "").replace(",", "").strip().lower()
-                                        elif line.strip().startswith("authors="):
-                                            addon_author = line.split("authors=")[1].replace("\"", "").strip()
-                                            addon_author = addon_author.split(',')[0].strip()
-                                        elif line.strip().startswith("version="):
-                                            addon_version = line.split("version=")[1].replace("\"", "").replace("-", " ").strip()
-                                            if "+" in addon_version:
-                                                addon_version = addon_version.split("+")[0]
-                                            if ";" in addon_version:
-                                                addon_version = addon_version.split(";")[0]
-                                    description = file_contents.split("description=")[1]
-                                    if description:
-                                        addon_subtitle = description.replace("'''", "").replace("\n", " ").strip().replace("- ", " ")
-                            except KeyError:
-                                pass
-
-
-                    # Check if addon is actually a fabric mod
-                    elif server_type == "fabric":
-                        try:
-                            jar_file.extract('fabric.mod.json', addon_tmp)
-                            with open(os.path.join(addon_tmp, 'fabric.mod.json'), 'r') as mod:
-                                addon_type = server_type
-                                file_contents = json.loads(mod.read())
-
-                                if file_contents['name']:
-                                    addon_name = file_contents['name'].strip()
-                                if file_contents['id']:
-                                    addon_id = file_contents['id'].strip()
-                                if file_contents['authors']:
-                                    addon_author = file_contents['authors'][0].strip()
-                                if file_contents['version']:
-                                    addon_version = file_contents['version'].replace("\"", "").replace("-", " ").strip()
-                                    if "+" in addon_version:
-                                        addon_version = addon_version.split("+")[0].strip()
-                                    if ";" in addon_version:
-                                        addon_version = addon_version.split(";")[0].strip()
-                                if file_contents['description']:
-                                    addon_subtitle = file_contents['description'].replace("- ", " ").strip()
-                        except KeyError:
-                            pass
-
-
-                    constants.safe_delete(addon_tmp)
-
-            # If there's an issue with decompilation
-            except Exception as e:
-                if constants.debug:
-                    print(e)
+                # If mcmod.info is absent, check mods.toml
+                if not addon_name:
+                    try:
+                        file_contents = read_file('META-INF/mods.toml').split("[[dependencies")[0].replace(' = ', '=')
+                        addon_type = server_type
+                        for line in file_contents.splitlines():
+                            if addon_author and addon_name and addon_version and addon_subtitle and addon_id:
+                                break
+                            elif line.strip().startswith("displayName="):
+                                addon_name = line.split("displayName=")[1].replace("\"", "").strip()
+                            elif line.strip().startswith("modId="):
+                                addon_id = line.split("modId=")[1].replace("\"", "").replace(",", "").strip().lower()
+                            elif line.strip().startswith("authors="):
+                                addon_author = line.split("authors=")[1].replace("\"", "").strip()
+                                addon_author = addon_author.split(',')[0].strip()
+                            elif line.strip().startswith("version="):
+                                addon_version = line.split("version=")[1].replace("\"", "").replace("-", " ").strip()
+                                if "+" in addon_version:
+                                    addon_version = addon_version.split("+")[0]
+                                if ";" in addon_version:
+                                    addon_version = addon_version.split(";")[0]
+                        description = file_contents.split("description=")[1]
+                        if description:
+                            addon_subtitle = description.replace("'''", "").replace("\n", " ").strip().replace("- ", " ")
+                    except KeyError:
+                        pass
+
+
+            # Check if addon is actually a fabric mod
+            elif server_type == "fabric":
+                try:
+                    file_contents = json.loads(read_file('fabric.mod.json'))
+                    addon_type = server_type
+
+                    if file_contents['name']:
+                        addon_name = file_contents['name'].strip()
+                    if file_contents['id']:
+                        addon_id = file_contents['id'].strip()
+                    if file_contents['authors']:
+                        addon_author = file_contents['authors'][0].strip()
+                    if file_contents['version']:
+                        addon_version = file_contents['version'].replace("\"", "").replace("-", " ").strip()
+                        if "+" in addon_version:
+                            addon_version = addon_version.split("+")[0].strip()
+                        if ";" in addon_version:
+                            addon_version = addon_version.split(";")[0].strip()
+                    if file_contents['description']:
+                        addon_subtitle = file_contents['description'].replace("- ", " ").strip()
+                except KeyError:
+                    pass
 
-                if not addon_version:
-                    addon_version = None
+    # If there's an issue with decompilation
+    except Exception as e:
+        if constants.debug:
+            print(e)
 
-                if not addon_subtitle:
-                    addon_subtitle = None
+        if not addon_version:
+            addon_version = None
 
-                if not addon_author:
-                    addon_author = None
+        if not addon_subtitle:
+            addon_subtitle = None
 
+        if not addon_author:
+            addon_author = None
 
-            # If information was not found, use file name instead
-            try:
-                addon_version = re.search(r'\d+(\.\d+)+', addon_version).group(0)
-            except:
-                try:
-                    addon_version = re.sub("[^0-9|.]", "", addon_version.split(' ')[0])
-                except:
-                    pass
 
-            if not addon_name:
+    # If information was not found, use file name instead
+    try:
+        addon_version = re.search(r'\d+(\.\d+)+', addon_version).group(0)
+    except:
+        try:
+            addon_version = re.sub("[^0-9|.]", "", addon_version.split(' ')[0])
+        except:
+            pass
 
-                new_name = jar_name.split(".jar")[0]
-                if "- Copy" in new_name:
-                    new_name = new_name.split("- Copy")[0]
-                new_name = new_name.replace("-", " ")
+    if not addon_name:
 
-                if " mod" in new_name or " Mod" in new_name:
-                    new_name = new_name.split(" mod")[0].split(" Mod")[0]
-                if " bukkit" in new_name or " Bukkit" in new_name:
-                    new_name = new_name.split(" bukkit")[0].split(" Bukkit")[0]
+        new_name = jar_name.split(".jar")[0]
+        if "- Copy" in new_name:
+            new_name = new_name.split("- Copy")[0]
+        new_name = new_name.replace("-", " ")
 
-                addon_name = new_name
-                addon_type = server_type
+        if " mod" in new_name or " Mod" in new_name:
+            new_name = new_name.split(" mod")[0].split(" Mod")[0]
+        if " bukkit" in new_name or " Bukkit" in new_name:
+            new_name = new_name.split(" bukkit")[0].split(" Bukkit")[0]
 
-        if not addon_id:
-            addon_id = constants.sanitize_name(addon_name.strip().lower().split(' ',1)[0], True)
+        addon_name = new_name
+        addon_type = server_type
 
-        AddonObj = AddonFileObject(addon_name, addon_type, addon_author, addon_subtitle, addon_path, addon_id, addon_version)
-        AddonObj.enabled = enabled
+    if not addon_id:
+        addon_id = constants.sanitize_name(addon_name.strip().lower().split(' ',1)[0], True)
+
+    return {
+        'name': addon_name,
+        'type': addon_type,
+        'author': addon_author,
+        'subtitle': addon_subtitle,
+        'id': addon_id,
+        'addon_version': addon_version
+    }
+
+
+# Reads metadata for a list of jars which aren't cached yet
+# Parsing holds the GIL, so large cold scans (like a new modpack) are spread over processes instead of threads
+# [addon.jar] --> {addon.jar: metadata}
+process_scan_threshold = 64
+def scan_addon_metadata(addon_paths: list, server_type: str):
+    if not addon_paths:
+        return {}
+
+    workers = min(os.cpu_count() or 1, 8)
+    if len(addon_paths) >= process_scan_threshold and workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return dict(zip(addon_paths, pool.map(read_addon_metadata, addon_paths, repeat(server_type), chunksize=16)))
 
-        # Create addon cache
-        if not cached:
-            size_name = str(os.path.getsize(addon_path)) + os.path.basename(addon_path)
-            constants.addon_cache[AddonObj.hash] = {
-                'name': addon_name,
-                'type': addon_type,
-                'author': addon_author,
-                'subtitle': addon_subtitle,
-                'id': addon_id,
-                'addon_version': addon_version
-            }
+        # Processes aren't available, or one of them crashed
+        except (OSError, BrokenProcessPool) as e:
+            if constants.debug:
+                print(f"Add-on scan: falling back to threads: {e}")
+
+    with ThreadPoolExecutor(max_workers=15) as pool:
+        return dict(zip(addon_paths, pool.map(read_addon_metadata, addon_paths, repeat(server_type))))
+
+
+# Returns file object from addon jar file
+# metadata skips the cache lookup when it's already known (see enumerate_addons)
+# addon.jar --> AddonFileObject
+def get_addon_file(addon_path: str, server_properties, enabled=False, metadata=None):
+    jar_name = os.path.basename(addon_path)
+
+    # Get addon information
+    if jar_name.endswith(".jar"):
+
+        # First, check if the add-on is cached, otherwise read it from the jar
+        if not metadata:
+            cache_key = addon_cache_key(addon_path)
+            metadata = constants.addon_cache.get(cache_key)
+            if not metadata:
+                metadata = read_addon_metadata(addon_path, constants.server_type(server_properties['type']))
+                constants.addon_cache[cache_key] = metadata
+
+        AddonObj = AddonFileObject(metadata['name'], metadata['type'], metadata['author'], metadata['subtitle'], addon_path, metadata['id'], metadata['addon_version'])
+        AddonObj.enabled = enabled
 
         return AddonObj
     else:
@@ -535,6 +553,31 @@ def import_addon(addon_path: str or AddonFileObject, server_properties, tmpsvr=F
 
 # ------------------------------------------- Addon Web Functions ------------------------------------------------------
 
+# Search results are kept for search_cache_ttl seconds, keyed by (query, server type, server version)
+# Parsed result pages are cached by URL too, so a page is only downloaded and parsed once for queries that map to it
+search_cache_ttl = 600
+search_cache = OrderedDict()
+page_cache = OrderedDict()
+_search_lock = threading.Lock()
+
+def _cache_get(cache: OrderedDict, key):
+    with _search_lock:
+        if key in cache:
+            timestamp, value = cache[key]
+            if time.time() - timestamp < search_cache_ttl:
+                cache.move_to_end(key)
+                return value
+            del cache[key]
+    return None
+
+def _cache_set(cache: OrderedDict, key, value, size: int):
+    with _search_lock:
+        cache[key] = (time.time(), value)
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+
 # Returns list of addon objects according to search
 # Query --> AddonWebObject
 def search_addons(query: str, server_properties):
@@ -552,6 +595,14 @@ def search_addons(query: str, server_properties):
     # Determine which addons to search for
     server_type = constants.server_type(server_properties['type'])
 
+    cache_key = (query, server_type, server_properties.get('version'))
+    results = _cache_get(search_cache, cache_key)
+    if results is not None:
+        return results
+
+
+    # Only searches where every page loaded are cached, so an outage doesn't show "no results" until it expires
+    complete = True
 
     # If server_type is bukkit
     if server_type == "bukkit":
@@ -560,17 +611,17 @@ def search_addons(query: str, server_properties):
         # Grab every addon from search result and return results dict
         url = search_urls[server_type] + query.replace(' ', '+')
         results = []
-        page_content = constants.get_url(url)
 
 
-        # Function to be used in ThreadPool
+        # Function to be used in ThreadPool, returns the parsed rows and page count of a result page
         def get_page(page_number):
+            page_url = url.replace('projects-page=1', f'projects-page={page_number}')
+            page = _cache_get(page_cache, page_url)
+            if page is not None:
+                return page
 
-            # Skip loading URL twice if page is already loaded
-            if page_number == 1:
-                new_page_content = page_content
-            else:
-                new_page_content = constants.get_url(url.replace('projects-page=1', f'projects-page={page_number}'))
+            new_page_content = constants.get_url(page_url)
+            rows = []
 
             # Filter result content
             table = new_page_content.find('table', 'listing listing-project project-listing b-table b-table-a').find('tbody')
@@ -595,21 +646,31 @@ def search_addons(query: str, server_properties):
                 if result_dict['author'].lower() in prioritized or result_dict['name'].lower() in prioritized:
                     result_dict['position'] = 0.0
 
-                results_unsorted.append(result_dict)
+                rows.append(result_dict)
+
+            # The page count is only needed from the first page
+            pages = 1
+            if page_number == 1:
+                pages = [int(item.text) for item in new_page_content.find('div', 'listing-header').find_all('a', 'b-pagination-item')]
+                pages = 1 if not pages else max(pages)
+
+            page = (rows, pages)
+            _cache_set(page_cache, page_url, page, 200)
+            return page
 
         # Get all pages
         try:
-            pages = [int(item.text) for item in page_content.find('div', 'listing-header').find_all('a', 'b-pagination-item')]
-            pages = 1 if not pages else max(pages)
+            rows, pages = get_page(1)
+            results_unsorted.extend(rows)
 
-            # If there's a single page, use already retrieved results
-            if pages == 1:
-                get_page(1)
-
-            # If not, make a threadpool of total pages
-            else:
+            # If there's more than one page, make a threadpool of the rest, and skip pages which fail to load
+            if pages > 1:
                 with ThreadPoolExecutor(max_workers=10) as pool:
-                    pool.map(get_page, range(1, pages+1))
+                    for future in [pool.submit(get_page, page_number) for page_number in range(2, pages+1)]:
+                        if future.exception():
+                            complete = False
+                        else:
+                            results_unsorted.extend(future.result()[0])
 
             # Sort list and add it to results
             for addon_dict in list(sorted(results_unsorted, key=lambda d: d['position'])):
@@ -618,7 +679,7 @@ def search_addons(query: str, server_properties):
 
         # If no results
         except AttributeError:
-            pass
+            complete = False
 
 
     # If server_type is forge or fabric
@@ -626,9 +687,12 @@ def search_addons(query: str, server_properties):
         # Grab every addon from search result and return results dict
         url = f'https://api.modrinth.com/v2/search?facets=[["categories:{server_type}"],["server_side:optional","server_side:required"]]&limit=100&query={query}'
         results = []
-        page_content = constants.get_url(url, return_response=True).json()
+        hits = _cache_get(page_cache, url)
+        if hits is None:
+            hits = constants.get_url(url, return_response=True).json()['hits']
+            _cache_set(page_cache, url, hits, 200)
 
-        for mod in page_content['hits']:
+        for mod in hits:
             name = mod['title']
             author = mod['author']
             subtitle = mod['description'].split("\n", 1)[0]
@@ -641,9 +705,38 @@ def search_addons(query: str, server_properties):
                 results.append(addon_obj)
 
 
+    # Objects are shared with the cache, so info from get_addon_info() is kept for the next search
+    if complete:
+        _cache_set(search_cache, cache_key, results, 50)
     return results
 
 
+# Runs get_addon_info() in the background for results the user is about to open, so they show up instantly
+# Each call replaces the previous one, since those results are no longer on screen
+_prefetch_generation = 0
+def prefetch_addon_info(addon_list: list, server_properties):
+    global _prefetch_generation
+
+    with _search_lock:
+        _prefetch_generation += 1
+        generation = _prefetch_generation
+
+    def prefetch():
+        for addon in addon_list:
+            if generation != _prefetch_generation:
+                return
+            if addon.supported != "unknown" or addon.description:
+                continue
+            try:
+                get_addon_info(addon, server_properties)
+            except Exception as e:
+                if constants.debug:
+                    print(f"Couldn't prefetch '{addon.name}': {e}")
+
+    thread = threading.Thread(target=prefetch, daemon=True)
+    thread.start()
+
+
 # Returns advanced addon object properties
 # AddonWebObject
 def get_addon_info(addon: AddonWebObject, server_properties):
@@ -944,10 +1037,15 @@ def download_addon(addon: AddonWebObject, server_properties, tmpsvr=False):
     # Download addon to "destination_path + file_name"
     file_name = constants.sanitize_name(addon.name if len(addon.name) < 35 else addon.name.split(' ')[0], True) + ".jar"
     total_path = os.path.join(destination_path, file_name)
-    try:
-        constants.cs_download_url(addon.download_url, file_name, destination_path)
-    except requests.exceptions.SSLError:
-        constants.download_url(addon.download_url, file_name, destination_path)
+
+    # Link the add-on from the shared cache if another server already downloaded it
+    head_data = constants.download_head(addon.download_url)
+    if not constants.artifact_cache.fetch(addon.download_url, head_data, total_path):
+        try:
+            constants.cs_download_url(addon.download_url, file_name, destination_path)
+        except requests.exceptions.SSLError:
+            constants.download_url(addon.download_url, file_name, destination_path)
+        constants.artifact_cache.store(total_path, addon.download_url, head_data)
 
     # Check if addon is contained in a .zip file
     zip_file = False
@@ -982,6 +1080,240 @@ def find_addon(name, server_properties):
 
 
 
+# ---------------------------------------- Addon Change Detection ------------------------------------------------------
+
+# Tracks the enabled add-ons of a server so AddonManager._hash_changed() doesn't need to rescan anything
+# The hash is an XOR of addon_file_hash() for each jar, so every create/delete/move event updates it in O(1)
+# The disabled folder is watched too, so moves between the two can be paired into move events where the platform allows it
+class AddonWatcher(FileSystemEventHandler):
+
+    def __init__(self, addon_path: str, disabled_addon_path: str):
+        super().__init__()
+        self.addon_path = os.path.normcase(os.path.abspath(addon_path))
+        self.disabled_addon_path = os.path.normcase(os.path.abspath(disabled_addon_path))
+
+        self._entries = {}
+        self._hash = 0
+        self._lock = threading.Lock()
+        self._watches = {}
+        self._folder_mtime = None
+        self.start()
+        self._rescan()
+
+    # Add-ons are only jars which aren't hidden, same as enumerate_addons()
+    def _is_addon(self, path: str):
+        name = os.path.basename(path)
+        return name.endswith('.jar') and not name.startswith('.') and os.path.normcase(os.path.dirname(os.path.abspath(path))) == self.addon_path
+
+    def _add(self, path: str):
+        try:
+            entry = int(addon_file_hash(path))
+        except OSError:
+            return
+        self._remove(path)
+        self._entries[os.path.basename(path)] = entry
+        self._hash ^= entry
+
+    def _remove(self, path: str):
+        entry = self._entries.pop(os.path.basename(path), None)
+        if entry is not None:
+            self._hash ^= entry
+
+    def _stat_folder(self):
+        try:
+            return os.stat(self.addon_path).st_mtime_ns
+        except OSError:
+            return None
+
+    # Full listing of the enabled folder, only the file sizes are read
+    def _rescan(self):
+        with self._lock:
+            self._folder_mtime = self._stat_folder()
+            self._entries = {}
+            self._hash = 0
+            if self._folder_mtime is not None:
+                for entry in os.scandir(self.addon_path):
+                    if self._is_addon(entry.path) and entry.is_file():
+                        self._add(entry.path)
+
+    # Resets the hash from a fresh enumerate_addons() list, since watch events can arrive late
+    def sync(self, enabled_addons: list):
+        with self._lock:
+            self._folder_mtime = self._stat_folder()
+            self._entries = {os.path.basename(addon.path): int(addon.hash) for addon in enabled_addons}
+            self._hash = 0
+            for entry in self._entries.values():
+                self._hash ^= entry
+
+    # Schedules watches for the add-on folders which exist, the rest are checked when the hash is requested
+    def start(self):
+        if not Observer:
+            return
+
+        for folder in (self.addon_path, self.disabled_addon_path):
+            if folder not in self._watches and os.path.isdir(folder):
+                try:
+                    self._watches[folder] = addon_observer().schedule(self, folder, recursive=False)
+                except OSError:
+                    pass
+
+    def _unschedule(self, folder: str):
+        watch = self._watches.pop(folder, None)
+        if watch:
+            try:
+                addon_observer().unschedule(watch)
+            except (KeyError, OSError):
+                pass
+
+    # Watchdog event handlers
+    def on_created(self, event):
+        if not event.is_directory and self._is_addon(event.src_path):
+            with self._lock:
+                self._add(event.src_path)
+
+    def on_modified(self, event):
+        self.on_created(event)
+
+    def on_deleted(self, event):
+        folder = os.path.normcase(os.path.abspath(event.src_path))
+        if folder in self._watches:
+            self._unschedule(folder)
+            if folder == self.addon_path:
+                self._rescan()
+        elif not event.is_directory and self._is_addon(event.src_path):
+            with self._lock:
+                self._remove(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory:
+            return
+        with self._lock:
+            if self._is_addon(event.src_path):
+                self._remove(event.src_path)
+            if self._is_addon(event.dest_path):
+                self._add(event.dest_path)
+
+    # Returns the current hash of the enabled add-ons
+    # Without a watch on the folder, its mtime is checked instead and it's only listed again if it changed
+    def get_hash(self):
+        if self.addon_path not in self._watches:
+            if self._stat_folder() != self._folder_mtime:
+                self.start()
+                self._rescan()
+
+        with self._lock:
+            return str(self._hash)
+
+
+# Watches are shared between AddonManagers, since a new one is created every time a server is opened
+addon_watchers = {}
+_addon_observer = None
+_addon_watcher_lock = threading.RLock()
+
+def addon_observer():
+    global _addon_observer
+    with _addon_watcher_lock:
+        if not _addon_observer:
+            _addon_observer = Observer()
+            _addon_observer.daemon = True
+            _addon_observer.start()
+        return _addon_observer
+
+def get_addon_watcher(addon_path: str, disabled_addon_path: str):
+    key = os.path.normcase(os.path.abspath(addon_path))
+    with _addon_watcher_lock:
+        if key not in addon_watchers:
+            addon_watchers[key] = AddonWatcher(addon_path, disabled_addon_path)
+        else:
+            addon_watchers[key].start()
+        return addon_watchers[key]
+
+
+
+# ---------------------------------------- Addon Update Functions ------------------------------------------------------
+
+# Servers which share an add-on, type and version share the same lookup
+def update_lookup_key(addon: AddonFileObject, server_properties):
+    author = addon.author.lower() if addon.author else None
+    return ('addon', addon.id, addon.name, author, constants.server_type(server_properties['type']), server_properties['version'])
+
+
+# Returns the latest version string for an update_lookup_key()
+def latest_addon_version(key: tuple, addon: AddonFileObject, server_properties):
+    if key[0] == 'geyser':
+        return constants.get_url('https://download.geysermc.org/v2/projects/geyser/versions/latest/builds/latest', return_response=True).json()['version']
+
+    update = get_update_url(addon, server_properties['version'], server_properties['type'])
+    return update.addon_version if update else None
+
+
+# Checks servers for add-on updates at once, [(server_properties, enabled_addons)] --> {server_name: update_required}
+# Each lookup only runs once for every server, and it's dropped if all of its servers already have an update
+def check_updates(server_list: list, workers=None):
+    results = {}
+    lookups = {}
+    dependents = {}
+
+    for server_properties, addon_list in server_list:
+        results[server_properties['name']] = False
+
+        for addon in addon_list:
+            keys = [update_lookup_key(addon, server_properties)]
+
+            # Check for Geyser updates
+            if addon.author and addon.author.lower() == 'geysermc' and addon.id == 'geyser':
+                keys.insert(0, ('geyser',))
+
+            for key in keys:
+                lookups.setdefault(key, (addon, server_properties))
+                dependents.setdefault(key, []).append((server_properties['name'], addon.addon_version))
+
+    if not lookups:
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(workers or constants.update_concurrency, len(lookups))) as pool:
+        futures = {pool.submit(latest_addon_version, key, *lookup): key for key, lookup in lookups.items()}
+        pending = set(futures)
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled() or future.exception():
+                    continue
+
+                latest = future.result()
+                for server_name, addon_version in dependents[futures[future]]:
+                    try:
+                        if not results[server_name] and constants.check_app_version(addon_version, latest, limit=3):
+                            results[server_name] = True
+                    except (AttributeError, TypeError, ValueError):
+                        continue
+
+            for future in pending:
+                if all(results[server_name] for server_name, addon_version in dependents[futures[future]]):
+                    future.cancel()
+
+    return results
+
+
+# Checks every server in the list for add-on updates, server_name --> update_required
+def check_for_updates_bulk(server_names: list, workers=None):
+    server_list = []
+
+    for server_name in server_names:
+        server_properties = dump_config(server_name)
+        if not server_properties['type'] or server_properties['type'] == 'vanilla' or server_properties['is_modpack']:
+            continue
+
+        server_list.append((server_properties, enumerate_addons(server_properties)['enabled']))
+
+    if not constants.app_online:
+        return {server_properties['name']: False for server_properties, addon_list in server_list}
+
+    return check_updates(server_list, workers)
+
+
+
 # ------------------------------------------ Addon List Functions ------------------------------------------------------
 
 # Creates a dictionary of enabled and disabled addons
@@ -999,26 +1331,24 @@ def enumerate_addons(server_properties, single_list=False):
     addon_folder = constants.server_path(server_properties['name'], addon_folder)
     disabled_addon_folder = constants.server_path(server_properties['name'], disabled_addon_folder)
 
+    # List jars in both folders, and only read the ones which aren't cached
+    addon_list = []
+    for folder, enabled in ((addon_folder, True), (disabled_addon_folder, False)):
+        if folder:
+            addon_list.extend((entry.path, enabled) for entry in os.scandir(folder) if entry.name.endswith('.jar') and not entry.name.startswith('.') and entry.is_file())
+
+    cache_keys = {addon_path: addon_cache_key(addon_path) for addon_path, enabled in addon_list}
+    cached = {addon_path: constants.addon_cache.get(key) for addon_path, key in cache_keys.items()}
+    scanned = scan_addon_metadata([addon_path for addon_path, metadata in cached.items() if not metadata], constants.server_type(server_properties['type']))
+    for addon_path, metadata in scanned.items():
+        constants.addon_cache[cache_keys[addon_path]] = metadata
+        cached[addon_path] = metadata
+
     enabled_addons = []
     disabled_addons = []
-
-    # Get list of enabled AddonFileObjects
-    if addon_folder:
-        with ThreadPoolExecutor(max_workers=15) as pool:
-            def enabled(addon, *a):
-                addon = get_addon_file(addon, server_properties, enabled=True)
-                if addon:
-                    enabled_addons.append(addon)
-            pool.map(enabled, glob(os.path.join(addon_folder, "*")))
-        enabled_addons = list(filter(lambda item: item is not None, enabled_addons))
-
-    if disabled_addon_folder:
-        with ThreadPoolExecutor(max_workers=15) as pool:
-            def disabled(addon, *a):
-                addon = get_addon_file(addon, server_properties, enabled=False)
-                if addon:
-                    disabled_addons.append(addon)
-            pool.map(disabled, glob(os.path.join(disabled_addon_folder, "*")))
+    for addon_path, enabled in addon_list:
+        addon = get_addon_file(addon_path, server_properties, enabled=enabled, metadata=cached[addon_path])
+        (enabled_addons if enabled else disabled_addons).append(addon)
 
     if single_list:
         new_list = constants.deepcopy(enabled_addons)
@@ -1,10 +1,36 @@
 from datetime import datetime as dt
-from functools import reduce
+from functools import reduce, partial
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from glob import glob
 import constants
+import tarfile
+import threading
+import hashlib
+import shutil
+import json
+import gzip
 import time
+import struct
+import heapq
+import errno
+import ctypes
+import zlib
+import io
 import os
 
+# Copy-on-write file clones for snapshots, fcntl is only on Unix
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Optional, enables zstd compressed back-ups
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 # Auto-MCS Back-up API
 # ----------------------------------------------- Backup Objects -------------------------------------------------------
@@ -14,40 +40,23 @@ import os
 class BackupObject():
 
     def grab_config(self):
-        cwd = constants.get_cwd()
-        extract_folder = os.path.join(constants.tempDir, 'bkup_tmp')
-        constants.folder_check(extract_folder)
-        os.chdir(extract_folder)
-
-        # Extract auto-mcs.ini from back-up file to grab version information
-        constants.run_proc(f'tar -xvf "{self.path}" auto-mcs.ini')
-        constants.run_proc(f'tar -xvf "{self.path}" .auto-mcs.ini')
-
-        cfg_list = glob(os.path.join(extract_folder, 'auto-mcs.ini'))
-        cfg_list.extend(glob(os.path.join(extract_folder, '.auto-mcs.ini')))
-
-        for cfg in cfg_list:
-            config = constants.configparser.ConfigParser(allow_no_value=True, comment_prefixes=';')
-            config.optionxform = str
-            config.read(cfg)
-            if config:
-
-                # If auto-mcs.ini exists, grab version and type information
-                if config.get('general', 'serverName') == self.name:
-                    self.type = config.get('general', 'serverType')
-                    self.version = config.get('general', 'serverVersion')
-                    try:
-                        self.build = config.get('general', 'serverBuild')
-                    except:
-                        self.build = None
 
-                os.remove(cfg)
-                break
+        # Use the back-up index when possible, otherwise read auto-mcs.ini straight from the back-up file
+        metadata = lookup_index(self.path)
+        if not metadata:
+            metadata = read_archive_config(self.path)
+        self._load_metadata(metadata)
 
-        constants.safe_delete(extract_folder)
-        os.chdir(cwd)
+    def _load_metadata(self, metadata: dict):
 
-    def __init__(self, server_name: str, backup_info: list, no_fetch=False):
+        # If auto-mcs.ini exists, grab version and type information
+        if metadata.get('server') == self.name:
+            self.type = metadata['type']
+            self.version = metadata['version']
+            self.build = metadata['build']
+        self.checksum = metadata.get('checksum')
+
+    def __init__(self, server_name: str, backup_info: list, no_fetch=False, metadata=None):
         self.name = server_name
 
         self.path = backup_info[0]
@@ -57,8 +66,11 @@ class BackupObject():
         self.type = 'Unknown'
         self.version = 'Unknown'
         self.build = None
+        self.checksum = None
 
-        if not no_fetch:
+        if metadata:
+            self._load_metadata(metadata)
+        elif not no_fetch:
             self.grab_config()
 
 
@@ -71,8 +83,13 @@ class BackupManager():
         self.directory = self._backup_stats['backup-path']
         self.auto_backup = self._backup_stats['auto-backup']
         self.maximum = self._backup_stats['max-backup']
+        self.compression = self._backup_stats['compression']
+        self.mode = self._backup_stats['mode']
+        self.snapshot = self._backup_stats['snapshot']
+        self.priority = self._backup_stats['priority']
+        self.interval = self._backup_stats['interval']
         self.total_size = self._backup_stats['total-size-bytes']
-        self.list = [BackupObject(self._server['name'], file, no_fetch=True) for file in self._backup_stats['backup-list']]
+        self.list = [BackupObject(self._server['name'], file, no_fetch=True, metadata=self._backup_stats['metadata'].get(os.path.basename(file[0]))) for file in self._backup_stats['backup-list']]
         if self.list:
             self.latest = self.list[0]
         else:
@@ -85,8 +102,13 @@ class BackupManager():
         self.directory = self._backup_stats['backup-path']
         self.auto_backup = self._backup_stats['auto-backup']
         self.maximum = self._backup_stats['max-backup']
+        self.compression = self._backup_stats['compression']
+        self.mode = self._backup_stats['mode']
+        self.snapshot = self._backup_stats['snapshot']
+        self.priority = self._backup_stats['priority']
+        self.interval = self._backup_stats['interval']
         self.total_size = self._backup_stats['total-size-bytes']
-        self.list = [BackupObject(self._server['name'], file, no_fetch=True) for file in self._backup_stats['backup-list']]
+        self.list = [BackupObject(self._server['name'], file, no_fetch=True, metadata=self._backup_stats['metadata'].get(os.path.basename(file[0]))) for file in self._backup_stats['backup-list']]
         if self.list:
             self.latest = self.list[0]
         else:
@@ -96,20 +118,33 @@ class BackupManager():
     # Backup functions
 
     # Backs up server to the backup directory in auto-mcs.ini
-    def save(self, ignore_running=False):
-        backup = backup_server(self._server['name'], self._backup_stats, ignore_running)
+    def save(self, ignore_running=False, progress_func=None):
+        backup = backup_server(self._server['name'], self._backup_stats, ignore_running, progress_func)
         self._update_data()
         return backup
 
+    # Adds a back-up to the scheduler queue instead of running it now, returns a BackupJob
+    # priority overrides the server's priority for this back-up
+    def queue(self, priority=None, ignore_running=False):
+        return constants.server_manager.backup_scheduler.queue(self._server['name'], priority, ignore_running)
+
     # Restores server from file name
-    def restore(self, backup_obj: BackupObject):
+    def restore(self, backup_obj: BackupObject, progress_func=None):
         if self._server['name'] not in constants.server_manager.running_servers:
-            backup = restore_server(self._server['name'], backup_obj.path, self._backup_stats)
+            backup = restore_server(self._server['name'], backup_obj.path, self._backup_stats, progress_func)
             self._update_data()
             return backup
         else:
             return None
 
+    # Reports what a restore would change without touching the server, see restore_archive() for the returned stats
+    def preview_restore(self, backup_obj: BackupObject, checksum=False):
+        return preview_restore(self._server['name'], backup_obj.path, self._backup_stats, checksum)
+
+    # Checks that a back-up is readable and matches its checksums without extracting it
+    def verify(self, backup_obj: BackupObject, workers=None):
+        return verify_backup(self._server['name'], backup_obj.path, self._backup_stats, workers)
+
     # Moves backup directory to new_path
     def set_directory(self, new_directory: str):
         path = set_backup_directory(self._server['name'], new_directory)
@@ -123,6 +158,39 @@ class BackupManager():
         self._update_data()
         return new_amt
 
+    # Sets compression for new back-ups
+    # compression: 'none', 'gzip', or 'zstd'
+    def set_compression(self, compression: str):
+        new_compression = set_backup_compression(self._server['name'], compression)
+        self._update_data()
+        return new_compression
+
+    # Sets how new back-ups are stored
+    # mode: 'full' or 'incremental'
+    def set_mode(self, mode: str):
+        new_mode = set_backup_mode(self._server['name'], mode)
+        self._update_data()
+        return new_mode
+
+    # Toggle snapshots, which resume saving as soon as the server is copied instead of after it's archived
+    def enable_snapshot(self, enabled=True):
+        status = enable_backup_snapshot(self._server['name'], enabled)
+        self._update_data()
+        return status
+
+    # Sets the queue priority of this server's back-ups, higher runs first
+    def set_priority(self, priority: int):
+        new_priority = set_backup_priority(self._server['name'], priority)
+        self._update_data()
+        return new_priority
+
+    # Sets how often the back-up scheduler saves this server while it's running
+    # hours: <int> or 0 to disable
+    def set_interval(self, hours: int):
+        new_interval = set_backup_interval(self._server['name'], hours)
+        self._update_data()
+        return new_interval
+
     # Toggle auto backup status
     def enable_auto_backup(self, enabled=True):
         status = enable_auto_backup(self._server['name'], enabled)
@@ -210,10 +278,16 @@ def dump_config(server_name: str, new_server=False):
         'backup-path': constants.backupFolder,
         'auto-backup': 'prompt',
         'max-backup': '5',
+        'compression': 'none',
+        'mode': 'full',
+        'snapshot': False,
+        'priority': 0,
+        'interval': 0,
         'latest-backup': None,
         'total-size': convert_size(0),
         'total-size-bytes': 0,
-        'backup-list': []
+        'backup-list': [],
+        'metadata': {}
     }
 
 
@@ -229,12 +303,37 @@ def dump_config(server_name: str, new_server=False):
             backup_stats['backup-path'] = str(server_config.get("bkup", "bkupDir"))
             backup_stats['auto-backup'] = str(server_config.get("bkup", "bkupAuto").lower())
             backup_stats['max-backup'] = str(server_config.get("bkup", "bkupMax"))
+            try:
+                if server_config.get("bkup", "bkupCompression") in compression_types:
+                    backup_stats['compression'] = server_config.get("bkup", "bkupCompression")
+            except:
+                pass
+            try:
+                if server_config.get("bkup", "bkupMode") in backup_modes:
+                    backup_stats['mode'] = server_config.get("bkup", "bkupMode")
+            except:
+                pass
+            try:
+                backup_stats['snapshot'] = server_config.get("bkup", "bkupSnapshot").lower() == 'true'
+            except:
+                pass
+            try:
+                backup_stats['priority'] = int(server_config.get("bkup", "bkupPriority"))
+            except:
+                pass
+            try:
+                backup_stats['interval'] = int(server_config.get("bkup", "bkupInterval"))
+            except:
+                pass
 
 
     # Generate backup list and metadata
     if constants.server_path(server_name):
 
-        backup_stats['backup-list'] = sorted([[file, os.stat(file).st_size, os.stat(file).st_mtime] for file in glob(os.path.join(backup_stats['backup-path'], f'{server_dict["name"]}__*'))], key=lambda x: x[2], reverse=True)
+        # Back-ups are listed from the index, which only rescans the directory when it has changed
+        backup_index = load_index(backup_stats['backup-path'])
+        backup_stats['metadata'] = {file_name: metadata for file_name, metadata in backup_index.items() if file_name.startswith(f'{server_dict["name"]}__')}
+        backup_stats['backup-list'] = sorted([[os.path.join(backup_stats['backup-path'], file_name), metadata['size'], metadata['mtime']] for file_name, metadata in backup_stats['metadata'].items()], key=lambda x: x[2], reverse=True)
 
         try:
             backup_stats['latest-backup'] = convert_date(backup_stats['backup-list'][0][2])
@@ -250,10 +349,1102 @@ def dump_config(server_name: str, new_server=False):
 
 
 
+# ---------------------------------------------- Archive Functions -----------------------------------------------------
+
+# Files which can't or shouldn't be read while the server is running
+archive_exclude = ('session.lock',)
+
+# Per-member checksums written at the end of every back-up
+checksums_name = '.amb-checksums.json'
+
+# Compression formats for new back-ups, restores detect the format from the file itself
+# 'zstd' requires the optional "zstandard" package
+compression_types = ('none', 'gzip', 'zstd')
+zstd_magic = b'\x28\xb5\x2f\xfd'
+
+
+# Number of threads to compress with, see constants.backup_workers
+def compression_workers():
+    if constants.backup_workers and constants.backup_workers > 0:
+        return int(constants.backup_workers)
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+# Writes a standard gzip stream while compressing 1 MiB blocks on multiple threads (like pigz)
+# Each block is primed with the end of the previous one, so the ratio stays close to single-threaded gzip
+class _ParallelGzipWriter():
+    block_size = 1048576
+    window_size = 32768
+
+    def __init__(self, file, workers: int, level=6):
+        self._file = file
+        self._level = level
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='backup-gzip')
+        self._pending = deque()
+        self._max_pending = workers * 2
+        self._buffer = bytearray()
+        self._dictionary = b''
+        self._crc = 0
+        self._size = 0
+
+        # Header: magic, deflate, no flags, mtime, max compression, unknown OS
+        self._file.write(b'\x1f\x8b\x08\x00' + struct.pack('<I', int(time.time())) + b'\x02\xff')
+
+    def _compress(self, block: bytes, dictionary: bytes):
+        if dictionary:
+            compressor = zlib.compressobj(self._level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY, dictionary)
+        else:
+            compressor = zlib.compressobj(self._level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def _submit(self, block: bytes):
+        self._crc = zlib.crc32(block, self._crc)
+        self._size += len(block)
+        self._pending.append(self._pool.submit(self._compress, block, self._dictionary))
+        self._dictionary = block[-self.window_size:]
+
+        # Blocks are written in order, and the queue is bounded so memory use stays flat
+        while len(self._pending) > self._max_pending:
+            self._file.write(self._pending.popleft().result())
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._file.write(self._pending.popleft().result())
+        self._pool.shutdown()
+
+        # Empty final block, then the trailer
+        self._file.write(b'\x03\x00' + struct.pack('<II', self._crc, self._size & 0xffffffff))
+
+
+# Hashes an archive while it's being written, so the back-up index gets a checksum without reading it again
+class _HashingWriter():
+    def __init__(self, file, throttle=None):
+        self._file = file
+        self._throttle = throttle
+        self.hash = hashlib.sha256()
+
+    def write(self, data):
+        if self._throttle:
+            self._throttle(len(data))
+        self.hash.update(data)
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+
+# Reads a file for tarfile, padding with zeros if it shrinks while being archived (like GNU tar)
+# Keeps a CRC-32 of what was written for the checksum manifest
+class _PaddedReader():
+    def __init__(self, file, size: int, throttle=None):
+        self._file = file
+        self._remaining = size
+        self._throttle = throttle
+        self.crc = 0
+
+    def read(self, size=-1):
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        if self._throttle:
+            self._throttle(size)
+        data = self._file.read(size)
+        if len(data) < size:
+            data += b'\0' * (size - len(data))
+        self._remaining -= len(data)
+        self.crc = zlib.crc32(data, self.crc)
+        return data
+
+
+# Opens a back-up for reading regardless of compression
+# zstd archives can only be read sequentially, so iterate members in order with extractfile()
+# archive._raw_file is the underlying file, its position can be used for progress
+def open_archive(archive_path: str):
+    file = open(archive_path, 'rb')
+    magic = file.read(4)
+    file.seek(0)
+
+    try:
+        if magic == zstd_magic:
+            if not zstandard:
+                raise tarfile.ReadError(f"'{os.path.basename(archive_path)}' is compressed with zstd, which is not available")
+            archive = tarfile.open(fileobj=zstandard.ZstdDecompressor().stream_reader(file), mode='r|')
+        else:
+            archive = tarfile.open(fileobj=file, mode='r')
+    except:
+        file.close()
+        raise
+
+    archive._raw_file = file
+    return archive
+
+
+# Closes an archive from open_archive()
+def close_archive(archive):
+    archive.close()
+    raw_file = getattr(archive, '_raw_file', None)
+    if raw_file:
+        raw_file.close()
+
+
+# Returns the compression of an existing back-up, one of compression_types
+def archive_compression(archive_path: str):
+    with open(archive_path, 'rb') as f:
+        magic = f.read(4)
+    if magic == zstd_magic:
+        return 'zstd'
+    if magic[:2] == b'\x1f\x8b':
+        return 'gzip'
+    return 'none'
+
+
+# Compresses an archive as it's written, returns None for uncompressed archives
+# Closing it flushes the last blocks and trailer, but leaves raw_file open
+def _compressed_writer(raw_file, compression: str, workers: int):
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3, threads=workers if workers > 1 else 0, write_checksum=True).stream_writer(raw_file, closefd=False)
+    elif compression == 'gzip' and workers > 1:
+        return _ParallelGzipWriter(raw_file, workers)
+    elif compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=6)
+    return None
+
+
+# Lists (path, arcname, size) for every entry in a directory, directories are included so empty ones are kept
+def list_archive_files(source_dir: str, exclude=archive_exclude):
+    file_list = []
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        relative_root = os.path.relpath(root, source_dir)
+
+        for directory in dirs:
+            path = os.path.join(root, directory)
+            file_list.append((path, os.path.normpath(os.path.join(relative_root, directory)).replace('\\', '/'), 0))
+
+        for file in sorted(files):
+            if file.endswith(exclude):
+                continue
+            path = os.path.join(root, file)
+            try:
+                size = os.lstat(path).st_size
+            except OSError:
+                continue
+            file_list.append((path, os.path.normpath(os.path.join(relative_root, file)).replace('\\', '/'), size))
+
+    return file_list
+
+
+# Streams a directory straight into a tar archive without making a copy first
+# progress_func receives a percentage, returns {'files', 'bytes', 'seconds', 'throughput', 'checksum', 'workers'} (throughput is in MB/s)
+# With a chunk_store, file contents go to the store instead and the archive only holds a manifest (see store_chunks)
+# workers sets the compression threads, defaults to compression_workers()
+# throttle is called with the amount of bytes before each read and write, see TokenBucket.consume()
+def write_archive(source_dir: str, archive_path: str, compression='none', progress_func=None, file_list=None, chunk_store=None, previous_manifest=None, workers=None, throttle=None):
+    if compression == 'zstd' and not zstandard:
+        compression = 'gzip'
+    if not workers:
+        workers = compression_workers()
+
+    if file_list is None:
+        file_list = list_archive_files(source_dir)
+
+    total_bytes = sum(item[2] for item in file_list) or 1
+    written = 0
+    stored = 0
+    checksums = {}
+    manifest = {'version': 1, 'chunk-size': chunk_size, 'files': {}} if chunk_store else None
+    previous_files = previous_manifest['files'] if previous_manifest else {}
+    last_percent = -1
+    start_time = time.perf_counter()
+
+    with open(archive_path, 'wb') as output_file:
+        raw_file = _HashingWriter(output_file, throttle)
+        compressed_file = _compressed_writer(raw_file, compression, workers)
+
+        try:
+            with tarfile.open(fileobj=compressed_file or raw_file, mode='w|', bufsize=1048576, copybufsize=1048576) as archive:
+                for path, arcname, size in file_list:
+                    try:
+                        if os.path.isfile(path) and not os.path.islink(path) and manifest and arcname not in inline_files:
+                            manifest['files'][arcname], new_bytes = store_chunks(path, chunk_store, previous_files.get(arcname), throttle)
+                            written += manifest['files'][arcname]['size']
+                            stored += new_bytes
+                        elif os.path.isfile(path) and not os.path.islink(path):
+                            with open(path, 'rb') as f:
+                                tarinfo = archive.gettarinfo(arcname=arcname, fileobj=f)
+                                reader = _PaddedReader(f, tarinfo.size, throttle)
+                                archive.addfile(tarinfo, reader)
+                                checksums[arcname] = [tarinfo.size, reader.crc]
+                                written += tarinfo.size
+                        else:
+                            archive.add(path, arcname=arcname, recursive=False)
+
+                    # File was deleted or locked while archiving
+                    except (FileNotFoundError, PermissionError) as e:
+                        if constants.debug:
+                            print(f"Back-up: skipping '{arcname}': {e}")
+
+                    if progress_func:
+                        percent = min(round((written / total_bytes) * 100), 100)
+                        if percent != last_percent:
+                            last_percent = percent
+                            progress_func(percent)
+
+                if manifest:
+                    data = json.dumps(manifest, separators=(',', ':')).encode()
+                    tarinfo = tarfile.TarInfo(manifest_name)
+                    tarinfo.size = len(data)
+                    tarinfo.mtime = time.time()
+                    archive.addfile(tarinfo, io.BytesIO(data))
+                    checksums[manifest_name] = [len(data), zlib.crc32(data)]
+
+                # Checksums of every member go last, so verify_archive() can check the archive without a copy
+                data = json.dumps({'version': 1, 'algorithm': 'crc32', 'files': checksums}, separators=(',', ':')).encode()
+                tarinfo = tarfile.TarInfo(checksums_name)
+                tarinfo.size = len(data)
+                tarinfo.mtime = time.time()
+                archive.addfile(tarinfo, io.BytesIO(data))
+
+        # Flushes the last blocks and trailer, and stops compression threads if archiving failed
+        finally:
+            if compressed_file:
+                compressed_file.close()
+
+    seconds = time.perf_counter() - start_time
+    stats = {
+        'files': len(file_list),
+        'bytes': written,
+        'seconds': seconds,
+        'throughput': round((written / 1048576) / seconds, 2) if seconds else 0,
+        'checksum': raw_file.hash.hexdigest(),
+        'workers': workers if compression != 'none' else 0
+    }
+    if manifest:
+        stats['stored'] = stored
+        stats['manifest'] = manifest
+    return stats
+
+
+# Copies a back-up to new_path with edit_func(config) applied to its auto-mcs.ini, without extracting it
+# Members are streamed into a new archive in the original compression, and the checksums are updated to match
+# Returns the SHA-256 of the new archive for the back-up index
+def rewrite_archive_config(archive_path: str, new_path: str, edit_func, workers=None):
+    if not workers:
+        workers = compression_workers()
+
+    compression = archive_compression(archive_path)
+    temp_path = f'{new_path}.tmp'
+    checksums = None
+    edited = {}
+
+    archive = open_archive(archive_path)
+    try:
+        with open(temp_path, 'wb') as output_file:
+            raw_file = _HashingWriter(output_file)
+            compressed_file = _compressed_writer(raw_file, compression, workers)
+
+            try:
+                with tarfile.open(fileobj=compressed_file or raw_file, mode='w|', bufsize=1048576, copybufsize=1048576) as new_archive:
+                    for member in archive:
+                        arcname = _clean_arcname(member.name)
+                        if not member.isreg():
+                            new_archive.addfile(member)
+
+                        elif arcname == checksums_name:
+                            checksums = json.loads(archive.extractfile(member).read())
+
+                        elif arcname in inline_files:
+                            config = constants.configparser.ConfigParser(allow_no_value=True, comment_prefixes=';')
+                            config.optionxform = str
+                            config.read_string(archive.extractfile(member).read().decode('utf-8', errors='ignore'))
+                            edit_func(config)
+
+                            config_file = io.StringIO()
+                            config.write(config_file)
+                            data = config_file.getvalue().encode()
+                            member.size = len(data)
+                            new_archive.addfile(member, io.BytesIO(data))
+                            edited[arcname] = [len(data), zlib.crc32(data)]
+
+                        else:
+                            new_archive.addfile(member, archive.extractfile(member))
+
+                    # Checksums still go last, with the edited config's entry replaced
+                    if checksums:
+                        checksums['files'].update(edited)
+                        data = json.dumps(checksums, separators=(',', ':')).encode()
+                        tarinfo = tarfile.TarInfo(checksums_name)
+                        tarinfo.size = len(data)
+                        tarinfo.mtime = time.time()
+                        new_archive.addfile(tarinfo, io.BytesIO(data))
+
+            finally:
+                if compressed_file:
+                    compressed_file.close()
+
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    finally:
+        close_archive(archive)
+
+    # Keep the original date so the back-up stays in the same place when sorted
+    shutil.copystat(archive_path, temp_path)
+    os.replace(temp_path, new_path)
+    return raw_file.hash.hexdigest()
+
+
+
+# Returns a safe relative path for an archive member, or None if it would escape the destination
+def _clean_arcname(name: str):
+    name = os.path.normpath(name.replace('\\', '/')).replace('\\', '/')
+    if name in ('.', '..') or name.startswith(('../', '/')) or os.path.splitdrive(name)[0]:
+        return None
+    return name
+
+
+# Removes a file, link, or directory tree
+def _remove_path(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def _read_blocks(fileobj):
+    while True:
+        data = fileobj.read(chunk_size)
+        if not data:
+            break
+        yield data
+
+
+def _read_chunks(chunk_store: str, chunks: list):
+    for digest in chunks:
+        with open(_chunk_path(chunk_store, digest), 'rb') as f:
+            yield f.read()
+
+
+# Writes blocks to a file, only rewriting the blocks which differ from what's already on disk
+# Returns the amount of bytes written, or which would be written with dry_run
+def _sync_blocks(blocks, path: str, dry_run=False):
+    written = 0
+
+    # Hardlinked files are shared with other servers (see constants.ArtifactCache), so they're replaced instead of patched
+    shared = os.path.isfile(path) and not os.path.islink(path) and os.stat(path).st_nlink > 1
+
+    if not os.path.isfile(path) or os.path.islink(path) or (shared and not dry_run):
+        if dry_run:
+            return sum(len(block) for block in blocks)
+
+        if os.path.lexists(path):
+            _remove_path(path)
+        with open(path, 'wb') as f:
+            for block in blocks:
+                f.write(block)
+                written += len(block)
+        return written
+
+    offset = 0
+    with open(path, 'rb' if dry_run else 'r+b') as f:
+        for block in blocks:
+            if f.read(len(block)) != block:
+                if not dry_run:
+                    f.seek(offset)
+                    f.write(block)
+                written += len(block)
+            offset += len(block)
+
+        if not dry_run:
+            f.truncate(offset)
+
+    return written
+
+
+# Restores a back-up over server_dir, only touching what differs instead of deleting everything first
+# Files with the same size and mtime are kept (checksum=True compares their contents too), changed files are rewritten
+# block by block, and anything that isn't in the back-up is removed. dry_run only reports what would be done
+# Returns {'files', 'bytes', 'unchanged', 'deleted', 'missing', 'seconds'} ('missing' lists files without chunks)
+def restore_archive(archive_path: str, server_dir: str, chunk_store=None, dry_run=False, checksum=False, progress_func=None):
+    start_time = time.perf_counter()
+    stats = {'files': 0, 'bytes': 0, 'unchanged': 0, 'deleted': 0, 'missing': [], 'seconds': 0}
+    existing = {arcname: path for path, arcname, size in list_archive_files(server_dir, exclude=())}
+    restored = set()
+    manifest = None
+    last_percent = -1
+
+    # Progress follows the archive for full back-ups, and the chunked files for incremental ones
+    archive_size = os.path.getsize(archive_path) or 1
+    incremental = bool(chunk_store) and os.path.exists(os.path.join(chunk_store, 'manifests', f'{os.path.basename(archive_path)}.json'))
+
+    def report(percent):
+        nonlocal last_percent
+        percent = min(round(percent), 100)
+        if progress_func and percent != last_percent:
+            last_percent = percent
+            progress_func(percent)
+
+    def is_unchanged(path, size, mtime):
+        if checksum:
+            return False
+        try:
+            stat = os.lstat(path)
+        except OSError:
+            return False
+        return os.path.isfile(path) and not os.path.islink(path) and stat.st_size == size and int(stat.st_mtime) == int(mtime)
+
+    def restore_file(blocks, path, mode, mtime):
+        if not dry_run:
+            constants.folder_check(os.path.dirname(path))
+        created = not os.path.lexists(path)
+        written = _sync_blocks(blocks, path, dry_run)
+        if written or created:
+            stats['files'] += 1
+            stats['bytes'] += written
+        else:
+            stats['unchanged'] += 1
+        if not dry_run:
+            os.chmod(path, mode)
+            os.utime(path, (mtime, mtime))
+
+
+    archive = open_archive(archive_path)
+    try:
+        for member in archive:
+            arcname = _clean_arcname(member.name)
+            if not arcname:
+                continue
+
+            # Incremental back-ups store the manifest last, chunked files are restored afterwards
+            if arcname == manifest_name:
+                manifest = json.load(archive.extractfile(member))
+                continue
+            if arcname == checksums_name:
+                continue
+
+            path = os.path.join(server_dir, *arcname.split('/'))
+            restored.add(arcname)
+
+            if member.isdir():
+                if not dry_run and (not os.path.isdir(path) or os.path.islink(path)):
+                    if os.path.lexists(path):
+                        _remove_path(path)
+                    os.makedirs(path, exist_ok=True)
+
+            elif member.isreg():
+                if is_unchanged(path, member.size, member.mtime):
+                    stats['unchanged'] += 1
+                else:
+                    restore_file(_read_blocks(archive.extractfile(member)), path, member.mode, member.mtime)
+
+            elif member.issym():
+                if os.path.islink(path) and os.readlink(path) == member.linkname:
+                    stats['unchanged'] += 1
+                else:
+                    if not dry_run:
+                        if os.path.lexists(path):
+                            _remove_path(path)
+                        os.symlink(member.linkname, path)
+                    stats['files'] += 1
+
+            elif not dry_run:
+                archive.extract(member, server_dir, set_attrs=False)
+
+            if not incremental:
+                report((archive._raw_file.tell() / archive_size) * 100)
+
+    finally:
+        close_archive(archive)
+
+
+    if manifest:
+        total_bytes = sum(entry['size'] for entry in manifest['files'].values()) or 1
+        processed = 0
+
+        for arcname, entry in manifest['files'].items():
+            arcname = _clean_arcname(arcname)
+            if not arcname:
+                continue
+
+            path = os.path.join(server_dir, *arcname.split('/'))
+            restored.add(arcname)
+
+            if is_unchanged(path, entry['size'], entry['mtime']):
+                stats['unchanged'] += 1
+            else:
+                try:
+                    if not chunk_store:
+                        raise FileNotFoundError(arcname)
+                    restore_file(_read_chunks(chunk_store, entry['chunks']), path, entry['mode'], entry['mtime'])
+                except FileNotFoundError:
+                    stats['missing'].append(arcname)
+                    if constants.debug:
+                        print(f"Restore: missing chunks for '{arcname}'")
+
+            processed += entry['size']
+            report((processed / total_bytes) * 100)
+
+
+    # Remove anything which isn't in the back-up, children are sorted before their parent directory
+    for arcname in sorted(set(existing) - restored, reverse=True):
+        path = existing[arcname]
+        if not dry_run:
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    os.rmdir(path)
+                else:
+                    os.remove(path)
+            except OSError:
+                continue
+        stats['deleted'] += 1
+
+    report(100)
+    stats['seconds'] = time.perf_counter() - start_time
+    return stats
+
+
+# -------------------------------------------- Incremental Back-ups ----------------------------------------------------
+
+# Incremental back-ups only contain the server config and a manifest, file contents are split into chunks and kept once
+# in a shared store next to the back-ups, so unchanged files (and unchanged parts of region files) cost nothing to save
+backup_modes = ('full', 'incremental')
+chunk_size = 1048576
+chunk_folder = '.chunks'
+manifest_name = '.amb-manifest.json'
+
+# Always stored in the archive itself so the server info can be read without the chunk store
+inline_files = ('auto-mcs.ini', '.auto-mcs.ini')
+
+
+# Chunk store for a server in a back-up directory
+def chunk_store_path(backup_path: str, name: str):
+    return os.path.join(backup_path, chunk_folder, name)
+
+
+def _chunk_path(chunk_store: str, digest: str):
+    return os.path.join(chunk_store, digest[:2], digest)
+
+
+# Splits a file into chunks and adds the missing ones to the store
+# Returns (manifest entry, new bytes stored), a matching previous entry is reused without reading the file
+def store_chunks(path: str, chunk_store: str, previous=None, throttle=None):
+    stat = os.stat(path)
+
+    if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+        if all(os.path.exists(_chunk_path(chunk_store, digest)) for digest in previous['chunks']):
+            return previous, 0
+
+    chunks = []
+    size = 0
+    stored = 0
+    with open(path, 'rb') as f:
+        while True:
+            if throttle:
+                throttle(chunk_size)
+            data = f.read(chunk_size)
+            if not data:
+                break
+
+            digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+            chunk_path = _chunk_path(chunk_store, digest)
+            if not os.path.exists(chunk_path):
+                constants.folder_check(os.path.dirname(chunk_path))
+                temp_path = f'{chunk_path}.tmp'
+                with open(temp_path, 'wb') as chunk:
+                    chunk.write(data)
+                os.replace(temp_path, chunk_path)
+                stored += len(data)
+
+            chunks.append(digest)
+            size += len(data)
+
+    return {'size': size, 'mtime': stat.st_mtime, 'mode': stat.st_mode & 0o7777, 'chunks': chunks}, stored
+
+
+# Keeps a copy of each back-up's manifest so new back-ups and pruning don't have to open archives
+def save_manifest(chunk_store: str, backup_file: str, manifest: dict):
+    manifest_folder = os.path.join(chunk_store, 'manifests')
+    constants.folder_check(manifest_folder)
+    with open(os.path.join(manifest_folder, f'{os.path.basename(backup_file)}.json'), 'w') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+
+
+# Returns the most recent manifest that still has a back-up, or None
+def load_latest_manifest(chunk_store: str, backup_path: str):
+    manifest_list = glob(os.path.join(chunk_store, 'manifests', '*.json'))
+    for manifest_file in sorted(manifest_list, key=os.path.getmtime, reverse=True):
+        if os.path.exists(os.path.join(backup_path, os.path.basename(manifest_file)[:-5])):
+            try:
+                with open(manifest_file, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                continue
+    return None
+
+
+# Removes manifests of deleted back-ups, and any chunks no longer referenced by a back-up
+def prune_chunks(chunk_store: str, backup_path: str):
+    referenced = set()
+    for manifest_file in glob(os.path.join(chunk_store, 'manifests', '*.json')):
+        if not os.path.exists(os.path.join(backup_path, os.path.basename(manifest_file)[:-5])):
+            os.remove(manifest_file)
+            continue
+
+        try:
+            with open(manifest_file, 'r') as f:
+                for entry in json.load(f)['files'].values():
+                    referenced.update(entry['chunks'])
+
+        # Keep everything if a manifest can't be read
+        except (OSError, ValueError):
+            return 0
+
+    removed = 0
+    for chunk in glob(os.path.join(chunk_store, '??', '*')):
+        if os.path.basename(chunk) not in referenced:
+            removed += os.path.getsize(chunk)
+            os.remove(chunk)
+
+    return removed
+
+
+# Moves a server's chunk store when back-ups are migrated or renamed, manifests follow the back-up file names
+def move_chunk_store(current_store: str, new_store: str, name: str, new_name: str):
+    if not os.path.isdir(current_store):
+        return
+
+    if current_store != new_store and not os.path.exists(new_store):
+        constants.folder_check(os.path.dirname(new_store))
+        shutil.move(current_store, new_store)
+
+    if name != new_name:
+        for manifest_file in glob(os.path.join(new_store, 'manifests', f'{name}__*.json')):
+            new_file = os.path.basename(manifest_file).replace(f'{name}__', f'{new_name}__', 1)
+            os.replace(manifest_file, os.path.join(os.path.dirname(manifest_file), new_file))
+
+
+
+# ---------------------------------------------- Snapshot Back-ups -----------------------------------------------------
+
+# With snapshots enabled, a running server is copied to constants.snapshotDir right after "save-all flush" and saving
+# is turned back on immediately, the back-up is then archived from the copy instead of the live server
+_FICLONE = 0x40049409
+_reflink_unsupported = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EPERM)
+
+# Saving is back on while the snapshot is archived, so a hardlink would be read while the server writes to it
+# Only files which are replaced rather than written in place can be linked, region files, .dat files and plugin
+# databases are always cloned or copied
+snapshot_link_types = ('.jar', '.zip', '.gz')
+
+
+# Clones a file with copy-on-write (btrfs, XFS, APFS...), raises OSError if the filesystem doesn't support it
+def _reflink(source: str, destination: str):
+    if constants.os_name == 'linux':
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+
+    elif constants.os_name == 'macos':
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(source), os.fsencode(destination), 0) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    else:
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported')
+
+    shutil.copystat(source, destination)
+
+
+# Copies source_dir to snapshot_dir as cheaply as possible for each file:
+# - clones where the filesystem supports copy-on-write, these are true snapshots
+# - hardlinks jars and archives (see snapshot_link_types) which haven't been modified since "since"
+# - copies everything else
+# Returns {'files', 'cloned', 'linked', 'copied', 'seconds'}
+def create_snapshot(source_dir: str, snapshot_dir: str, since=None):
+    start_time = time.perf_counter()
+    stats = {'files': 0, 'cloned': 0, 'linked': 0, 'copied': 0, 'seconds': 0}
+    reflink = True
+
+    constants.safe_delete(snapshot_dir)
+    constants.folder_check(snapshot_dir)
+
+    for path, arcname, size in list_archive_files(source_dir):
+        target = os.path.join(snapshot_dir, *arcname.split('/'))
+
+        try:
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), target)
+                continue
+            if os.path.isdir(path):
+                os.makedirs(target, exist_ok=True)
+                continue
+
+            stats['files'] += 1
+            if reflink:
+                try:
+                    _reflink(path, target)
+                    stats['cloned'] += 1
+                    continue
+                except OSError as e:
+                    if e.errno not in _reflink_unsupported:
+                        raise
+                    reflink = False
+
+            if since and path.endswith(snapshot_link_types) and os.stat(path).st_mtime < since:
+                try:
+                    if os.path.exists(target):
+                        os.remove(target)
+                    os.link(path, target)
+                    stats['linked'] += 1
+                    continue
+                except OSError:
+                    pass
+
+            shutil.copy2(path, target)
+            stats['copied'] += 1
+
+        # File was deleted or locked while copying
+        except (FileNotFoundError, PermissionError) as e:
+            if constants.debug:
+                print(f"Snapshot: skipping '{arcname}': {e}")
+
+    stats['seconds'] = time.perf_counter() - start_time
+    return stats
+
+
+# ------------------------------------------------ Back-up Index -------------------------------------------------------
+
+# Each back-up directory keeps an index of the back-ups inside, so listing them doesn't need to open every archive
+# {'version': 1, 'backups': {file name: {'server', 'type', 'version', 'build', 'size', 'mtime', 'checksum'}}}
+index_name = '.amb-index.json'
+index_version = 1
+_index_lock = threading.RLock()
+
+# Back-up path --> (directory mtime, index), the directory is only rescanned when it changes
+_index_cache = {}
+
+
+# Reads server info from auto-mcs.ini inside of a back-up without extracting it
+def read_archive_config(archive_path: str):
+    metadata = {'server': None, 'type': 'Unknown', 'version': 'Unknown', 'build': None}
+
+    try:
+        archive = open_archive(archive_path)
+    except (OSError, tarfile.TarError):
+        return metadata
+
+    try:
+        for member in archive:
+            if member.isreg() and _clean_arcname(member.name) in inline_files:
+                config = constants.configparser.ConfigParser(allow_no_value=True, comment_prefixes=';')
+                config.optionxform = str
+                config.read_string(archive.extractfile(member).read().decode('utf-8', errors='ignore'))
+
+                metadata['server'] = config.get('general', 'serverName')
+                metadata['type'] = config.get('general', 'serverType')
+                metadata['version'] = config.get('general', 'serverVersion')
+                try:
+                    metadata['build'] = config.get('general', 'serverBuild')
+                except:
+                    metadata['build'] = None
+                break
+
+    except (OSError, tarfile.TarError, constants.configparser.Error):
+        pass
+
+    finally:
+        close_archive(archive)
+
+    return metadata
+
+
+def _write_index(backup_path: str, index: dict):
+    index_file = os.path.join(backup_path, index_name)
+    temp_file = f'{index_file}.tmp'
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump({'version': index_version, 'backups': index}, f, indent=2)
+        os.replace(temp_file, index_file)
+    except OSError as e:
+        if constants.debug:
+            print(f"Back-up index: failed to write '{index_file}': {e}")
+
+    # Writing the index changes the directory mtime, so cache it afterwards
+    try:
+        _index_cache[backup_path] = (os.stat(backup_path).st_mtime_ns, index)
+    except OSError:
+        pass
+
+
+# Returns the cached index for backup_path, only use it while holding _index_lock
+# New or changed back-ups are read once and saved to the index, deleted ones are dropped
+def _load_index(backup_path: str):
+    with _index_lock:
+        try:
+            directory_mtime = os.stat(backup_path).st_mtime_ns
+        except OSError:
+            return {}
+
+        cached = _index_cache.get(backup_path)
+        if cached and cached[0] == directory_mtime:
+            return cached[1]
+
+        index = {}
+        try:
+            with open(os.path.join(backup_path, index_name), 'r') as f:
+                data = json.load(f)
+            if data.get('version') == index_version:
+                index = data['backups']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+        # Reconcile with the directory, this only stats files unless there's a new back-up
+        changed = False
+        current = {}
+        for entry in os.scandir(backup_path):
+            if '__' in entry.name and not entry.name.startswith('.') and not entry.name.endswith('.tmp') and entry.is_file():
+                current[entry.name] = entry.stat()
+
+        for file_name in list(index):
+            if file_name not in current:
+                del index[file_name]
+                changed = True
+
+        for file_name, stat in current.items():
+            metadata = index.get(file_name)
+            if not metadata or metadata['size'] != stat.st_size or metadata['mtime'] != stat.st_mtime:
+                metadata = read_archive_config(os.path.join(backup_path, file_name))
+                metadata.update({'size': stat.st_size, 'mtime': stat.st_mtime, 'checksum': None})
+                index[file_name] = metadata
+                changed = True
+
+        if changed:
+            _write_index(backup_path, index)
+        else:
+            _index_cache[backup_path] = (directory_mtime, index)
+
+        return index
+
+
+# Returns {file name: metadata} for every back-up in backup_path
+# The result is a copy, so it can be iterated while other threads update the index
+def load_index(backup_path: str):
+    with _index_lock:
+        return dict(_load_index(backup_path))
+
+
+# Returns index metadata for a back-up file, or None
+def lookup_index(file_path: str):
+    with _index_lock:
+        return _load_index(os.path.dirname(file_path)).get(os.path.basename(file_path))
+
+
+# Adds or refreshes a back-up in the index, metadata is read from the back-up if it's not provided
+def update_index(file_path: str, metadata=None, checksum=None):
+    backup_path = os.path.dirname(file_path)
+    file_name = os.path.basename(file_path)
+
+    with _index_lock:
+        index = _load_index(backup_path)
+        stat = os.stat(file_path)
+
+        if not metadata:
+            metadata = read_archive_config(file_path)
+        metadata = dict(metadata)
+        metadata.update({'size': stat.st_size, 'mtime': stat.st_mtime, 'checksum': checksum})
+
+        index[file_name] = metadata
+        _write_index(backup_path, index)
+
+        return metadata
+
+
+# Removes deleted back-ups from the index
+def remove_from_index(backup_path: str, file_names: list):
+    with _index_lock:
+        index = _load_index(backup_path)
+        for file_name in file_names:
+            index.pop(os.path.basename(file_name), None)
+        _write_index(backup_path, index)
+
+
+# --------------------------------------------- Back-up Verification ---------------------------------------------------
+
+# CRC-32 of a member in an uncompressed archive, read directly from its offset
+def _crc_range(archive_path: str, offset: int, size: int):
+    crc = 0
+    with open(archive_path, 'rb') as f:
+        f.seek(offset)
+        while size:
+            data = f.read(min(chunk_size, size))
+            if not data:
+                raise EOFError('Unexpected end of archive')
+            crc = zlib.crc32(data, crc)
+            size -= len(data)
+    return crc
+
+
+# tarfile stops at the first bad header as if the archive ended there, so anything but zeros afterwards means it's damaged
+# Reading to the end also makes gzip and zstd check their own trailers
+def _has_trailing_data(fileobj):
+    while True:
+        data = fileobj.read(chunk_size)
+        if not data:
+            return False
+        if data.count(0) != len(data):
+            return True
+
+
+# Returns (valid, size) for a chunk of an incremental back-up
+def _check_chunk(chunk_store: str, digest: str):
+    try:
+        with open(_chunk_path(chunk_store, digest), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return False, 0
+    return hashlib.blake2b(data, digest_size=20).hexdigest() == digest, len(data)
+
+
+# Checks every member of a back-up against its checksum without extracting anything
+# Uncompressed archives are hashed in parallel straight from the file, compressed ones are decompressed once in order
+# Chunks of incremental back-ups are also checked in parallel
+# Returns {'valid', 'files', 'checked', 'bytes', 'errors', 'seconds', 'throughput'} (throughput is in MB/s)
+# Back-ups from before checksums were recorded can only be checked for being readable, so 'checked' will be 0
+def verify_archive(archive_path: str, chunk_store=None, workers=None):
+    start_time = time.perf_counter()
+    stats = {'valid': False, 'files': 0, 'checked': 0, 'bytes': 0, 'errors': [], 'seconds': 0, 'throughput': 0}
+    errors = stats['errors']
+    crc_list = {}
+    expected = None
+    manifest = None
+
+    if not workers:
+        workers = compression_workers()
+
+    # Reads the manifests, which are small enough to load while checking them
+    def read_special(arcname, data):
+        nonlocal expected, manifest
+        crc_list[arcname] = zlib.crc32(data)
+        if arcname == checksums_name:
+            expected = json.loads(data)
+        else:
+            manifest = json.loads(data)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='backup-verify') as pool:
+        try:
+            archive = tarfile.open(archive_path, 'r:')
+        except tarfile.ReadError:
+            archive = None
+        except OSError as e:
+            errors.append(f"Can't open back-up: {e}")
+            archive = False
+
+        # Uncompressed, hash each member from its offset
+        if archive:
+            futures = {}
+            try:
+                with archive:
+                    for member in archive:
+                        arcname = _clean_arcname(member.name)
+                        if not member.isreg() or not arcname:
+                            continue
+                        if arcname in (checksums_name, manifest_name):
+                            read_special(arcname, archive.extractfile(member).read())
+                        else:
+                            futures[arcname] = (member.size, pool.submit(_crc_range, archive_path, member.offset_data, member.size))
+
+                    archive.fileobj.seek(archive.offset)
+                    if _has_trailing_data(archive.fileobj):
+                        errors.append("Back-up is damaged after the last readable file")
+
+            except Exception as e:
+                errors.append(f"Back-up is unreadable: {e}")
+
+            for arcname, (size, future) in futures.items():
+                try:
+                    crc_list[arcname] = future.result()
+                    stats['bytes'] += size
+                except Exception as e:
+                    errors.append(f"'{arcname}' is truncated: {e}")
+
+        # Compressed, decompress in order
+        elif archive is None:
+            try:
+                archive = open_archive(archive_path)
+                try:
+                    for member in archive:
+                        arcname = _clean_arcname(member.name)
+                        if not member.isreg() or not arcname:
+                            continue
+                        if arcname in (checksums_name, manifest_name):
+                            read_special(arcname, archive.extractfile(member).read())
+                            continue
+
+                        crc = 0
+                        size = 0
+                        for block in _read_blocks(archive.extractfile(member)):
+                            crc = zlib.crc32(block, crc)
+                            size += len(block)
+                        if size != member.size:
+                            errors.append(f"'{arcname}' is truncated")
+                        crc_list[arcname] = crc
+                        stats['bytes'] += size
+
+                    if _has_trailing_data(archive.fileobj):
+                        errors.append("Back-up is damaged after the last readable file")
+                finally:
+                    close_archive(archive)
+
+            except Exception as e:
+                errors.append(f"Back-up is unreadable: {e}")
+
+        stats['files'] = len(crc_list)
+
+        # Compare with the checksums recorded when the back-up was made
+        if expected:
+            for arcname, (size, crc) in expected['files'].items():
+                if arcname not in crc_list:
+                    errors.append(f"'{arcname}' is missing")
+                elif crc_list[arcname] != crc:
+                    errors.append(f"'{arcname}' is corrupted")
+            stats['checked'] = len(expected['files'])
+
+        # Incremental back-ups also need every chunk they reference
+        if manifest:
+            digests = list({digest for entry in manifest['files'].values() for digest in entry['chunks']})
+            if not chunk_store or not os.path.isdir(chunk_store):
+                errors.append("The chunk store for this back-up is missing")
+            else:
+                for digest, (valid, size) in zip(digests, pool.map(partial(_check_chunk, chunk_store), digests, chunksize=16)):
+                    if not valid:
+                        errors.append(f"Chunk '{digest}' is missing or corrupted")
+                    stats['bytes'] += size
+            stats['files'] += len(manifest['files'])
+
+    stats['valid'] = not errors
+    stats['seconds'] = time.perf_counter() - start_time
+    stats['throughput'] = round((stats['bytes'] / 1048576) / stats['seconds'], 2) if stats['seconds'] else 0
+    return stats
+
+
 # ---------------------------------------------- Backup Functions ------------------------------------------------------
 
 # name --> backup to directory
-def backup_server(name: str, backup_stats=None, ignore_running=False):
+def backup_server(name: str, backup_stats=None, ignore_running=False, progress_func=None, throttle=None):
 
     if set_lock(name, True, 'save'):
 
@@ -262,13 +1453,14 @@ def backup_server(name: str, backup_stats=None, ignore_running=False):
 
         # If the server is running, force a save first
         server_obj = None
+        save_off_time = time.perf_counter()
         if name in constants.server_manager.running_servers and not ignore_running:
             server_obj = constants.server_manager.running_servers[name]
             server_obj.silent_command('save-all flush')
             server_obj.silent_command('save-off')
+            save_off_time = time.perf_counter()
             time.sleep(3)
 
-        cwd = constants.get_cwd()
         bkup_time = dt.now().strftime("%H.%M %m-%d-%y")
         backup_path = backup_stats["backup-path"]
         file_name = f"{name}__{bkup_time}.amb"
@@ -278,60 +1470,114 @@ def backup_server(name: str, backup_stats=None, ignore_running=False):
             file_name = f"{name}__{bkup_time}.amb"
             backup_file = os.path.join(backup_path, file_name)
 
-        temp_backup = os.path.join(backup_path, f'{name}-bkup')
+        temp_file = os.path.join(backup_path, f"{name}-bkup.amb")
         constants.folder_check(backup_path)
         server_path = constants.server_path(name)
 
-        failed = True
-        while failed:
-            if os.path.exists(temp_backup):
-                constants.safe_delete(temp_backup)
-                constants.folder_check(temp_backup)
+        # Incremental back-ups reuse chunks from the previous one where files haven't changed
+        chunk_store = chunk_store_path(backup_path, name)
+        incremental = backup_stats['mode'] == 'incremental'
+        previous_manifest = load_latest_manifest(chunk_store, backup_path) if incremental else None
+
+        # Snapshot a running server so saving can resume before it's archived
+        source_dir = server_path
+        snapshot_dir = os.path.join(constants.snapshotDir, name)
+        snapshot_stats = None
+        save_off_window = 0
+        if server_obj and backup_stats['snapshot']:
+            previous_backups = [metadata['mtime'] for file_name, metadata in load_index(backup_path).items() if file_name.startswith(f'{name}__')]
             try:
-                constants.copy_to(server_path, backup_path, f'{name}-bkup')
-            except:
-                continue
-            os.chdir(temp_backup)
+                snapshot_stats = create_snapshot(server_path, snapshot_dir, max(previous_backups) if previous_backups else None)
+                source_dir = snapshot_dir
+            except OSError as e:
+                constants.safe_delete(snapshot_dir)
+                if constants.debug:
+                    print(f"Snapshot of '{name}' failed, archiving the server directly: {e}")
+
+            if snapshot_stats:
+                server_obj.silent_command('save-on')
+                save_off_window = time.perf_counter() - save_off_time
+                if constants.debug:
+                    print(f"Snapshot of '{name}' complete: {snapshot_stats['cloned']} cloned, {snapshot_stats['linked']} linked, {snapshot_stats['copied']} copied in {round(snapshot_stats['seconds'], 2)}s")
+
+        # Stream the server directory into a temporary archive, and only rename it once it's complete
+        stats = None
+        try:
+            for attempt in range(3):
+                try:
+                    stats = write_archive(
+                        source_dir, temp_file, backup_stats['compression'], progress_func,
+                        chunk_store = chunk_store if incremental else None,
+                        previous_manifest = previous_manifest,
+                        throttle = throttle
+                    )
+                    break
+                except (OSError, tarfile.TarError) as e:
+                    if constants.debug:
+                        print(f"Back-up of '{name}' failed, retrying: {e}")
+                    time.sleep(1)
+
+        finally:
+            # Enable auto save if server is running
+            if server_obj and not snapshot_stats:
+                server_obj.silent_command('save-on')
+                save_off_window = time.perf_counter() - save_off_time
+            if snapshot_stats:
+                constants.safe_delete(snapshot_dir)
+
+        if not stats:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            set_lock(name, False)
+            return None
 
-            # Create backup
-            code = constants.run_proc(f'tar --exclude="*session.lock" -cvf \"{os.path.join(backup_path, f"{name}-bkup.amb")}\" {"*" if constants.os_name == "windows" else "* .??*"}')
-            if code != 0:
-                continue
+        os.replace(temp_file, backup_file)
+        if incremental:
+            save_manifest(chunk_store, backup_file, stats['manifest'])
 
-            failed = False
+        # The server config is already known, so the index doesn't need to read it back from the archive
+        server_config = constants.server_config(name)
+        try:
+            build = server_config.get('general', 'serverBuild')
+        except:
+            build = None
+        metadata = {'server': name, 'type': server_config.get('general', 'serverType'), 'version': server_config.get('general', 'serverVersion'), 'build': build}
+        update_index(backup_file, metadata, stats['checksum'])
 
-        if os.path.exists(backup_file):
-            os.remove(backup_file)
-        os.rename(os.path.join(backup_path, f"{name}-bkup.amb"), backup_file)
+        if constants.debug:
+            print(f"Back-up of '{name}' complete: {convert_size(stats['bytes'])} in {round(stats['seconds'], 2)}s ({stats['throughput']} MB/s, {stats['workers']} compression thread(s))")
+            if server_obj:
+                print(f"Back-up of '{name}' kept saving disabled for {round(save_off_window, 2)}s")
+            if incremental:
+                print(f"Back-up of '{name}' stored {convert_size(stats['stored'])} of new data")
 
 
         # Clear old backups if there's a limit in auto-mcs.ini
         if backup_stats['max-backup'] != "unlimited":
 
             keep = int(backup_stats['max-backup'])
-            backup_list = sorted([[file, os.stat(file).st_mtime] for file in glob(os.path.join(backup_path, f'{name}__*'))], key=lambda x: x[1])
+            backup_list = sorted([[os.path.join(backup_path, file_name), metadata['mtime']] for file_name, metadata in load_index(backup_path).items() if file_name.startswith(f'{name}__')], key=lambda x: x[1])
 
             delete = len(backup_list) - keep
             if delete > 0:
                 for y in range(0, delete):
                     os.remove(backup_list[y][0])
+                remove_from_index(backup_path, [backup_list[y][0] for y in range(0, delete)])
 
 
-        os.chdir(cwd)
-        if os.path.exists(temp_backup):
-            constants.safe_delete(temp_backup)
+        # Free chunks which are only used by deleted back-ups
+        if os.path.isdir(chunk_store):
+            prune_chunks(chunk_store, backup_path)
 
-        # Enable auto save if server is running
-        if server_obj:
-            server_obj.silent_command('save-on')
 
         set_lock(name, False)
 
-        return [file_name, convert_size(os.stat(backup_file).st_size), bkup_time]
+        # Last item is how long saving was disabled for, in seconds
+        return [file_name, convert_size(os.stat(backup_file).st_size), bkup_time, round(save_off_window, 2)]
 
 
 # name, index --> restore from file
-def restore_server(name: str, backup_name: str, backup_stats=None):
+def restore_server(name: str, backup_name: str, backup_stats=None, progress_func=None):
 
     if set_lock(name, True, 'restore'):
 
@@ -355,15 +1601,11 @@ def restore_server(name: str, backup_name: str, backup_stats=None):
             file_path = os.path.join(backup_path, os.path.basename(backup_name))
 
 
-            # Delete all files in server directory
-            if constants.os_name == 'windows':
-                constants.run_proc(f'del /q /s /f *')
-            else:
-                constants.run_proc('rm -rf -- ..?* .[!.]* *')
+            # Restore backup, only files which differ from the back-up are rewritten
+            stats = restore_archive(file_path, constants.server_path(name), chunk_store_path(backup_path, name), progress_func=progress_func)
 
-
-            # Restore backup
-            constants.run_proc(f'tar -xf "{file_path}"')
+            if constants.debug:
+                print(f"Restore of '{name}' complete: wrote {convert_size(stats['bytes'])} to {stats['files']} file(s), {stats['unchanged']} unchanged, {stats['deleted']} deleted in {round(stats['seconds'], 2)}s")
 
 
             # Rename auto-mcs.ini to provide xplat support
@@ -401,122 +1643,135 @@ def restore_server(name: str, backup_name: str, backup_stats=None):
             return [os.path.basename(backup_name), convert_size(os.stat(file_path).st_size), convert_date(os.stat(file_path).st_mtime)]
 
 
-# Migrate backup directory and backups
-def set_backup_directory(name: str, new_dir: str):
+# name, index --> dry-run stats for restoring from file
+def preview_restore(name: str, backup_name: str, backup_stats=None, checksum=False):
 
-    cwd = constants.get_cwd()
-    config_file = constants.server_config(name)
-    current_dir = config_file.get('bkup', 'bkupDir')
-    current_dir = current_dir.replace(r"/","\\") if constants.os_name == 'windows' else current_dir
-    new_dir = new_dir.replace(r"/","\\") if constants.os_name == 'windows' else new_dir
+    if not backup_stats:
+        backup_stats = dump_config(name)[1]
 
-    if set_lock(name, True, 'migrate'):
+    backup_path = backup_stats["backup-path"]
+    if (':\\' in backup_path and constants.os_name != 'windows') or '/' in backup_path and constants.os_name == 'windows':
+        backup_path = constants.backupFolder
 
-        # Don't allow any folders inside of app path unless it's the Backups directory
-        if ((constants.applicationFolder not in new_dir) or (new_dir == os.path.join(constants.applicationFolder, 'Backups'))) and (new_dir != current_dir):
+    file_path = os.path.join(backup_path, os.path.basename(backup_name))
+    if not os.path.exists(file_path):
+        return None
 
-            # Check if folder exists and is writeable
-            constants.folder_check(new_dir)
-            if os.access(new_dir, os.W_OK):
+    return restore_archive(file_path, constants.server_path(name), chunk_store_path(backup_path, name), dry_run=True, checksum=checksum)
 
-                # Migrate backup directory and backups
-                extract_folder = os.path.join(constants.tempDir, 'bkup_tmp')
 
-                # Iterate over each back-up that could be a match in current back-up directory
-                for file in glob(os.path.join(current_dir, f"{name}__*")):
-                    constants.folder_check(extract_folder)
-                    os.chdir(extract_folder)
+# name, index --> integrity check of a back-up, see verify_archive() for the returned stats
+def verify_backup(name: str, backup_name: str, backup_stats=None, workers=None):
 
-                    # Extract auto-mcs.ini from each match and check the server name just to be sure
-                    constants.run_proc(f'tar -xvf "{file}"') # *auto-mcs.ini
+    if not backup_stats:
+        backup_stats = dump_config(name)[1]
 
-                    configs = glob(os.path.join(extract_folder, 'auto-mcs.ini'))
-                    configs.extend(glob(os.path.join(extract_folder, '.auto-mcs.ini')))
-                    for cfg in configs:
-                        config = constants.configparser.ConfigParser(allow_no_value=True, comment_prefixes=';')
-                        config.optionxform = str
-                        config.read(cfg)
-                        if config:
-                            if config.get('general', 'serverName') == name:
+    backup_path = backup_stats["backup-path"]
+    if (':\\' in backup_path and constants.os_name != 'windows') or '/' in backup_path and constants.os_name == 'windows':
+        backup_path = constants.backupFolder
 
-                                # Update bkupDir with new_dir in the back-ups' auto-mcs.ini
-                                config.set('bkup', 'bkupDir', new_dir)
-                                with open(cfg, 'w') as f:
-                                    config.write(f)
+    file_path = os.path.join(backup_path, os.path.basename(backup_name))
+    if not os.path.exists(file_path):
+        return None
 
-                                constants.run_proc(f'tar -cvf \"{os.path.join(new_dir, os.path.basename(file))}\" {"*" if constants.os_name == "windows" else "* .??*"}')
+    stats = verify_archive(file_path, chunk_store_path(backup_path, name), workers)
 
-                                # constants.copy(file, new_dir)
-                                os.remove(file)
-                                break
+    if constants.debug:
+        print(f"Verified '{os.path.basename(file_path)}': {'valid' if stats['valid'] else 'INVALID'}, {stats['files']} file(s) in {round(stats['seconds'], 2)}s ({stats['throughput']} MB/s)")
+        for error in stats['errors']:
+            print(f"  {error}")
 
-                    os.chdir(constants.tempDir)
-                    constants.safe_delete(extract_folder)
+    return stats
 
 
-                # Update bkupDir
-                os.chdir(cwd)
-                constants.safe_delete(constants.tempDir)
-                config_file.set('bkup', 'bkupDir', new_dir)
-                constants.server_config(name, config_file)
+# Moves a back-up of server "name" to new_file with edit_func(config) applied to its auto-mcs.ini, and updates the index
+# Back-ups of another server are left alone, zstd back-ups can't be edited without "zstandard" so they're moved as-is
+# A damaged back-up is reported and skipped, so the rest are still migrated
+def _migrate_backup(file: str, new_file: str, name: str, edit_func):
+    try:
+        if archive_compression(file) == 'zstd' and not zstandard:
+            metadata = lookup_index(file)
+            shutil.move(file, new_file)
+            update_index(new_file, metadata, metadata['checksum'] if metadata else None)
 
-                set_lock(name, False)
-                return new_dir
+        else:
+            # Check the server name inside the back-up just to be sure
+            if read_archive_config(file)['server'] != name:
+                return False
 
-    set_lock(name, False)
-    return None
+            checksum = rewrite_archive_config(file, new_file, edit_func)
+            os.remove(file)
+            update_index(new_file, checksum=checksum)
 
+    except Exception as e:
+        print(f"Back-up migration: skipping '{os.path.basename(file)}', it couldn't be read: {e}")
+        return False
 
-# Migrate backup names when server is renamed
-def rename_backups(name: str, new_name: str):
+    remove_from_index(os.path.dirname(file), [file])
+    return True
 
-    cwd = constants.get_cwd()
-    config_file = constants.server_config(new_name)
+
+# Migrate backup directory and backups
+def set_backup_directory(name: str, new_dir: str):
+
+    config_file = constants.server_config(name)
     current_dir = config_file.get('bkup', 'bkupDir')
     current_dir = current_dir.replace(r"/","\\") if constants.os_name == 'windows' else current_dir
+    new_dir = new_dir.replace(r"/","\\") if constants.os_name == 'windows' else new_dir
 
     if set_lock(name, True, 'migrate'):
+        try:
 
-        # Migrate backup directory and backups
-        extract_folder = os.path.join(constants.tempDir, 'bkup_tmp')
+            # Don't allow any folders inside of app path unless it's the Backups directory
+            if ((constants.applicationFolder not in new_dir) or (new_dir == os.path.join(constants.applicationFolder, 'Backups'))) and (new_dir != current_dir):
 
-        # Iterate over each back-up that could be a match in current back-up directory
-        for file in glob(os.path.join(current_dir, f"{name}__*")):
-            constants.folder_check(extract_folder)
-            os.chdir(extract_folder)
+                # Check if folder exists and is writeable
+                constants.folder_check(new_dir)
+                if os.access(new_dir, os.W_OK):
 
-            # Extract auto-mcs.ini from each match and check the server name just to be sure
-            constants.run_proc(f'tar -xvf "{file}"') # *auto-mcs.ini
+                    # Update bkupDir with new_dir in each back-up's auto-mcs.ini while moving it
+                    for file in glob(os.path.join(current_dir, f"{name}__*")):
+                        if not file.endswith('.tmp'):
+                            _migrate_backup(file, os.path.join(new_dir, os.path.basename(file)), name, lambda config: config.set('bkup', 'bkupDir', new_dir))
 
-            config_files = []
-            config_files.extend(glob(os.path.join(extract_folder, 'auto-mcs.ini')))
-            config_files.extend(glob(os.path.join(extract_folder, '.auto-mcs.ini')))
+                    # Move chunks for incremental back-ups
+                    move_chunk_store(chunk_store_path(current_dir, name), chunk_store_path(new_dir, name), name, name)
 
-            for cfg in config_files:
-                config = constants.configparser.ConfigParser(allow_no_value=True, comment_prefixes=';')
-                config.optionxform = str
-                config.read(cfg)
-                if config:
-                    if config.get('general', 'serverName') == name:
 
-                        # Update bkupDir with new_dir in the back-ups' auto-mcs.ini
-                        config.set('general', 'serverName', new_name)
-                        with open(cfg, 'w') as f:
-                            config.write(f)
+                    # Update bkupDir
+                    config_file.set('bkup', 'bkupDir', new_dir)
+                    constants.server_config(name, config_file)
+                    return new_dir
+
+        finally:
+            set_lock(name, False)
+
+    return None
 
-                        os.remove(file)
-                        constants.run_proc(f'tar -cvf \"{os.path.join(current_dir, os.path.basename(file).replace(f"{name}__",f"{new_name}__"))}\" {"*" if constants.os_name == "windows" else "* .??*"}')
-                        break
 
-            os.chdir(constants.tempDir)
-            constants.safe_delete(extract_folder)
+# Migrate backup names when server is renamed
+def rename_backups(name: str, new_name: str):
+
+    config_file = constants.server_config(new_name)
+    current_dir = config_file.get('bkup', 'bkupDir')
+    current_dir = current_dir.replace(r"/","\\") if constants.os_name == 'windows' else current_dir
+
+    if set_lock(name, True, 'migrate'):
+        try:
+
+            # Update serverName in each back-up's auto-mcs.ini while renaming it
+            for file in glob(os.path.join(current_dir, f"{name}__*")):
+                if not file.endswith('.tmp'):
+                    new_file = os.path.join(current_dir, os.path.basename(file).replace(f"{name}__", f"{new_name}__", 1))
+                    _migrate_backup(file, new_file, name, lambda config: config.set('general', 'serverName', new_name))
+
+            # Rename chunks for incremental back-ups
+            move_chunk_store(chunk_store_path(current_dir, name), chunk_store_path(current_dir, new_name), name, new_name)
 
         # Cleanup
-        os.chdir(cwd)
-        constants.safe_delete(constants.tempDir)
-        set_lock(name, False)
+        finally:
+            set_lock(name, False)
 
-    set_lock(name, False)
     return None
 
 
@@ -534,6 +1789,71 @@ def set_backup_amount(name: str, amount: int or str):
         return constants.server_config(name).get("bkup", "bkupMax")
 
 
+# Sets compression for new back-ups
+# compression: 'none', 'gzip', or 'zstd'
+def set_backup_compression(name: str, compression: str):
+    if compression in compression_types:
+        if compression == 'zstd' and not zstandard:
+            compression = 'gzip'
+
+        config_file = constants.server_config(name)
+        config_file.set("bkup", "bkupCompression", compression)
+        constants.server_config(name, config_file)
+
+        return compression
+
+    else:
+        try:
+            return constants.server_config(name).get("bkup", "bkupCompression")
+        except:
+            return 'none'
+
+
+# Sets how new back-ups are stored
+# mode: 'full' or 'incremental'
+def set_backup_mode(name: str, mode: str):
+    if mode in backup_modes:
+        config_file = constants.server_config(name)
+        config_file.set("bkup", "bkupMode", mode)
+        constants.server_config(name, config_file)
+
+        return mode
+
+    else:
+        try:
+            return constants.server_config(name).get("bkup", "bkupMode")
+        except:
+            return 'full'
+
+
+# Sets the queue priority of a server's back-ups, higher runs first
+def set_backup_priority(name: str, priority: int):
+    config_file = constants.server_config(name)
+    config_file.set("bkup", "bkupPriority", str(int(priority)))
+    constants.server_config(name, config_file)
+
+    return int(priority)
+
+
+# Sets how often the back-up scheduler saves a running server
+# hours: <int> or 0 to disable
+def set_backup_interval(name: str, hours: int):
+    config_file = constants.server_config(name)
+    config_file.set("bkup", "bkupInterval", str(max(int(hours), 0)))
+    constants.server_config(name, config_file)
+
+    return max(int(hours), 0)
+
+
+# Toggle snapshot back-ups
+def enable_backup_snapshot(name: str, enabled=True):
+    config_file = constants.server_config(name)
+    config_file.set("bkup", "bkupSnapshot", str(enabled).lower())
+    constants.server_config(name, config_file)
+
+    return enabled
+
+
 # Toggle auto backup status
 def enable_auto_backup(name: str, enabled=True):
     config_file = constants.server_config(name)
@@ -565,6 +1885,235 @@ def set_lock(name: str, add=True, reason=None):
 
 
 
+# ---------------------------------------------- Back-up Scheduler -----------------------------------------------------
+
+# Limits throughput to "rate" bytes per second across every thread that shares it, 0 is unlimited
+# Callers can overdraw and then wait it off, so large reads don't starve behind small ones
+class TokenBucket():
+
+    def __init__(self, rate=0, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self.rate = rate
+            self.capacity = rate
+            self._tokens = min(self._tokens, rate)
+
+    def consume(self, amount: int):
+        if not self.rate:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+
+# A back-up waiting in, or taken from the BackupScheduler queue
+class BackupJob():
+
+    def __init__(self, name: str, priority: int, ignore_running=False):
+        self.name = name
+        self.priority = priority
+        self.ignore_running = ignore_running
+        self.queued = time.time()
+        self.started = None
+        self.finished = None
+        self.bytes = 0
+        self.result = None
+        self._done = threading.Event()
+
+    # Blocks until the back-up is done, returns the result of backup_server()
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.result
+
+    def done(self):
+        return self._done.is_set()
+
+
+# Runs back-ups for every server from one queue, highest priority first, at most "concurrency" at a time
+# All back-ups share one TokenBucket so they can't saturate the disk, and running servers with a "bkupInterval" are
+# queued automatically once their latest back-up is older than it
+class BackupScheduler():
+
+    def __init__(self, concurrency=1, bandwidth=0):
+        self.concurrency = max(int(concurrency), 1)
+        self.bucket = TokenBucket(bandwidth)
+
+        self._queue = []
+        self._sequence = 0
+        self._running = {}
+        self._completed = 0
+        self._transferred = 0
+        self._samples = deque(maxlen=50)
+        self._condition = threading.Condition()
+        self._threads = []
+        self._timer = None
+
+    # Adds a back-up to the queue, a server that's already waiting keeps its place (and the higher priority)
+    # A server that's being backed up right now returns that job instead, so it's not backed up twice in a row
+    def queue(self, name: str, priority=None, ignore_running=False):
+        if priority is None:
+            priority = dump_config(name)[1]['priority']
+
+        with self._condition:
+            if name in self._running:
+                return self._running[name]
+
+            for item in self._queue:
+                job = item[2]
+                if job.name == name:
+                    if priority > job.priority:
+                        job.priority = priority
+                        item[0] = -priority
+                        heapq.heapify(self._queue)
+                    return job
+
+            job = BackupJob(name, priority, ignore_running)
+            self._sequence += 1
+            heapq.heappush(self._queue, [-priority, self._sequence, job])
+            self._start_workers()
+            self._condition.notify()
+
+        return job
+
+    # Removes a back-up from the queue if it hasn't started yet
+    def cancel(self, name: str):
+        with self._condition:
+            for item in self._queue:
+                if item[2].name == name:
+                    self._queue.remove(item)
+                    heapq.heapify(self._queue)
+                    item[2]._done.set()
+                    return True
+        return False
+
+    # Returns {'queue-depth', 'queued', 'running', 'completed', 'bytes-per-second'}
+    def status(self):
+        with self._condition:
+            rate = 0
+            if len(self._samples) > 1:
+                (first_time, first_bytes), (last_time, last_bytes) = self._samples[0], self._samples[-1]
+                if time.monotonic() - last_time < 5 and last_time > first_time:
+                    rate = round((last_bytes - first_bytes) / (last_time - first_time))
+
+            return {
+                'queue-depth': len(self._queue),
+                'queued': [item[2].name for item in sorted(self._queue)],
+                'running': {name: job.bytes for name, job in self._running.items()},
+                'completed': self._completed,
+                'bytes-per-second': rate
+            }
+
+    def set_concurrency(self, concurrency: int):
+        with self._condition:
+            self.concurrency = max(int(concurrency), 1)
+            self._start_workers()
+
+    def set_bandwidth(self, bandwidth: int):
+        self.bucket.set_rate(bandwidth)
+
+    # Checks running servers every minute and queues any which are due for a back-up
+    def start_timer(self, interval=60):
+        def check():
+            for name, server_obj in list(constants.server_manager.running_servers.items()):
+
+                # Large back-ups can take longer than the interval between checks
+                with self._condition:
+                    if name in self._running:
+                        continue
+                if name in constants.backup_lock:
+                    continue
+
+                try:
+                    backup_stats = dump_config(name)[1]
+                    if not backup_stats['interval']:
+                        continue
+                    latest = max([metadata['mtime'] for metadata in backup_stats['metadata'].values()], default=0)
+                    if time.time() - latest >= backup_stats['interval'] * 3600:
+                        self.queue(name, backup_stats['priority'])
+                except Exception as e:
+                    if constants.debug:
+                        print(f"Back-up scheduler: couldn't check '{name}': {e}")
+
+            self._timer = threading.Timer(interval, check)
+            self._timer.daemon = True
+            self._timer.start()
+
+        self._timer = threading.Timer(interval, check)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop_timer(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _start_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.concurrency:
+            thread = threading.Thread(target=self._worker, name='backup-scheduler', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _throttle(self, job: BackupJob, amount: int):
+        self.bucket.consume(amount)
+        with self._condition:
+            job.bytes += amount
+            self._transferred += amount
+            self._samples.append((time.monotonic(), self._transferred))
+
+    # Highest priority job for a server that isn't already being backed up
+    def _next_job(self):
+        if len(self._running) >= self.concurrency:
+            return None
+        for item in sorted(self._queue):
+            if item[2].name not in self._running:
+                self._queue.remove(item)
+                heapq.heapify(self._queue)
+                return item[2]
+        return None
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while not job:
+
+                    # Idle workers exit, and are started again by queue()
+                    if not self._condition.wait(300) and not self._queue:
+                        if threading.current_thread() in self._threads:
+                            self._threads.remove(threading.current_thread())
+                        return
+                    job = self._next_job()
+                self._running[job.name] = job
+
+            job.started = time.time()
+            try:
+                job.result = backup_server(job.name, ignore_running=job.ignore_running, throttle=partial(self._throttle, job))
+            except Exception as e:
+                if constants.debug:
+                    print(f"Back-up scheduler: back-up of '{job.name}' failed: {e}")
+            finally:
+                job.finished = time.time()
+                with self._condition:
+                    del self._running[job.name]
+                    self._completed += 1
+                    self._condition.notify_all()
+                job._done.set()
+
+
 # ----------------------------------------------- Usage Examples -------------------------------------------------------
 
 # backup_obj = BackupManager('1.17.1 Server')
@@ -1,19 +1,23 @@
-from shutil import rmtree, copytree, copy, ignore_patterns, move, disk_usage
-from concurrent.futures import ThreadPoolExecutor
+from shutil import rmtree, copytree, copy, copy2, ignore_patterns, move, disk_usage, copyfileobj
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
 from random import randrange, choices
 from difflib import SequenceMatcher
 from urllib.request import Request
+from urllib.error import ContentTooShortError
 from urllib.parse import quote
 from bs4 import BeautifulSoup
 from platform import system
 from threading import Timer
+from collections import OrderedDict
 from copy import deepcopy
 from pathlib import Path
 from glob import glob
 from PIL import Image
 from nbt import nbt
 import configparser
+import sqlite3
 import cloudscraper
+import importlib.util
 import unicodedata
 import subprocess
 import functools
@@ -39,6 +43,9 @@ import addons
 import backup
 import amscript
 
+# Optional, lxml parses scraped pages much faster than html.parser
+html_parser = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
 # ---------------------------------------------- Global Variables ------------------------------------------------------
 
 app_version = "2.1"
@@ -72,6 +79,29 @@ session_splash = ''
 ignore_close = False
 boot_launches = []
 
+# Maximum lines the console will add in one frame before summarizing the rest
+console_backlog = 300
+
+# Read every server's output from one asyncio event loop instead of a thread per server (svrmgr.ProcessSupervisor)
+async_supervisor = False
+
+# Threads used to compress back-ups, 0 picks half of the available cores
+backup_workers = 0
+
+# Back-ups the scheduler runs at once, and their combined disk bandwidth in MB/s (0 is unlimited)
+backup_concurrency = 1
+backup_bandwidth = 0
+
+# Add-on and modpack update checks which run at once, also the connection pool size per host
+update_concurrency = 8
+
+# Files download_url() fetches at once across the app, and the ranged connections used for each file
+download_concurrency = 4
+download_segments = 4
+
+# Size limit of the server jar and add-on cache shared by every server, in MB
+artifact_cache_size = 2048
+
 # Global debug mode and app_compiled, set debug to false before release
 debug = False
 app_compiled = getattr(sys, 'frozen', False)
@@ -82,7 +112,6 @@ footer_path = ""
 last_widget = None
 
 update_list = {}
-addon_cache = {}
 
 latestMC = {
     "vanilla": "0.0.0",
@@ -168,6 +197,8 @@ serverDir = os.path.join(applicationFolder, 'Servers')
 tempDir = os.path.join(applicationFolder, 'Temp')
 tmpsvr = os.path.join(tempDir, 'tmpsvr')
 cacheDir = os.path.join(applicationFolder, 'Cache')
+artifactDir = os.path.join(cacheDir, 'Artifacts')
+snapshotDir = os.path.join(applicationFolder, 'Snapshots')
 configDir = os.path.join(applicationFolder, 'Config')
 scriptDir = os.path.join(applicationFolder, 'Tools', 'amscript')
 javaDir = os.path.join(applicationFolder, 'Tools', 'java')
@@ -772,7 +803,7 @@ def similarity(a, b):
 
 # Cloudscraper requests
 global_scraper = None
-def return_scraper(url_path: str, head=False):
+def return_scraper(url_path: str, head=False, headers=None):
     global global_scraper
 
     if not global_scraper:
@@ -782,7 +813,46 @@ def return_scraper(url_path: str, head=False):
             debug=debug
         )
 
-    return global_scraper.head(url_path) if head else global_scraper.get(url_path)
+        # Keep enough connections open for concurrent update checks, the default pool only holds 10 per host
+        for adapter in global_scraper.adapters.values():
+            adapter._pool_connections = adapter._pool_maxsize = max(update_concurrency, 10)
+            adapter.init_poolmanager(adapter._pool_connections, adapter._pool_maxsize, block=adapter._pool_block)
+
+    return global_scraper.head(url_path, headers=headers) if head else global_scraper.get(url_path, headers=headers)
+
+# Responses with an ETag or Last-Modified header, to make conditional requests with get_url()
+# url --> response, least recently used entries are removed past url_cache_size
+url_cache = OrderedDict()
+url_cache_size = 256
+url_cache_lock = threading.Lock()
+
+def cached_request(url: str):
+    with url_cache_lock:
+        cached = url_cache.get(url)
+        if cached is not None:
+            url_cache.move_to_end(url)
+
+    headers = {}
+    if cached is not None:
+        if cached.headers.get('ETag'):
+            headers['If-None-Match'] = cached.headers['ETag']
+        if cached.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = cached.headers['Last-Modified']
+
+    response = return_scraper(url, headers=headers or None)
+
+    # Nothing changed since the last request
+    if response.status_code == 304 and cached is not None:
+        return cached
+
+    if response.status_code == 200 and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+        with url_cache_lock:
+            url_cache[url] = response
+            url_cache.move_to_end(url)
+            while len(url_cache) > url_cache_size:
+                url_cache.popitem(last=False)
+
+    return response
 
 # Return html content or status code
 def get_url(url: str, return_code=False, only_head=False, return_response=False):
@@ -790,10 +860,11 @@ def get_url(url: str, return_code=False, only_head=False, return_response=False)
     max_retries = 10
     for retry in range(0, max_retries + 1):
         try:
-            html = return_scraper(url, head=(return_code or only_head))
+            head = return_code or only_head
+            html = return_scraper(url, head=True) if head else cached_request(url)
             return html.status_code if return_code \
                 else html if (only_head or return_response) \
-                else BeautifulSoup(html.content, 'html.parser')
+                else BeautifulSoup(html.content, html_parser)
 
         except cloudscraper.exceptions.CloudflareChallengeError:
             global_scraper = None
@@ -815,8 +886,11 @@ def cs_download_url(url: str, file_name: str, destination_path: str):
             web_file = return_scraper(url)
             full_path = os.path.join(destination_path, file_name)
             folder_check(destination_path)
-            with open(full_path, 'wb') as file:
+
+            # Replace the file instead of writing over it, it could be linked from artifact_cache
+            with open(full_path + '.part', 'wb') as file:
                 file.write(web_file.content)
+            os.replace(full_path + '.part', full_path)
 
             print(f"Download of '{file_name}' complete!")
             return os.path.exists(full_path)
@@ -1175,18 +1249,383 @@ def move_files_root(source, destination=None):
             move(f, os.path.join(destination, os.path.basename(f)))
 
 
+# ------- Download Manager -------
+# Files are split into download_segments ranged requests when the server allows it, and each segment picks up where it
+# stopped if the connection drops. Every download shares one connection pool, and download_concurrency caps how many
+# files are downloaded at once
+download_min_segment = 2097152
+download_retries = 3
+_download_session = None
+_download_slots = None
+_download_lock = threading.Lock()
+
+def download_session():
+    global _download_session, _download_slots
+
+    with _download_lock:
+        if not _download_session:
+            session = requests.Session()
+
+            # Ranges are counted in encoded bytes, so ask for the file as-is
+            session.headers.update({'User-Agent': 'Mozilla/5.0', 'Accept-Encoding': 'identity'})
+            adapter = requests.adapters.HTTPAdapter(pool_connections=download_concurrency, pool_maxsize=download_concurrency * download_segments)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+
+            _download_slots = threading.BoundedSemaphore(download_concurrency)
+            _download_session = session
+
+    return _download_session
+
+# Checks a file against {algorithm: hex digest}, like the "hashes" in a Modrinth index
+def verify_hashes(file_path: str, hashes: dict):
+    digests = {algorithm: hashlib.new(algorithm) for algorithm in hashes if algorithm in hashlib.algorithms_available}
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1048576), b''):
+            for digest in digests.values():
+                digest.update(block)
+
+    return all(digest.hexdigest() == hashes[algorithm].lower() for algorithm, digest in digests.items())
+
+# Writes one segment of a download into the .part file, segment is [start, end or None, bytes written]
+# progress(length) returns False when another segment has failed, to stop early
+# Raised by a segment when the server answers a ranged request with the whole file
+class RangeNotSupported(ConnectionError):
+    pass
+
+def _download_segment(url: str, part_path: str, segment: list, progress):
+    for retry in range(0, download_retries + 1):
+        offset = segment[0] + segment[2]
+        if segment[1] is not None and offset > segment[1]:
+            return
+
+        headers = None
+        if offset or segment[1] is not None:
+            headers = {'Range': f'bytes={offset}-{"" if segment[1] is None else segment[1]}'}
+
+        try:
+            with download_session().get(url, headers=headers, stream=True, timeout=30) as response:
+                response.raise_for_status()
+
+                # The server ignored the range, so the file has to start over
+                if headers and response.status_code != 206:
+                    if segment[1] is not None:
+                        raise RangeNotSupported(f"'{url}' doesn't support ranged requests")
+                    progress(-segment[2])
+                    segment[2] = offset = 0
+
+                with open(part_path, 'r+b') as f:
+                    f.seek(offset)
+                    if segment[1] is None:
+                        f.truncate()
+
+                    for block in response.iter_content(262144):
+                        f.write(block)
+                        segment[2] += len(block)
+                        if not progress(len(block)):
+                            return
+
+            # A connection closed early ends without an error, so retry from where it stopped
+            if segment[1] is not None and segment[0] + segment[2] <= segment[1]:
+                raise ContentTooShortError(f"'{url}' ended {segment[1] - segment[0] - segment[2] + 1} bytes early", None)
+            return
+
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code < 500:
+                raise
+            if retry >= download_retries:
+                raise
+            time.sleep(retry + 1)
+
+        except RangeNotSupported:
+            raise
+
+        except OSError:
+            if retry >= download_retries:
+                raise
+            time.sleep(retry + 1)
+
+# Finds where a URL redirects to, its size, if it supports ranged requests, and the validators ArtifactCache checks
+# url --> {'url', 'size', 'ranged', 'etag', 'last_modified'}
+def download_head(url: str):
+    head_data = {'url': url, 'size': None, 'ranged': False, 'etag': None, 'last_modified': None}
+    try:
+        head = download_session().head(url, allow_redirects=True, timeout=30)
+        if head.ok:
+            head_data['url'] = head.url
+            head_data['size'] = int(head.headers['Content-Length']) if head.headers.get('Content-Length') else None
+            head_data['ranged'] = head.headers.get('Accept-Ranges', '').lower() == 'bytes'
+            head_data['etag'] = head.headers.get('ETag')
+            head_data['last_modified'] = head.headers.get('Last-Modified')
+    except (OSError, ValueError):
+        pass
+
+    return head_data
+
 # Download file from URL to directory
-def download_url(url: str, file_name: str, output_path: str, progress_func=None):
-    opener = urllib.request.build_opener()
-    opener.addheaders = [('User-agent', 'Mozilla/5.0')]
-    urllib.request.install_opener(opener)
+# progress_func is called like a urlretrieve() reporthook, (1, bytes downloaded, total size or -1)
+# hashes, if provided, are checked before the file is moved into place and raise ValueError on a mismatch
+# cache=True links the file from artifact_cache when the server reports it unchanged, and adds it there otherwise
+def download_url(url: str, file_name: str, output_path: str, progress_func=None, hashes=None, cache=False):
     file_path = os.path.join(output_path, file_name)
+    part_path = file_path + '.part'
     folder_check(output_path)
-    urllib.request.urlretrieve(url, filename=file_path, reporthook=progress_func)
+    download_session()
+
+    with _download_slots:
+        head_data = download_head(url)
+        size = head_data['size']
+
+        # The cache only matches the URL, ETag and size, so check the linked file against hashes too
+        if cache and artifact_cache.fetch(url, head_data, file_path):
+            if not hashes or verify_hashes(file_path, hashes):
+                if progress_func:
+                    progress_func(1, 1, 1)
+                return file_path
+
+            if debug:
+                print(f"Artifact cache: '{file_name}' doesn't match its checksum, downloading it again")
+            os.remove(file_path)
+            artifact_cache.discard(url)
+        source_url = url
+        url = head_data['url']
+
+        segment_count = min(download_segments, size // download_min_segment) if (size and head_data['ranged']) else 1
+        if segment_count > 1:
+            step = -(-size // segment_count)
+            segments = [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)]
+        else:
+            segments = [[0, None, 0]]
+
+        downloaded = [0]
+        progress_lock = threading.Lock()
+        failed = threading.Event()
+        def progress(length):
+            with progress_lock:
+                downloaded[0] += length
+            return not failed.is_set()
+
+        def report():
+            if progress_func:
+                progress_func(1, downloaded[0], size or -1)
+
+        def run_segments(segments):
+            failed.clear()
+            with open(part_path, 'wb') as f:
+                if len(segments) > 1:
+                    f.truncate(size)
+
+            # Progress is reported from this thread, like urlretrieve()
+            with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+                futures = [pool.submit(_download_segment, url, part_path, segment, progress) for segment in segments]
+                pending = futures
+                while pending:
+                    done, pending = wait(pending, timeout=0.1)
+                    report()
+                    if any(future.exception() for future in done):
+                        failed.set()
+                for future in futures:
+                    future.result()
+
+        try:
+            # Some servers (often behind a redirect or CDN) advertise ranges on HEAD and then ignore them on GET
+            try:
+                run_segments(segments)
+            except RangeNotSupported:
+                if debug:
+                    print(f"'{url}' ignored ranged requests, downloading in a single stream")
+                downloaded[0] = 0
+                run_segments([[0, None, 0]])
+
+            # Segments are pre-allocated, so a short download would otherwise leave a gap of zeros
+            if size and os.path.getsize(part_path) != size:
+                raise ContentTooShortError(f"'{file_name}' is incomplete, got {os.path.getsize(part_path)} of {size} bytes", None)
+
+            if hashes and not verify_hashes(part_path, hashes):
+                raise ValueError(f"'{file_name}' doesn't match its checksum")
+
+            os.replace(part_path, file_path)
+
+        except:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+        if cache:
+            artifact_cache.store(file_path, source_url, head_data)
+
     if os.path.isfile(file_path):
         return file_path
 
 
+# ------- Artifact Cache -------
+# Server jars and add-ons downloaded for one server are kept in artifactDir by SHA-256, and hardlinked into other
+# servers which download the same URL, as long as the server still reports the same ETag/Last-Modified and size
+# Least recently used files are removed once the cache is over artifact_cache_size
+class ArtifactCache():
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = os.path.join(path, 'index.json')
+        self._index = None
+        self._inodes = None
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self._index is None:
+            try:
+                with open(self.index_path, 'r') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {'files': {}, 'urls': {}}
+        return self._index
+
+    def _save(self):
+        folder_check(self.path)
+        with open(self.index_path + '.tmp', 'w') as f:
+            json.dump(self._index, f)
+        os.replace(self.index_path + '.tmp', self.index_path)
+
+    def _file_path(self, checksum: str):
+        return os.path.join(self.path, checksum[:2], checksum)
+
+    # (device, inode) of every cached file, to tell if a path is linked to one of them
+    def _inode_set(self):
+        with self._lock:
+            if self._inodes is None:
+                self._inodes = set()
+                for checksum in self._load()['files']:
+                    try:
+                        stat = os.stat(self._file_path(checksum))
+                        self._inodes.add((stat.st_dev, stat.st_ino))
+                    except OSError:
+                        continue
+            return self._inodes
+
+    # Hardlinks source to destination, or copies it when that's not possible (other drive, FAT32...)
+    @staticmethod
+    def link(source: str, destination: str):
+        temp_path = destination + '.link'
+        try:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            os.link(source, temp_path)
+        except OSError:
+            copy(source, temp_path)
+        os.replace(temp_path, destination)
+        return destination
+
+    # Drop-in for shutil.copy2 in copytree(), which links cached files instead of copying them
+    # Writing over a linked file would change it for every server, so those are replaced instead
+    def copy(self, source: str, destination: str, *a, **kw):
+        try:
+            stat = os.stat(source)
+            if (stat.st_dev, stat.st_ino) in self._inode_set():
+                return self.link(source, destination)
+            if os.path.isfile(destination) and os.stat(destination).st_nlink > 1:
+                os.remove(destination)
+        except OSError:
+            pass
+        return copy2(source, destination)
+
+    # Links a cached file for url to destination if the server reports it unchanged, returns the path or None
+    def fetch(self, url: str, head_data: dict, destination: str):
+        if not (head_data['etag'] or head_data['last_modified']):
+            return None
+
+        with self._lock:
+            index = self._load()
+            entry = index['urls'].get(url)
+            if not entry or (entry['etag'], entry['last_modified'], entry['size']) != (head_data['etag'], head_data['last_modified'], head_data['size']):
+                return None
+
+            file_path = self._file_path(entry['sha256'])
+            try:
+                if os.path.getsize(file_path) != index['files'][entry['sha256']]['size']:
+                    raise OSError
+            except (OSError, KeyError):
+                self._forget(entry['sha256'])
+                self._save()
+                return None
+
+            index['files'][entry['sha256']]['last_used'] = time.time()
+            self._save()
+
+        folder_check(os.path.dirname(destination))
+        return self.link(file_path, destination)
+
+    # Adds a downloaded file to the cache and links it back, so both share the same data on disk
+    def store(self, file_path: str, url: str, head_data: dict):
+        if not (head_data['etag'] or head_data['last_modified']) or not os.path.isfile(file_path):
+            return None
+
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1048576), b''):
+                digest.update(block)
+        checksum = digest.hexdigest()
+        size = os.path.getsize(file_path)
+
+        with self._lock:
+            index = self._load()
+            cached_path = self._file_path(checksum)
+            try:
+                folder_check(os.path.dirname(cached_path))
+                if not os.path.isfile(cached_path):
+                    self.link(file_path, cached_path)
+                else:
+                    self.link(cached_path, file_path)
+                stat = os.stat(cached_path)
+                self._inode_set().add((stat.st_dev, stat.st_ino))
+            except OSError:
+                return None
+
+            index['files'][checksum] = {'size': size, 'last_used': time.time()}
+            index['urls'][url] = {'sha256': checksum, 'etag': head_data['etag'], 'last_modified': head_data['last_modified'], 'size': head_data['size']}
+            self._evict()
+            self._save()
+
+        return checksum
+
+    # Removes the cached file for url, when it doesn't match what the download expected
+    def discard(self, url: str):
+        with self._lock:
+            entry = self._load()['urls'].get(url)
+            if entry:
+                self._forget(entry['sha256'])
+                self._save()
+
+    def _forget(self, checksum: str):
+        index = self._load()
+        index['files'].pop(checksum, None)
+        for url in [url for url, entry in index['urls'].items() if entry['sha256'] == checksum]:
+            del index['urls'][url]
+
+        try:
+            stat = os.stat(self._file_path(checksum))
+            self._inode_set().discard((stat.st_dev, stat.st_ino))
+            os.remove(self._file_path(checksum))
+        except OSError:
+            pass
+
+    # Servers linked to a removed file keep their copy, it's only dropped from the cache
+    def _evict(self):
+        files = self._load()['files']
+        total = sum(entry['size'] for entry in files.values())
+        for checksum, entry in sorted(files.items(), key=lambda x: x[1]['last_used']):
+            if total <= artifact_cache_size * 1048576:
+                break
+            total -= entry['size']
+            self._forget(checksum)
+
+    def stats(self):
+        with self._lock:
+            files = self._load()['files']
+            return {'files': len(files), 'urls': len(self._index['urls']), 'size': sum(entry['size'] for entry in files.values())}
+
+artifact_cache = ArtifactCache(artifactDir)
+
+
 # Will attempt to delete dir tree without error
 def safe_delete(directory: str):
     if not directory:
@@ -1737,27 +2176,163 @@ def get_checksum(file_path):
     return str(hashlib.md5(open(file_path, 'rb').read()).hexdigest())
 
 
-# Grabs addon_cache if it exists
-def load_addon_cache(write=False):
-    global addon_cache
-    file_name = "addon-db.json"
-    file_path = os.path.join(cacheDir, file_name)
+# Add-on metadata cache shared by every server, see addons.addon_cache_key()
+# Lookups are served from memory under a lock, so it's safe to use from the add-on scan threads
+# Changes are written to SQLite in batches, and the least recently used entries are evicted past max_entries
+class AddonCache():
+
+    def __init__(self, path: str, max_entries=10000, batch_size=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._changed = {}
+        self._touched = set()
+        self._removed = set()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._changed[key] = value
+            self._removed.discard(key)
+
+            while len(self._entries) > self.max_entries:
+                old_key, old_value = self._entries.popitem(last=False)
+                self._changed.pop(old_key, None)
+                self._touched.discard(old_key)
+                self._removed.add(old_key)
+                self.evictions += 1
+
+            if len(self._changed) >= self.batch_size:
+                self.flush()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._touched.add(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def pop(self, key, default=None):
+        with self._lock:
+            self._changed.pop(key, None)
+            self._touched.discard(key)
+            if key in self._entries:
+                self._removed.add(key)
+                return self._entries.pop(key)
+            return default
+
+    def update(self, entries: dict):
+        with self._lock:
+            for key, value in entries.items():
+                self[key] = value
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit-rate': round(self.hits / total, 3) if total else 0,
+                'evictions': self.evictions
+            }
+
+    def _connect(self):
+        folder_check(os.path.dirname(self.path))
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute('CREATE TABLE IF NOT EXISTS addons (key TEXT PRIMARY KEY, data TEXT NOT NULL, last_used REAL NOT NULL)')
+        return connection
+
+    # Reads the cache from disk, entries added before it's loaded are kept since they're newer
+    def load(self):
+        legacy_path = os.path.join(os.path.dirname(self.path), 'addon-db.json')
+        new_database = not os.path.isfile(self.path)
 
-    # Loads data from dict
-    if not write:
         try:
-            if os.path.isfile(file_path):
-                with open(file_path, 'r') as f:
-                    addon_cache = json.load(f)
-        except:
+            connection = self._connect()
+            try:
+                rows = connection.execute('SELECT key, data FROM addons ORDER BY last_used').fetchall()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            if debug:
+                print(f"Add-on cache: couldn't load '{self.path}': {e}")
             return
+
+        with self._lock:
+            entries = OrderedDict((key, json.loads(data)) for key, data in rows)
+            entries.update(self._entries)
+            self._entries = entries
+
+        # Import the JSON cache from older versions once
+        if new_database and os.path.isfile(legacy_path):
+            try:
+                with open(legacy_path, 'r') as f:
+                    legacy = {key: value for key, value in json.load(f).items() if not key.isdigit()}
+                with self._lock:
+                    for key, value in legacy.items():
+                        if key not in self._entries:
+                            self[key] = value
+                self.flush()
+                os.remove(legacy_path)
+            except (OSError, ValueError):
+                pass
+
+    # Writes pending changes in one transaction
+    def flush(self):
+        with self._lock:
+            if not (self._changed or self._touched or self._removed):
+                return
+            now = time.time()
+            changed = [(key, json.dumps(value), now) for key, value in self._changed.items()]
+            touched = [(now, key) for key in self._touched if key not in self._changed]
+            removed = [(key,) for key in self._removed]
+            self._changed, self._touched, self._removed = {}, set(), set()
+
+            try:
+                connection = self._connect()
+                try:
+                    with connection:
+                        connection.executemany('INSERT OR REPLACE INTO addons (key, data, last_used) VALUES (?, ?, ?)', changed)
+                        connection.executemany('UPDATE addons SET last_used = ? WHERE key = ?', touched)
+                        connection.executemany('DELETE FROM addons WHERE key = ?', removed)
+                finally:
+                    connection.close()
+            except sqlite3.Error as e:
+                if debug:
+                    print(f"Add-on cache: couldn't write '{self.path}': {e}")
+
+addon_cache = AddonCache(os.path.join(cacheDir, 'addon-db.sqlite'))
+
+
+# Loads addon_cache from disk, or writes pending changes with write=True
+def load_addon_cache(write=False):
+    if write:
+        addon_cache.flush()
     else:
-        try:
-            folder_check(cacheDir)
-            with open(file_path, 'w+') as f:
-                f.write(json.dumps(addon_cache, indent=2))
-        except:
-            return
+        addon_cache.load()
 
 
 
@@ -2274,11 +2849,11 @@ def download_jar(progress_func=None, imported=False):
 
             if imported:
                 jar_name = ('forge' if import_data['type'] == 'forge' else 'server') + '.jar'
-                download_url(import_data['jar_link'], jar_name, downDir, hook)
+                download_url(import_data['jar_link'], jar_name, downDir, hook, cache=True)
 
             else:
                 jar_name = ('forge' if new_server_info['type'] == 'forge' else 'server') + '.jar'
-                download_url(new_server_info['jar_link'], jar_name, downDir, hook)
+                download_url(new_server_info['jar_link'], jar_name, downDir, hook, cache=True)
 
             jar_path = os.path.join(downDir, jar_name)
 
@@ -2289,7 +2864,7 @@ def download_jar(progress_func=None, imported=False):
                     progress_func(100)
 
                 fail_count = 0
-                copy(jar_path, os.path.join(tmpsvr, jar_name))
+                artifact_cache.copy(jar_path, os.path.join(tmpsvr, jar_name))
                 os.remove(jar_path)
                 break
 
@@ -2606,7 +3181,7 @@ max-world-size=29999984"""
 
         # Copy folder to server path and delete tmpsvr
         new_path = os.path.join(serverDir, new_server_info['name'])
-        copytree(tmpsvr, new_path, dirs_exist_ok=True)
+        copytree(tmpsvr, new_path, dirs_exist_ok=True, copy_function=artifact_cache.copy)
         safe_delete(tempDir)
         safe_delete(downDir)
 
@@ -2658,7 +3233,7 @@ def update_server_files(progress_func=None):
         # Replace server path with tmpsvr
         new_path = os.path.join(serverDir, new_server_info['name'])
         safe_delete(new_path)
-        copytree(tmpsvr, new_path, dirs_exist_ok=True)
+        copytree(tmpsvr, new_path, dirs_exist_ok=True, copy_function=artifact_cache.copy)
         safe_delete(tempDir)
         safe_delete(downDir)
 
@@ -2677,37 +3252,10 @@ def create_backup(import_server=False, *args):
 
 # Restore backup and track progress for ServerBackupRestoreProgressScreen
 def restore_server(backup_obj: backup.BackupObject, progress_func=None):
-
-    # Get file count of backup
-    total_files = 0
-    proc_complete = False
-    file_path = backup_obj.path
-    server_name = server_manager.current_server.name
-    file_name = os.path.basename(file_path)
-
     server_manager.current_server.backup._restore_file = None
 
-    with tarfile.open(file_path) as archive:
-        total_files = sum(1 for member in archive if member.isreg())
-
-    def thread_checker():
-        while not proc_complete:
-            time.sleep(0.5)
-            current_count = 0
-            for path, dir_count, file_count in os.walk(server_path(server_name)):
-                current_count += len(file_count)
-
-            percent = round((current_count/total_files) * 100)
-            progress_func(percent)
-
-        print("Done!")
-
-    thread_check = threading.Timer(0, thread_checker)
-    thread_check.daemon = True
-    thread_check.start()
-
-    server_manager.current_server.backup.restore(backup_obj)
-    proc_complete = True
+    # Progress is reported by the restore itself, since unchanged files are skipped
+    server_manager.current_server.backup.restore(backup_obj, progress_func)
 
     if progress_func:
         progress_func(100)
@@ -3095,7 +3643,7 @@ def finalize_import(progress_func=None, *args):
 
         # Copy folder to server path and delete tmpsvr
         new_path = os.path.join(serverDir, import_data['name'])
-        copytree(tmpsvr, new_path, dirs_exist_ok=True)
+        copytree(tmpsvr, new_path, dirs_exist_ok=True, copy_function=artifact_cache.copy)
         safe_delete(tempDir)
         safe_delete(downDir)
 
@@ -3171,6 +3719,119 @@ eula=true"""
             return True
 
 
+# ------- Modpack Pipeline -------
+# .mrpack imports run in stages instead of extracting the whole pack first: modrinth.index.json is read straight from
+# the zip, every server-side file is downloaded concurrently and checked against the hashes in the index, and the
+# overrides are extracted on several threads. The time each stage took is kept in import_data['timings']
+
+# Joins a path from an archive or index to root, or returns None if it would end up outside of it
+def safe_join(root: str, path: str):
+    root = os.path.abspath(root)
+    final_path = os.path.abspath(os.path.join(root, path))
+    return final_path if final_path.startswith(root + os.sep) else None
+
+# Extracts zip members to destination with their path after prefix, each thread uses its own handle
+def _extract_members(archive_path: str, members: list, destination: str, prefix: str):
+    with zipfile.ZipFile(archive_path, 'r') as archive:
+        for member in members:
+            path = safe_join(destination, member.filename[len(prefix):])
+            if not path:
+                continue
+            if member.is_dir():
+                folder_check(path)
+                continue
+
+            # Overrides often replace a downloaded mod, which may be hardlinked from artifact_cache, so replace it instead of writing into it
+            folder_check(os.path.dirname(path))
+            temp_path = f'{path}.tmp'
+            with archive.open(member) as source, open(temp_path, 'wb') as target:
+                copyfileobj(source, target, 1048576)
+            os.replace(temp_path, path)
+
+# Splits members between workers by size, and extracts them at once
+def extract_members(archive_path: str, members: list, destination: str, prefix='', workers=None):
+    workers = max(1, min(workers or os.cpu_count() or 1, 8, len(members)))
+    groups = [[] for x in range(workers)]
+    sizes = [0] * workers
+    for member in sorted(members, key=lambda x: x.file_size, reverse=True):
+        smallest = sizes.index(min(sizes))
+        groups[smallest].append(member)
+        sizes[smallest] += member.file_size
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(_extract_members, archive_path, group, destination, prefix) for group in groups]:
+            future.result()
+
+# Downloads the files listed in a .mrpack and extracts its overrides to destination
+# Returns the time of each stage, or False if a file couldn't be downloaded
+def extract_mrpack(file_path: str, destination: str, progress_func=None):
+    timings = {}
+
+    # Stage 1: read the index without extracting anything
+    start_time = time.perf_counter()
+    with zipfile.ZipFile(file_path, 'r') as archive:
+        index_data = archive.read('modrinth.index.json')
+        members = archive.infolist()
+
+    folder_check(destination)
+    with open(os.path.join(destination, 'modrinth.index.json'), 'wb') as f:
+        f.write(index_data)
+
+    file_list = [file for file in json.loads(index_data)['files'] if file.get('env', {}).get('server') != 'unsupported']
+    timings['index'] = round(time.perf_counter() - start_time, 3)
+    if progress_func:
+        progress_func(5)
+
+
+    # Stage 2: download everything at once, the download manager caps how many actually run in parallel
+    start_time = time.perf_counter()
+    def download_file(file_data):
+        path = safe_join(destination, file_data['path'])
+        if not path:
+            return False
+
+        for url in file_data['downloads']:
+            try:
+                if download_url(url, os.path.basename(path), os.path.dirname(path), hashes=file_data.get('hashes'), cache=True):
+                    return True
+            except Exception as e:
+                if debug:
+                    print(f"Couldn't download '{file_data['path']}' from '{url}': {e}")
+
+        # Fall back to cloudscraper in case the host is behind Cloudflare, since there's no hash check there
+        try:
+            return cs_download_url(file_data['downloads'][0], os.path.basename(path), os.path.dirname(path)) and (not file_data.get('hashes') or verify_hashes(path, file_data['hashes']))
+        except Exception:
+            return False
+
+    if file_list:
+        with ThreadPoolExecutor(max_workers=min(20, len(file_list))) as pool:
+            futures = [pool.submit(download_file, file_data) for file_data in file_list]
+            for count, future in enumerate(as_completed(futures), 1):
+                if not future.result():
+                    for pending in futures:
+                        pending.cancel()
+                    return False
+                if progress_func:
+                    progress_func(5 + round(40 * count / len(file_list)))
+
+    timings['downloads'] = round(time.perf_counter() - start_time, 3)
+
+
+    # Stage 3: extract "overrides", then "server-overrides" on top of them
+    start_time = time.perf_counter()
+    for prefix in ('overrides/', 'server-overrides/'):
+        override_list = [member for member in members if member.filename.startswith(prefix) and member.filename != prefix]
+        if override_list:
+            extract_members(file_path, override_list, destination, prefix)
+
+    timings['overrides'] = round(time.perf_counter() - start_time, 3)
+    if progress_func:
+        progress_func(50)
+
+    return timings
+
+
 # Imports a modpack from a .zip file
 def scan_modpack(update=False, progress_func=None):
     global import_data
@@ -3197,11 +3858,24 @@ def scan_modpack(update=False, progress_func=None):
     folder_check(test_server)
     os.chdir(test_server)
 
-    extract_archive(file_path, test_server)
-    move_files_root(test_server)
+    # Modrinth packs go through the pipeline, everything else is extracted as a whole
+    timings = {}
+    if file_path.endswith('.mrpack'):
+        timings = extract_mrpack(file_path, test_server, progress_func)
+        if timings is False:
+            os.chdir(cwd)
+            return False
 
-    if progress_func:
-        progress_func(50)
+    else:
+        start_time = time.perf_counter()
+        extract_archive(file_path, test_server)
+        move_files_root(test_server)
+        timings['extract'] = round(time.perf_counter() - start_time, 3)
+
+        if progress_func:
+            progress_func(50)
+
+    start_time = time.perf_counter()
 
 
     # Clean-up name
@@ -3265,34 +3939,9 @@ def scan_modpack(update=False, progress_func=None):
         data['name'] = new_server_name(process_name(import_data['name']))
 
 
-    # Approach #1: Look for "modrinth.index.json"
+    # Approach #1: "modrinth.index.json" files were already downloaded by extract_mrpack()
     if file_path.endswith('.mrpack'):
         data['pack_type'] = 'mrpack'
-        mr_index = os.path.join(test_server, 'modrinth.index.json')
-        if os.path.isfile(mr_index):
-            with open(mr_index, 'r') as f:
-
-                # Reorganize .json for ease of iteration
-                metadata = [
-                    {
-                        'url':i['downloads'][0],
-                        'file_name':os.path.basename(i['path']),
-                        'destination':os.path.join(test_server, os.path.dirname(i['path']))
-                    }
-                    for i in json.loads(f.read())["files"]
-                ]
-
-                def get_mod_url(mod_data):
-                    try:
-                        return cs_download_url(mod_data['url'], mod_data['file_name'], mod_data['destination'])
-                    except Exception as e:
-                        return False
-
-                # Iterate over additional content to see if it's available to be downloaded
-                with ThreadPoolExecutor(max_workers=20) as pool:
-                    for result in pool.map(get_mod_url, metadata):
-                        if not result:
-                            return result
 
 
     # Approach #2: look for "ServerStarter"
@@ -3531,6 +4180,10 @@ def scan_modpack(update=False, progress_func=None):
                     break
 
 
+    timings['detect'] = round(time.perf_counter() - start_time, 3)
+    if debug:
+        print(f"Modpack scan timings: {timings}")
+
     if data['type'] and data['version'] and data['name']:
         import_data = {
             'name': data['name'],
@@ -3539,7 +4192,8 @@ def scan_modpack(update=False, progress_func=None):
             'version': data['version'],
             'build': data['build'],
             'launch_flags': data['launch_flags'],
-            'pack_type': data['pack_type']
+            'pack_type': data['pack_type'],
+            'timings': timings
         }
 
         if progress_func:
@@ -3555,6 +4209,7 @@ def finalize_modpack(update=False, progress_func=None, *args):
     global import_data
 
     test_server = os.path.join(tempDir, 'importtest')
+    start_time = time.perf_counter()
 
     if import_data['name'] and os.path.exists(test_server):
 
@@ -3593,7 +4248,7 @@ def finalize_modpack(update=False, progress_func=None, *args):
 
                 # Recursively copy folders, and simply copy files
                 if os.path.isdir(item):
-                    copytree(item, os.path.join(tmpsvr, file_name), dirs_exist_ok=True)
+                    copytree(item, os.path.join(tmpsvr, file_name), dirs_exist_ok=True, copy_function=artifact_cache.copy)
                 else:
                     copy(item, tmpsvr)
 
@@ -3643,7 +4298,7 @@ def finalize_modpack(update=False, progress_func=None, *args):
 
         # Copy folder to server path and delete tmpsvr
         folder_check(new_path)
-        copytree(tmpsvr, new_path, dirs_exist_ok=True)
+        copytree(tmpsvr, new_path, dirs_exist_ok=True, copy_function=artifact_cache.copy)
         safe_delete(tempDir)
         safe_delete(downDir)
 
@@ -3696,6 +4351,12 @@ eula=true"""
             safe_delete(tempDir)
             safe_delete(downDir)
             make_update_list()
+
+            if 'timings' in import_data:
+                import_data['timings']['finalize'] = round(time.perf_counter() - start_time, 3)
+                if debug:
+                    print(f"Modpack import timings: {import_data['timings']}")
+
             if progress_func:
                 progress_func(100)
             return True
@@ -4042,8 +4703,8 @@ def generate_server_list():
     return server_list
 
 
-# Retrieve modrinth config for updates
-def get_modrinth_data(name: str):
+# Retrieve modrinth config for updates, online=False skips the latest version lookup
+def get_modrinth_data(name: str, online=True):
     index = os.path.join(server_path(name), f'{"" if os_name == "windows" else "."}modrinth.index.json')
     index_data = {"name": None, "version": '0.0.0', "latest": '0.0.0'}
 
@@ -4068,21 +4729,26 @@ def get_modrinth_data(name: str):
 
 
         # Check online for latest version
-        try:
-            online_modpack = addons.get_modpack_url(addons.search_modpacks(index_data['name'])[0])
-            index_data['latest'] = online_modpack.download_version
-            index_data['download_url'] = online_modpack.download_url
-        except IndexError:
-            pass
+        if online:
+            index_data.update(get_latest_modpack(index_data['name']))
 
 
     return index_data
 
+# Looks up the latest version of a modpack by name --> {'latest', 'download_url'}
+def get_latest_modpack(modpack_name: str):
+    try:
+        online_modpack = addons.get_modpack_url(addons.search_modpacks(modpack_name)[0])
+        return {'latest': online_modpack.download_version, 'download_url': online_modpack.download_url}
+    except IndexError:
+        return {}
+
 # Return list of every valid server update property in 'applicationFolder'
 def make_update_list():
     global update_list
 
     update_list = {}
+    modpack_list = {}
 
     for name in glob(os.path.join(applicationFolder, "Servers", "*")):
 
@@ -4112,13 +4778,10 @@ def make_update_list():
                 isModpack = ""
 
 
+            # Modpacks are checked together below
             if isModpack:
                 if isModpack == 'mrpack':
-                    modpack_data = get_modrinth_data(name)
-                    if (modpack_data['version'] != modpack_data['latest']) and not modpack_data['latest'].startswith("0.0.0"):
-                        serverObject[name]["needsUpdate"] = "true"
-                        serverObject[name]["updateString"] = modpack_data['latest']
-                        serverObject[name]["updateUrl"] = modpack_data['download_url']
+                    modpack_list[name] = get_modrinth_data(name, online=False)
 
 
             else:
@@ -4136,6 +4799,20 @@ def make_update_list():
 
         update_list.update(serverObject)
 
+
+    # Look up each modpack once, even if several servers use it
+    modpack_names = {modpack_data['name'] for modpack_data in modpack_list.values()}
+    if modpack_names and app_online:
+        with ThreadPoolExecutor(max_workers=min(update_concurrency, len(modpack_names))) as pool:
+            latest_modpacks = dict(zip(modpack_names, pool.map(get_latest_modpack, modpack_names)))
+
+        for name, modpack_data in modpack_list.items():
+            modpack_data.update(latest_modpacks[modpack_data['name']])
+            if (modpack_data['version'] != modpack_data['latest']) and not modpack_data['latest'].startswith("0.0.0"):
+                update_list[name]["needsUpdate"] = "true"
+                update_list[name]["updateString"] = modpack_data['latest']
+                update_list[name]["updateUrl"] = modpack_data['download_url']
+
     return update_list
 
 
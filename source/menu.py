@@ -9487,7 +9487,7 @@ class RuleButton(FloatLayout):
 
                         if ip_addr:
                             # Whitelist IP if it's still in the rule list
-                            if ip_addr in acl.gen_iplist(acl_object.rules['subnets']):
+                            if ip_addr in acl.IpRuleSet(acl_object.rules['subnets']):
                                 acl_object.ban_player(f"!w{ip_addr}", remove=False)
 
                     banner_text = f"'${filtered_name}$' was removed" if button_text == 'remove' else f"'{filtered_name}' is {'pardoned' if (button_text == 'pardon') else 'banned'}"
@@ -10367,7 +10367,7 @@ class AclRulePanel(RelativeLayout):
                         acl_object.add_global_rule(original_name, current_list, remove=True)
 
                     # Whitelist IP if it's still in the rule list
-                    if ip_addr in acl.gen_iplist(acl_object.rules['subnets']):
+                    if ip_addr in acl.IpRuleSet(acl_object.rules['subnets']):
                         acl_object.ban_player(f"!w{ip_addr}", remove=False)
 
                     hover_attr = (icon_path("lock-open.png"), 'PARDON', (0.3, 1, 0.6, 1))
@@ -10390,7 +10390,7 @@ class AclRulePanel(RelativeLayout):
                     acl_object.ban_player(ip_addr, remove=True)
 
                     # Whitelist IP if it's still in the rule list
-                    if ip_addr in acl.gen_iplist(acl_object.rules['subnets']):
+                    if ip_addr in acl.IpRuleSet(acl_object.rules['subnets']):
                         acl_object.ban_player(f"!w{ip_addr}", remove=False)
 
                     hover_attr = (icon_path("lock-open.png"), 'PARDON', (0.3, 1, 0.6, 1))
@@ -11804,6 +11804,9 @@ class CreateServerAddonSearchScreen(MenuBackground):
             self.page_switcher.update_index(self.current_page, self.max_pages)
             page_list = results[(self.page_size * self.current_page) - self.page_size:self.page_size * self.current_page]
 
+            # Load add-on info for this page and the next one in the background
+            addons.prefetch_addon_info(results[(self.page_size * self.current_page) - self.page_size:self.page_size * (self.current_page + 1)], constants.new_server_info)
+
             self.scroll_layout.clear_widgets()
             # gc.collect()
 
@@ -14282,8 +14285,12 @@ class PerformancePanel(RelativeLayout):
     # Updates data in panel while the server is running
     def refresh_data(self, interval=0.5, *args):
 
-        # Get performance stats
-        threading.Timer(0, functools.partial(constants.server_manager.current_server.performance_stats, interval, (self.player_clock == 3))).start()
+        # Get performance stats, on the supervisor's threads when it's enabled
+        supervisor = constants.server_manager.supervisor
+        if supervisor:
+            supervisor.run(constants.server_manager.current_server.performance_stats, interval, (self.player_clock == 3))
+        else:
+            threading.Timer(0, functools.partial(constants.server_manager.current_server.performance_stats, interval, (self.player_clock == 3))).start()
 
         def update_data(*args):
             try:
@@ -15010,8 +15017,8 @@ class ConsolePanel(FloatLayout):
     def update_process(self, run_data, *args):
         self.run_data = run_data
         try:
-            if self.update_text not in self.run_data['process-hooks']:
-                self.run_data['process-hooks'].append(self.update_text)
+            if self.queue_text not in self.run_data['process-hooks']:
+                self.run_data['process-hooks'].append(self.queue_text)
 
             if self.reset_panel not in self.run_data['close-hooks']:
                 self.run_data['close-hooks'].append(self.reset_panel)
@@ -15031,8 +15038,71 @@ class ConsolePanel(FloatLayout):
     def update_text(self, text, force_scroll=False, animate_last=True, *args):
         original_scroll = self.scroll_layout.scroll_y
         original_len = len(self.scroll_layout.data)
+
+        # run_data['log'] is a svrmgr.LogBuffer, keep track of its position for flush_text()
+        if isinstance(text, list):
+            self._log_total = None
+            self.scroll_layout.data = text
+        else:
+            self._log_total = text.total
+            self.scroll_layout.data = text.snapshot()
+
+        self.update_scroll(original_scroll, original_len, force_scroll, animate_last)
+
+
+    # Process hook from the server thread, called for every line
+    # Lines are only stored here and flushed once per frame, so bursts get coalesced into a single update
+    def queue_text(self, text, *args):
+        self._pending_text = text
+        self._flush_trigger()
+
+
+    # Appends the lines queued since the last frame instead of replacing all the data
+    def flush_text(self, *args):
+        text = self._pending_text
+        self._pending_text = None
+        data = self.scroll_layout.data
+
+        if not text or not self.run_data:
+            return
+
+        # Lost track of the log (new panel, restarted, or more lines arrived than it holds), so reload it entirely
+        new_lines = text.since(self._log_total) if (data and self._log_total is not None) else None
+        if new_lines is None:
+            return self.update_text(text)
+
+        # The newest line on screen can also be replaced in place by progress bars
+        previous = len(text) - len(new_lines) - 1
+        replace_last = previous >= 0 and data[-1]['text'] != text[previous]['text']
+        if not (new_lines or replace_last):
+            return
+
+        self._log_total = text.total
+        original_scroll = self.scroll_layout.scroll_y
+        original_len = len(data)
+
+        if replace_last:
+            data[-1] = text[previous]
+
+        # Summarize large bursts instead of pushing all of them through the RecycleView
+        skipped = len(new_lines) - self.max_backlog
+        if skipped > 0:
+            summary = {'text': (dt.now().strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11), 'INFO', f"Skipped {skipped:,} lines to keep up with the server", (0.7, 0.7, 0.7, 1))}
+            new_lines = [summary] + new_lines[skipped:]
+
+        data.extend(new_lines)
+
+        # Purge the same amount as the server log
+        excess = len(data) - len(text)
+        if excess > 0:
+            del data[:excess]
+
+        self.update_scroll(original_scroll, original_len, animate_last=bool(new_lines))
+
+
+    # Keeps the scroll position and selection steady after the data changes
+    def update_scroll(self, original_scroll, original_len, force_scroll=False, animate_last=True):
         label_height = 41.8
-        self.scroll_layout.data = text
 
 
         # Make the console sticky if scrolled to the bottom of the viewport
@@ -15070,7 +15140,7 @@ class ConsolePanel(FloatLayout):
                         Animation(opacity=0, duration=0.3).start(label.anim_cover)
                 except:
                     pass
-        if len(text) > original_len and animate_last:
+        if len(self.scroll_layout.data) > original_len and animate_last:
             Clock.schedule_once(fade_animation, 0)
 
 
@@ -15302,7 +15372,7 @@ class ConsolePanel(FloatLayout):
             constants.folder_check(constants.tempDir)
             file_name = f"{constants.server_manager.current_server.name}-latest.log"
             with open(os.path.join(constants.tempDir, file_name), 'w+') as f:
-                f.write(constants.json.dumps(self.run_data['log']))
+                f.write(constants.json.dumps(self.run_data['log'].snapshot()))
 
 
             self.run_data = None
@@ -15798,6 +15868,12 @@ class ConsolePanel(FloatLayout):
         self.last_self_touch = None
         self.in_scroll_region = False
 
+        # Buffered log delivery from the server thread
+        self.max_backlog = constants.console_backlog
+        self._pending_text = None
+        self._log_total = None
+        self._flush_trigger = Clock.create_trigger(self.flush_text, 0)
+
 
         self.button_colors = {
             'maximize': [[(0.05, 0.08, 0.07, 1), (0.722, 0.722, 1, 1)], ''],
@@ -17927,8 +18003,10 @@ class ServerAddonUpdateScreen(ProgressScreen):
 
             # Clear items from addon cache to re-cache
             for addon in server_obj.addon.installed_addons['enabled']:
-                if addon.hash in constants.addon_cache:
-                    del constants.addon_cache[addon.hash]
+                try:
+                    constants.addon_cache.pop(addons.addon_cache_key(addon.path), None)
+                except OSError:
+                    pass
             constants.load_addon_cache(True)
 
 
@@ -18407,6 +18485,9 @@ class ServerAddonSearchScreen(MenuBackground):
             self.page_switcher.update_index(self.current_page, self.max_pages)
             page_list = results[(self.page_size * self.current_page) - self.page_size:self.page_size * self.current_page]
 
+            # Load add-on info for this page and the next one in the background
+            addons.prefetch_addon_info(results[(self.page_size * self.current_page) - self.page_size:self.page_size * (self.current_page + 1)], constants.server_manager.current_server.properties_dict())
+
             self.scroll_layout.clear_widgets()
             # gc.collect()
 
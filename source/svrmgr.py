@@ -1,11 +1,14 @@
 from concurrent.futures import ThreadPoolExecutor
 from subprocess import Popen, PIPE, run
+from collections import deque
 from datetime import datetime as dt
 from threading import Timer
+from queue import Queue
 from copy import deepcopy
 from glob import glob
 import functools
 import threading
+import asyncio
 import psutil
 import ctypes
 import time
@@ -88,6 +91,11 @@ class ServerObject():
                 self.custom_flags = self.config_file.get("general", "customFlags").strip()
         except:
             self.custom_flags = ''
+        try:
+            if self.config_file.get("general", "consoleLines"):
+                self.max_log_size = int(self.config_file.get("general", "consoleLines"))
+        except:
+            self.max_log_size = 800
         try:
             if self.config_file.get("general", "isModpack"):
                 modpack = self.config_file.get("general", "isModpack").lower()
@@ -228,6 +236,11 @@ class ServerObject():
                 self.custom_flags = self.config_file.get("general", "customFlags").strip()
         except:
             self.custom_flags = ''
+        try:
+            if self.config_file.get("general", "consoleLines"):
+                self.max_log_size = int(self.config_file.get("general", "consoleLines"))
+        except:
+            self.max_log_size = 800
         try:
             if self.config_file.get("general", "isModpack"):
                 modpack = self.config_file.get("general", "isModpack").lower()
@@ -368,317 +381,154 @@ class ServerObject():
     def update_log(self, text: bytes, *args):
 
         text = text.replace(b'\xa7', b'\xc2\xa7').decode('utf-8', errors='ignore')
+        new_format = text.startswith('[')
+
+        # Splits "<user> content" chat messages
+        def split_chat(message):
+            user, content = message.split('>', 1)
+            user = log_user_pattern.sub('', user.replace('<', '', 1).strip())
+            return user, content.strip()
 
         # (date, type, log, color)
         def format_log(line, *args):
-
-            def format_time(string):
-                try:
-                    date = dt.strptime(string, "%H:%M:%S").strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11)
-                except ValueError:
-                    date = ''
-                return date
-
-            def format_color(code, *args):
-                if 'r' not in code:
-                    formatted_code = f'[color={constants.color_table[code]}]'
-                else:
-                    formatted_code = '[/color]'
-                return formatted_code
-
-            date_label = ''
-            type_label = ''
-            main_label = ''
-            type_color = ''
             event = None
+            message_date_obj = dt.now()
+            script_enabled = bool(self.script_object and self.script_object.enabled)
 
-            if line:
-
-                message_date_obj = dt.now()
-
-                # New log formatting (latest.log)
-                if text.startswith('['):
-                    message = line.split("]: ", 1)[-1].strip()
-                    try:
-                        date_str = line.split("]", 1)[0].strip().replace("[", "")
-                        date_label = format_time(date_str)
-                    except IndexError:
-                        date_label = message_date_obj.strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11)
-
-                # Old log formatting (server.log)
-                else:
-                    message = line.split("] ", 1)[-1].strip()
-                    try:
-                        date_str = line.split(" ", 1)[1].split("[", 1)[0].strip()
-                        date_label = format_time(date_str)
-                    except IndexError:
-                        date_label = message_date_obj.strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11)
-
-                # If date_label is missing, it may be formatted differently
-                if not date_label:
-                    date_label = message_date_obj.strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11)
-
-                # Format string as needed
-
-                # Shorten coordinates
-                addrs = re.findall(r'\b\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\b', message)
-                for float_str in re.findall(r"(?<=[ |\]|\(]|,)[-+]?(?:\d+\.\d+)", message):
-                    if len(float_str) > 5 and "." in float_str:
-                        for addr in addrs:
-                            if float_str in addr:
-                                break
-                        else:
-                            message = message.replace(float_str, str(round(float(float_str), 2)))
+            date_label, message, main_label = parse_log_line(line, new_format)
+            if not date_label:
+                date_label = message_date_obj.strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11)
 
-                if message.endswith("[m"):
-                    message = message.replace("[m", "").strip()
+            # Tag the line once, and dispatch on the result
+            tag = classify_log_line(line, message, main_label, self.script_object.aliases if script_enabled else None)
 
-                # Format special color codes
-                if '§' in message:
-                    original_message = message
 
-                    try:
-                        message = escape_markup(message)
-                        code_list = [message[x:x + 2] for x, y in enumerate(message, 0) if y == '§']
+            # Ignore NBT data updates
+            if tag == 'ignore':
+                return None, None
 
-                        for code in code_list:
-                            message = message.replace(code, format_color(code))
 
-                        if len(code_list) % 2 == 1:
-                            message = message + '[/color]'
+            # Player auto-mcs command issued
+            elif tag == 'alias':
+                user, content = split_chat(message)
+                main_label = f"{user} issued server command: {content}"
+                event = functools.partial(self.script_object.message_event, {'user': user, 'content': content})
 
-                    except KeyError:
-                        message = original_message
 
-                main_label = message.strip()
-                message = message.replace('[Not Secure]', '').strip()
-
-                # Calculate color based on log type
-
-                # Player auto-mcs command issued
-                list_of_commands = []
-                amscript_cmd = False
-                if self.script_object:
-                    if self.script_object.enabled:
-                        if (message.startswith("<") and ">" in message) or "[Async Chat Thread" in line:
-                            list_of_commands = list(self.script_object.aliases.keys())
-                            possible_command = message.split('>', 1)[1].strip().split(" ")[0].strip()
-                            amscript_cmd = possible_command in list_of_commands
-
-                if amscript_cmd:
-                    type_label = "EXEC"
-                    type_color = (1, 0.298, 0.6, 1)
-                    user = message.split('>', 1)[0].replace('<', '', 1).strip()
-                    user = re.sub(r'\[(\/color|color=#?\w*).+?\]?', '', user)
-                    content = message.split('>', 1)[1].strip()
-                    main_label = f"{user} issued server command: {content}"
+            # Player message log
+            elif tag == 'chat':
+                if script_enabled and '>' in message:
+                    user, content = split_chat(message)
                     event = functools.partial(self.script_object.message_event, {'user': user, 'content': content})
 
 
-                # Player message log
-                elif (message.startswith("<") and ">" in message) or "[Async Chat Thread" in line:
-                    type_label = "CHAT"
-                    type_color = (0.439, 0.839, 1, 1)
-
-                    if self.script_object.enabled:
-                        user = message.split('>', 1)[0].replace('<', '', 1).strip()
-                        user = re.sub(r'\[(\/color|color=#?\w*).+?\]?', '', user)
-                        content = message.split('>', 1)[1].strip()
-                        event = functools.partial(self.script_object.message_event, {'user': user, 'content': content})
-
+            # Player command issued
+            elif tag == 'command':
+                user, content = message.split('issued server command: ', 1)
+                user = log_user_pattern.sub('', user.strip())
+                content = content.strip()
 
-                # Server message log
-                elif message.strip().startswith("[Server]"):
-                    type_label = "CHAT"
-                    type_color = (0.439, 0.839, 1, 1)
-
-
-                # Player command issued
-                elif "issued server command: " in message:
-                    type_label = "EXEC"
-                    type_color = (1, 0.298, 0.6, 1)
-
-                    user = message.split('issued server command: ')[0].strip()
-                    user = re.sub(r'\[(\/color|color=#?\w*).+?\]?', '', user)
-                    content = message.split('issued server command: ')[1].strip()
-
-                    # If commands change ACL status, reload lists
-                    if content.startswith('op ') or content.startswith('deop '):
-                        self.acl.reload_list('ops')
-                    if content.startswith('ban ') or content.startswith('pardon '):
-                        self.acl.reload_list('bans')
-                    if content.startswith('whitelist add ') or content.startswith('whitelist remove '):
-                        self.acl.reload_list('wl')
-
-                    # Process amscript event
-                    if self.script_object.enabled:
-                        event = functools.partial(self.script_object.message_event, {'user': user, 'content': content})
+                # If commands change ACL status, reload lists
+                if content.startswith('op ') or content.startswith('deop '):
+                    self.acl.reload_list('ops')
+                if content.startswith('ban ') or content.startswith('pardon '):
+                    self.acl.reload_list('bans')
+                if content.startswith('whitelist add ') or content.startswith('whitelist remove '):
+                    self.acl.reload_list('wl')
 
+                # Process amscript event
+                if script_enabled:
+                    event = functools.partial(self.script_object.message_event, {'user': user, 'content': content})
 
 
-                # Server start log
-                elif "Done" in line and "For help," in line:
-                    type_label = "START"
-                    type_color = (0.3, 1, 0.6, 1)
-                    main_label += '. Type "!help" for auto-mcs commands'
+            # Server start log
+            elif tag == 'start':
+                main_label += '. Type "!help" for auto-mcs commands'
 
 
-                # Server stop log
-                elif "Stopping server" in line:
-                    type_label = "STOP"
-                    type_color = (0.3, 1, 0.6, 1)
-                    self.check_for_deadlock()
+            # Server stop log
+            elif tag == 'stop':
+                self.check_for_deadlock()
 
 
-                # Player join log
-                elif "logged in with entity id" in message:
-                    uuid = None
-                    user = message.split("[/", 1)[0].strip()
-                    ip = message.split("[/", 1)[1].split("]")[0].strip()
-                    main_label = f'{user} logged in from {ip} ' + message.split("]", 1)[1].replace('logged in', '').strip()
-                    try:
-                        for log_item in reversed(self.run_data['log'][-10:]):
-                            if user in log_item['text'][2] and "UUID" in log_item['text'][2]:
-                                uuid = log_item['text'][2].split(f"UUID of player {user} is ")[1]
-                                break
-                    except:
-                        pass
+            # Player join log
+            elif tag == 'join':
+                uuid = None
+                user = message.split("[/", 1)[0].strip()
+                ip = message.split("[/", 1)[1].split("]")[0].strip()
+                main_label = f'{user} logged in from {ip} ' + message.split("]", 1)[1].replace('logged in', '').strip()
+                try:
+                    for log_item in reversed(self.run_data['log'][-10:]):
+                        if user in log_item['text'][2] and "UUID" in log_item['text'][2]:
+                            uuid = log_item['text'][2].split(f"UUID of player {user} is ")[1]
+                            break
+                except:
+                    pass
 
-                    if not uuid:
-                        uuid = get_uuid(user)['uuid']
+                if not uuid:
+                    uuid = get_uuid(user)['uuid']
 
 
-                    def add_to_list(username, user_uuid, ip_addr, msg_date_obj):
-                        self.run_data['player-list'][username] = {
-                            'user': username,
-                            'uuid': user_uuid,
-                            'ip': ip_addr,
-                            'date': msg_date_obj,
-                            'logged-in': True
-                        }
-                        self.acl._process_log(self.run_data['player-list'][username])
+                def add_to_list(username, user_uuid, ip_addr, msg_date_obj):
+                    self.run_data['player-list'][username] = {
+                        'user': username,
+                        'uuid': user_uuid,
+                        'ip': ip_addr,
+                        'date': msg_date_obj,
+                        'logged-in': True
+                    }
+                    self.acl._process_log(self.run_data['player-list'][username])
 
-                        if self.script_object.enabled:
-                            return functools.partial(self.script_object.join_event, self.run_data['player-list'][username])
+                    if script_enabled:
+                        return functools.partial(self.script_object.join_event, self.run_data['player-list'][username])
 
+                try:
+                    if self.run_data['player-list'][user]['date'] < message_date_obj:
+                        event = add_to_list(user, uuid, ip, message_date_obj)
+                except KeyError:
                     try:
-                        if self.run_data['player-list'][user]['date'] < message_date_obj:
-                            event = add_to_list(user, uuid, ip, message_date_obj)
+                        event = add_to_list(user, uuid, ip, message_date_obj)
                     except KeyError:
-                        try:
-                            event = add_to_list(user, uuid, ip, message_date_obj)
-                        except KeyError:
-                            pass
-
-                    type_label = "PLAYER"
-                    type_color = (0.953, 0.929, 0.38, 1)
+                        pass
 
 
-                # Player leave log
-                elif "lost connection: " in message:
-                    user = message.split("lost connection: ", 1)[0].strip()
+            # Player leave log
+            elif tag == 'leave':
+                user = message.split("lost connection: ", 1)[0].strip()
 
-                    def add_to_list():
-                        self.run_data['player-list'][user]['date'] = message_date_obj
-                        self.run_data['player-list'][user]['logged-in'] = False
-                        self.acl._process_log(self.run_data['player-list'][user])
+                def add_to_list():
+                    self.run_data['player-list'][user]['date'] = message_date_obj
+                    self.run_data['player-list'][user]['logged-in'] = False
+                    self.acl._process_log(self.run_data['player-list'][user])
 
-                        if self.script_object.enabled:
-                            return functools.partial(self.script_object.leave_event, self.run_data['player-list'][user])
+                    if script_enabled:
+                        return functools.partial(self.script_object.leave_event, self.run_data['player-list'][user])
 
+                try:
+                    if self.run_data['player-list'][user]['date'] < message_date_obj:
+                        event = add_to_list()
+                except KeyError:
                     try:
-                        if self.run_data['player-list'][user]['date'] < message_date_obj:
-                            event = add_to_list()
+                        event = add_to_list()
                     except KeyError:
-                        try:
-                            event = add_to_list()
-                        except KeyError:
-                            pass
-
-                    type_label = "PLAYER"
-                    type_color = (0.953, 0.929, 0.38, 1)
+                        pass
 
 
-                # Other message events
-                elif "WARN" in line:
-                    type_label = "WARN"
-                    type_color = (1, 0.804, 0.42, 1)
-                elif "ERROR" in line:
-                    type_label = "ERROR"
-                    type_color = (1, 0.5, 0.65, 1)
-                elif "CRITICAL" in line:
-                    type_label = "CRIT"
-                    type_color = (1, 0.5, 0.65, 1)
-                elif "SEVERE" in line:
-                    type_label = "SEVERE"
-                    type_color = (1, 0.5, 0.65, 1)
-                elif "FATAL" in line:
-                    type_label = "FATAL"
-                    type_color = (1, 0.5, 0.65, 1)
-                elif (main_label.endswith(' left the game') or main_label.endswith(' joined the game')):
-                    type_label = "CHAT"
-                    type_color = (0.439, 0.839, 1, 1)
+            # Death messages only count if they mention a connected player
+            elif tag == 'death':
+                for word in main_label.split(" "):
+                    if word.strip() in self.run_data['player-list']:
+                        if script_enabled:
+                            event = functools.partial(self.script_object.death_event, {'user': word.strip(), 'content': main_label.strip()})
+                        break
                 else:
-                    # Ignore NBT data updates
-                    if " has the following entity data: {" in main_label or ("Teleported " in main_label and " to " in main_label):
-                        return
-
-                    type_label = "INFO"
-                    type_color = (0.6, 0.6, 1, 1)
+                    tag = 'other'
 
-                    # Check for death events
-                    exclude_list = ['joined', 'left', 'Killed', 'logged', 'disconnected', 'Made', 'UUID', 'achievement']
-                    s_msg = main_label.split(" ")
-                    for word in exclude_list:
-                        if word in s_msg:
-                            break
-                    else:
-                        include_list = [
-                            'slain',
-                            'went up in flames',
-                            'fell out of the world',
-                            'drowned',
-                            'killed by',
-                            'blown up by',
-                            'suffocated in',
-                            ' lava',
-                            'hit the ground too hard',
-                            'fell ',
-                            'to fall',
-                            'walked into the danger zone',
-                            'struck by lightning',
-                            ' froze',
-                            'shot by',
-                            'pummeled by',
-                            'fireballed by',
-                            'obliterated by',
-                            'to death',
-                            'squished too much',
-                            'squished by',
-                            'withered away',
-                            ' died',
-                            'impaled by',
-                            'was killed',
-                            'left the confines of this world'
-                        ]
-                        include = False
-
-                        for phrase in include_list:
-                            if phrase in main_label.strip():
-                                include = True
-                                break
-
-                        if include:
-                            for word in s_msg:
-                                if word.strip() in self.run_data['player-list']:
-                                    type_label = "CHAT"
-                                    type_color = (0.439, 0.839, 1, 1)
-                                    event = functools.partial(self.script_object.death_event, {'user': word.strip(), 'content': main_label.strip()})
-                                    break
 
-
-                if date_label and type_label and main_label and type_color:
-                    return (date_label, type_label, main_label, type_color), event
+            type_label, type_color = log_styles[tag]
+            if date_label and main_label:
+                return (date_label, type_label, main_label, type_color), event
+            return None, None
 
         for log_line in text.splitlines():
             event = None
@@ -698,7 +548,7 @@ class ServerObject():
 
                     # Progress bars for preparing spawn area
                     def format_pct(line, *a):
-                        num = int(re.search(r'\d+', line).group(0))
+                        num = int(log_number_pattern.search(line).group(0))
                         block = num // 4
                         if num < 100 and block >= 24:
                             block = 23
@@ -718,10 +568,6 @@ class ServerObject():
 
                         self.run_data['log'].append(formatted_line)
 
-                    # Purge long ones
-                    if len(self.run_data['log']) > self.max_log_size:
-                        self.run_data['log'].pop(0)
-
                 # Execute amscript event
                 if event:
                     event()
@@ -785,7 +631,7 @@ class ServerObject():
                 self.run_data['launch-time'] = None
                 self.run_data['player-list'] = {}
                 self.run_data['network'] = {}
-                self.run_data['log'] = [{'text': (dt.now().strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11), 'INIT', f"Launching '{self.name}', please wait...", (0.7,0.7,0.7,1))}]
+                self.run_data['log'] = LogBuffer(self.max_log_size, [{'text': (dt.now().strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11), 'INIT', f"Launching '{self.name}', please wait...", (0.7,0.7,0.7,1))}])
                 self.run_data['process-hooks'] = []
                 self.run_data['close-hooks'] = [self.auto_backup_func]
                 self.run_data['console-panel'] = None
@@ -837,7 +683,11 @@ class ServerObject():
                     self.run_data['log'].append({'text': (dt.now().strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11), 'WARN', f"Networking conflict detected: temporarily using '*:{self.run_data['network']['address']['port']}'", (1, 0.659, 0.42, 1))})
 
                 # Run server
-                self.run_data['process'] = Popen(script_content, stdout=PIPE, stdin=PIPE, stderr=PIPE, cwd=self.server_path, shell=True)
+                supervisor = constants.server_manager.supervisor
+                if supervisor:
+                    self.run_data['process'] = supervisor.launch(self, script_content)
+                else:
+                    self.run_data['process'] = Popen(script_content, stdout=PIPE, stdin=PIPE, stderr=PIPE, cwd=self.server_path, shell=True)
 
             self.run_data['pid'] = self.run_data['process'].pid
             self.run_data['send-command'] = self.send_command
@@ -847,202 +697,28 @@ class ServerObject():
             # ----------------------------------------------------------------------------------------------------------
             # Main server process loop, handles reading output, hooks, and crash detection
             def process_thread(*args):
-                if constants.version_check(self.version, '<', '1.7'):
+                legacy = constants.version_check(self.version, '<', '1.7')
+                if legacy:
                     lines_iterator = iter(self.run_data['process'].stderr.readline, "")
-                    log_file = os.path.join(self.server_path, 'server.log')
                 else:
                     lines_iterator = iter(self.run_data['process'].stdout.readline, "")
-                    log_file = os.path.join(self.server_path, 'logs', 'latest.log')
 
                 fail_counter = 0
-                close = False
-                crash_info = None
                 error_list = []
 
                 for line in lines_iterator:
-
-                    try:
-                        # Append legacy errors to error list
-                        if constants.version_check(self.version, '<', '1.7'):
-                            if "[STDERR] ".encode() in line:
-                                error_list.append(line.decode().split("[STDERR] ")[1])
-                                continue
-
-                        self.update_log(line)
-
-                    except Exception as e:
-                        if constants.debug:
-                            print(f'Failed to process line: {e}')
-
+                    self._process_line(line, error_list, legacy)
                     fail_counter = 0 if line else (fail_counter + 1)
 
                     # Close wrapper if server is closed
                     if not self.running or self.run_data['process'].poll() is not None or fail_counter > 25:
-
-
-                        # Initially check for crashes
-                        def get_latest_crash():
-                            crash_log = None
-
-                            # First, check if a recent crash-reports file exists
-                            if constants.server_path(self.name, 'crash-reports'):
-                                crash_log = sorted(glob(os.path.join(self.server_path, 'crash-reports', 'crash-*-server.*')), key=os.path.getmtime)
-                                if crash_log:
-                                    crash_log = crash_log[-1]
-                                    if ((dt.now() - dt.fromtimestamp(os.path.getmtime(crash_log))).total_seconds() <= 30):
-                                        crash_log = crash_log
-                                    else:
-                                        crash_log = None
-
-                            # If crash report file does not exist, try to deduce what happened and make a new one
-                            if not crash_log:
-
-                                if constants.version_check(self.version, '<', '1.7'):
-                                    error = ''.join(error_list)
-                                else:
-                                    output, error = self.run_data['process'].communicate()
-                                    error = error.decode().replace('\r', '')
-                                file = None
-
-
-                                # If the log was modified recently, try and scrape error from there
-                                use_error = True
-                                if os.path.exists(log_file) and ((dt.now() - dt.fromtimestamp(os.path.getmtime(log_file))).total_seconds() <= 30):
-
-                                    with open(log_file, 'r') as f:
-                                        file = f.read()
-
-                                        # If older log, split to the newest session
-                                        if os.path.basename(log_file) == 'server.log':
-                                            identifier = "[INFO] Starting minecraft server version"
-                                            file = identifier + file.split(identifier)[-1]
-                                            date = file.splitlines()[1].split(' [')[0]
-                                            file = f"{date} {file}"
-
-                                        # Iterate through log to find errors
-                                        file_lines = file.splitlines()
-                                        for x, log_line in enumerate(file_lines):
-                                            if (("crash report" in log_line.lower()) or
-                                            ("a server is already running on that port" in log_line.lower()) or
-                                            ("failed to start the minecraft server" in log_line.lower()) or
-                                            ("you need to agree to the eula" in log_line.lower()) or
-                                            ("FATAL]" in log_line or "encountered an unexpected exception" in log_line.lower())):
-                                                file = '\n'.join(file_lines[x:])
-                                                use_error = False
-                                                break
-
-                                        # If file wasn't split, don't use it
-                                        else:
-                                            if not (error and use_error):
-                                                file = None
-                                                error = False
-                                                return None
-
-
-                                # Use STDERR if no exception was found
-                                if error and use_error:
-                                    file = error.replace('\r', '').strip()
-
-
-                                # If the crash was located, write it to the log file
-                                folder_path = os.path.join(self.server_path, 'crash-reports')
-                                crash_log = os.path.join(folder_path, dt.now().strftime("crash-%Y-%m-%d_%H.%M.%S-server.txt"))
-                                constants.folder_check(folder_path)
-
-                                with open(crash_log, 'w+') as f:
-                                    content = "---- Minecraft Crash Report ----\n"
-                                    content += "// This report was generated by auto-mcs\n\n"
-                                    content += f"Time: {dt.now().strftime(constants.fmt_date('%#m/%#d/%y, %#I:%M %p'))}\n"
-
-                                    if file:
-                                        if "a server is already running on that port" in file.lower():
-                                            content += "Description: Networking conflict\n\n"
-                                            file = f"A connection is already active on *:{self.port}. Change the 'server-port' parameter in 'server.properties', or close the conflicting connection."
-                                        elif "you need to agree to the eula" in file.lower():
-                                            content += "Description: License error\n\n"
-                                            file = "You need to agree to the EULA in order to run the server. Go to 'eula.txt' for more info."
-                                        else:
-                                            content += "Description: Exception in server tick loop\n\n"
-                                        content += file
-
-                                    # If error was not found, generate generic error
-                                    else:
-                                        content += "Description: Unknown exception\n\n"
-                                        content += f"Something went wrong launching '{self.name}': an unspecified error has occurred. To troubleshoot, try the following:\n"
-                                        content += f" - Verify that the server isn't already running in another process\n"
-                                        content += f" - Verify that 'EULA.txt' is set to true\n"
-                                        if self.type.lower() != 'vanilla':
-                                            content += f" - Disable all {'mods' if self.type.lower() in ('fabric', 'forge') else 'plugins'} in the Add-on Manager\n"
-                                        content += f" - Try using a different world file\n"
-                                        content += f" - Try a different server file with the 'Change server.jar' option in the Settings tab\n"
-                                        content += f"     - If this error was caused after using 'Change server.jar', there's an automatic back-up of the previous version in the Back-up Manager"
-
-                                    f.write(content)
-
-                            self.crash_log = crash_log
-                            return crash_log
-
-
-                        # Check for crash if exit code is not 0
-                        if self.run_data['process'].returncode != 0:
-
-                            # Check for false positives
-                            false_positive = False
-                            if error_list:
-                                joined_errors = '\n'.join(error_list)
-
-                                if 'java.net.SocketException: socket closed' in joined_errors:
-                                    false_positive = True
-
-                                if 'Server will start in ' in joined_errors:
-                                    false_positive = True
-
-                            if not false_positive:
-                                crash_info = get_latest_crash()
-
-                        # If server closes within 3 seconds, something probably went wrong
-                        elif (dt.now() - self.run_data['launch-time']).total_seconds() <= 3:
-                            crash_info = get_latest_crash()
-
-                        # At last, check if there are problematic log events
-                        else:
-                            for log in reversed(self.run_data['log'][-50:]):
-                                log = log['text']
-
-                                if log[1] == "FATAL":
-                                    crash_info = get_latest_crash()
-                                    break
-
-                                elif (log[1] in ('ERROR', 'CRITICAL', 'WARN', 'SEVERE')) and (("crash report" in log[2].lower()) or
-                                                                                              ("a server is already running on that port" in log[2].lower()) or
-                                                                                              ("you need to agree to the eula" in log[2].lower()) or
-                                                                                              ("failed to start the minecraft server" in log[2].lower()) or
-                                                                                              ("encountered an unexpected exception" in log[2].lower())):
-                                    crash_info = get_latest_crash()
-                                    break
-
-
-                        # Log shutdown data
-                        if crash_info:
-                            self.run_data['log'].append({'text': (dt.now().strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11), 'INIT', f"'{self.name}' has stopped unexpectedly", (1,0.5,0.65,1))})
-                        else:
-                            self.run_data['log'].append({'text': (dt.now().strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11), 'INIT', f"'{self.name}' has stopped successfully", (0.7,0.7,0.7,1))})
-
-                        close = True
-
+                        crash_info = self._check_shutdown(error_list)
+                        self._run_process_hooks()
+                        self._run_close_hooks(crash_info)
+                        break
 
                     # Run process hooks
-                    for hook in self.run_data['process-hooks']:
-                        hook(self.run_data['log'])
-
-
-                    # Do things when server closes
-                    if close:
-
-                        for hook in self.run_data['close-hooks']:
-                            hook(crash_info)
-
-                        break
+                    self._run_process_hooks()
 
 
                 # Close server
@@ -1055,10 +731,15 @@ class ServerObject():
 
 
 
-            self.run_data['thread'] = Timer(0, process_thread)
-            self.run_data['thread'].daemon = True
-            self.run_data['thread'].start()
+            # Output is either read by a thread per server, or by the shared ProcessSupervisor
             self.run_data['launch-time'] = dt.now()
+            if isinstance(self.run_data['process'], SupervisedProcess):
+                self.run_data['thread'] = None
+                self.run_data['process'].supervise(self)
+            else:
+                self.run_data['thread'] = Timer(0, process_thread)
+                self.run_data['thread'].daemon = True
+                self.run_data['thread'].start()
 
             constants.server_manager.running_servers[self.name] = self
 
@@ -1097,6 +778,188 @@ class ServerObject():
             self.restart_flag = False
         return self.run_data
 
+    # Processes a single line of server output
+    def _process_line(self, line: bytes, error_list: list, legacy=False):
+        try:
+            # Append legacy errors to error list
+            if legacy and b"[STDERR] " in line:
+                error_list.append(line.decode().split("[STDERR] ")[1])
+                return
+
+            self.update_log(line)
+
+        except Exception as e:
+            if constants.debug:
+                print(f'Failed to process line: {e}')
+
+    # Sends the current log to every process hook
+    def _run_process_hooks(self):
+        for hook in self.run_data['process-hooks']:
+            hook(self.run_data['log'])
+
+    # Do things when server closes
+    def _run_close_hooks(self, crash_info=None):
+        for hook in self.run_data['close-hooks']:
+            hook(crash_info)
+
+    # Checks for a crash after the process closes, and logs shutdown data. Returns the crash log path if there was one
+    def _check_shutdown(self, error_list: list):
+        crash_info = None
+        if constants.version_check(self.version, '<', '1.7'):
+            log_file = os.path.join(self.server_path, 'server.log')
+        else:
+            log_file = os.path.join(self.server_path, 'logs', 'latest.log')
+
+        # Initially check for crashes
+        def get_latest_crash():
+            crash_log = None
+
+            # First, check if a recent crash-reports file exists
+            if constants.server_path(self.name, 'crash-reports'):
+                crash_log = sorted(glob(os.path.join(self.server_path, 'crash-reports', 'crash-*-server.*')), key=os.path.getmtime)
+                if crash_log:
+                    crash_log = crash_log[-1]
+                    if ((dt.now() - dt.fromtimestamp(os.path.getmtime(crash_log))).total_seconds() <= 30):
+                        crash_log = crash_log
+                    else:
+                        crash_log = None
+
+            # If crash report file does not exist, try to deduce what happened and make a new one
+            if not crash_log:
+
+                if constants.version_check(self.version, '<', '1.7'):
+                    error = ''.join(error_list)
+                else:
+                    output, error = self.run_data['process'].communicate()
+                    error = error.decode().replace('\r', '')
+                file = None
+
+
+                # If the log was modified recently, try and scrape error from there
+                use_error = True
+                if os.path.exists(log_file) and ((dt.now() - dt.fromtimestamp(os.path.getmtime(log_file))).total_seconds() <= 30):
+
+                    with open(log_file, 'r') as f:
+                        file = f.read()
+
+                        # If older log, split to the newest session
+                        if os.path.basename(log_file) == 'server.log':
+                            identifier = "[INFO] Starting minecraft server version"
+                            file = identifier + file.split(identifier)[-1]
+                            date = file.splitlines()[1].split(' [')[0]
+                            file = f"{date} {file}"
+
+                        # Iterate through log to find errors
+                        file_lines = file.splitlines()
+                        for x, log_line in enumerate(file_lines):
+                            if (("crash report" in log_line.lower()) or
+                            ("a server is already running on that port" in log_line.lower()) or
+                            ("failed to start the minecraft server" in log_line.lower()) or
+                            ("you need to agree to the eula" in log_line.lower()) or
+                            ("FATAL]" in log_line or "encountered an unexpected exception" in log_line.lower())):
+                                file = '\n'.join(file_lines[x:])
+                                use_error = False
+                                break
+
+                        # If file wasn't split, don't use it
+                        else:
+                            if not (error and use_error):
+                                file = None
+                                error = False
+                                return None
+
+
+                # Use STDERR if no exception was found
+                if error and use_error:
+                    file = error.replace('\r', '').strip()
+
+
+                # If the crash was located, write it to the log file
+                folder_path = os.path.join(self.server_path, 'crash-reports')
+                crash_log = os.path.join(folder_path, dt.now().strftime("crash-%Y-%m-%d_%H.%M.%S-server.txt"))
+                constants.folder_check(folder_path)
+
+                with open(crash_log, 'w+') as f:
+                    content = "---- Minecraft Crash Report ----\n"
+                    content += "// This report was generated by auto-mcs\n\n"
+                    content += f"Time: {dt.now().strftime(constants.fmt_date('%#m/%#d/%y, %#I:%M %p'))}\n"
+
+                    if file:
+                        if "a server is already running on that port" in file.lower():
+                            content += "Description: Networking conflict\n\n"
+                            file = f"A connection is already active on *:{self.port}. Change the 'server-port' parameter in 'server.properties', or close the conflicting connection."
+                        elif "you need to agree to the eula" in file.lower():
+                            content += "Description: License error\n\n"
+                            file = "You need to agree to the EULA in order to run the server. Go to 'eula.txt' for more info."
+                        else:
+                            content += "Description: Exception in server tick loop\n\n"
+                        content += file
+
+                    # If error was not found, generate generic error
+                    else:
+                        content += "Description: Unknown exception\n\n"
+                        content += f"Something went wrong launching '{self.name}': an unspecified error has occurred. To troubleshoot, try the following:\n"
+                        content += f" - Verify that the server isn't already running in another process\n"
+                        content += f" - Verify that 'EULA.txt' is set to true\n"
+                        if self.type.lower() != 'vanilla':
+                            content += f" - Disable all {'mods' if self.type.lower() in ('fabric', 'forge') else 'plugins'} in the Add-on Manager\n"
+                        content += f" - Try using a different world file\n"
+                        content += f" - Try a different server file with the 'Change server.jar' option in the Settings tab\n"
+                        content += f"     - If this error was caused after using 'Change server.jar', there's an automatic back-up of the previous version in the Back-up Manager"
+
+                    f.write(content)
+
+            self.crash_log = crash_log
+            return crash_log
+
+
+        # Check for crash if exit code is not 0
+        if self.run_data['process'].returncode != 0:
+
+            # Check for false positives
+            false_positive = False
+            if error_list:
+                joined_errors = '\n'.join(error_list)
+
+                if 'java.net.SocketException: socket closed' in joined_errors:
+                    false_positive = True
+
+                if 'Server will start in ' in joined_errors:
+                    false_positive = True
+
+            if not false_positive:
+                crash_info = get_latest_crash()
+
+        # If server closes within 3 seconds, something probably went wrong
+        elif (dt.now() - self.run_data['launch-time']).total_seconds() <= 3:
+            crash_info = get_latest_crash()
+
+        # At last, check if there are problematic log events
+        else:
+            for log in reversed(self.run_data['log'][-50:]):
+                log = log['text']
+
+                if log[1] == "FATAL":
+                    crash_info = get_latest_crash()
+                    break
+
+                elif (log[1] in ('ERROR', 'CRITICAL', 'WARN', 'SEVERE')) and (("crash report" in log[2].lower()) or
+                                                                              ("a server is already running on that port" in log[2].lower()) or
+                                                                              ("you need to agree to the eula" in log[2].lower()) or
+                                                                              ("failed to start the minecraft server" in log[2].lower()) or
+                                                                              ("encountered an unexpected exception" in log[2].lower())):
+                    crash_info = get_latest_crash()
+                    break
+
+
+        # Log shutdown data
+        if crash_info:
+            self.run_data['log'].append({'text': (dt.now().strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11), 'INIT', f"'{self.name}' has stopped unexpectedly", (1,0.5,0.65,1))})
+        else:
+            self.run_data['log'].append({'text': (dt.now().strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11), 'INIT', f"'{self.name}' has stopped successfully", (0.7,0.7,0.7,1))})
+
+        return crash_info
+
     # Kill server and delete running configuration
     def terminate(self):
 
@@ -1144,10 +1007,8 @@ class ServerObject():
 
 
         if not self.restart_flag:
-            # Delete log from memory (hopefully)
-            for item in self.run_data['log']:
-                self.run_data['log'].remove(item)
-                del item
+            # Delete log from memory
+            self.run_data['log'].clear()
 
             # Close ngrok if running
             try:
@@ -1222,28 +1083,37 @@ class ServerObject():
         ip = self.run_data['network']['private_ip']
         port = int(self.run_data['network']['address']['port'])
 
+        supervisor = constants.server_manager.supervisor
+        if supervisor:
+            supervisor.submit(supervisor._watch_deadlock(self, ip, port))
+            return
+
         def check(*a):
             while self.running and constants.check_port(ip, port):
                 time.sleep(1)
 
             # If after a delay the server is still running, it is likely deadlocked
             time.sleep(1)
-            if self.running and self.name not in constants.backup_lock:
-                try:
-                    # Delay if CPU usage is higher than expected
-                    if self.run_data['performance']['cpu'] > 0.5:
-                        time.sleep(15)
-                    message = f"'{self.name}' is deadlocked, please kill it above to continue..."
-                    if message != self.run_data['log'][-1]['text'][2]:
-                        self.send_log(message, 'warning')
-                    self.run_data['console-panel'].toggle_deadlock(True)
-                except:
-                    pass
+            self._report_deadlock()
 
         t = threading.Timer(0, check)
         t.daemon = True
         t.start()
 
+    # Shows a warning if the port closed, but the process is still running
+    def _report_deadlock(self):
+        if self.running and self.name not in constants.backup_lock:
+            try:
+                # Delay if CPU usage is higher than expected
+                if self.run_data['performance']['cpu'] > 0.5:
+                    time.sleep(15)
+                message = f"'{self.name}' is deadlocked, please kill it above to continue..."
+                if message != self.run_data['log'][-1]['text'][2]:
+                    self.send_log(message, 'warning')
+                self.run_data['console-panel'].toggle_deadlock(True)
+            except:
+                pass
+
 
     # Retrieves performance information
     def performance_stats(self, interval=0.5, update_players=False):
@@ -1341,6 +1211,20 @@ class ServerObject():
 
         return new_value
 
+    # Sets how many lines of console output are kept in memory
+    def set_log_size(self, value=800):
+        new_value = max(int(value), 1)
+        self.config_file = constants.server_config(self.name)
+        self.config_file.set("general", "consoleLines", str(new_value))
+        self.max_log_size = new_value
+        constants.server_config(self.name, self.config_file)
+
+        # Resize the current log if the server is running
+        if self.run_data and isinstance(self.run_data.get('log'), LogBuffer):
+            self.run_data['log'].resize(new_value)
+
+        return new_value
+
     # Sets automatic update configuration
     def enable_auto_update(self, enabled=True):
         new_value = str(enabled).lower()
@@ -1444,7 +1328,10 @@ class ServerObject():
                 self.send_log("Skipping back-up due to insufficient free space", 'error')
             else:
                 self.send_log(f"Saving a back-up of '{self.name}', please wait...", 'warning')
-                self.backup.save(ignore_running=True)
+
+                # Wait in the scheduler's queue, so servers closing together don't all back up at once
+                self.backup.queue(ignore_running=True).wait()
+                self.backup._update_data()
                 self.send_log("Back-up complete!", 'success')
             return True
 
@@ -1556,10 +1443,6 @@ class ServerObject():
                 if formatted_line != self.run_data['log'][-1] and formatted_line['text']:
                     self.run_data['log'].append(formatted_line)
 
-                    # Purge long ones
-                    if len(self.run_data['log']) > self.max_log_size:
-                        self.run_data['log'].pop(0)
-
         # Run process hooks
         for hook in self.run_data['process-hooks']:
             hook(self.run_data['log'])
@@ -1617,10 +1500,6 @@ class ServerObject():
                 if formatted_line not in self.run_data['log'] and formatted_line['text']:
                     self.run_data['log'].append(formatted_line)
 
-                    # Purge long ones
-                    if len(self.run_data['log']) > self.max_log_size:
-                        self.run_data['log'].pop(0)
-
         # Run process hooks
         for hook in self.run_data['process-hooks']:
             hook(self.run_data['log'])
@@ -1765,6 +1644,13 @@ class ServerManager():
         self.server_list = create_server_list()
         self.current_server = None
         self.running_servers = {}
+
+        # Optional single event loop for all running servers
+        self.supervisor = ProcessSupervisor() if constants.async_supervisor else None
+
+        # Queues back-ups from every server, and saves running servers on their "bkupInterval"
+        self.backup_scheduler = backup.BackupScheduler(constants.backup_concurrency, constants.backup_bandwidth * 1048576)
+        self.backup_scheduler.start_timer()
         print("[INFO] [auto-mcs] Server Manager initialized")
 
     # Refreshes self.server_list with current info
@@ -1842,6 +1728,554 @@ def escape_markup(text):
     return text.replace('&', '&amp;').replace('[', '&bl;').replace(']', '&br;')
 
 
+# ---------------------------------------------- Process Supervisor ----------------------------------------------------
+
+# Blocking pipe for SupervisedProcess, readline() takes the next line before it reaches update_log()
+# This keeps silent_command(_capture=...) working the same way it does with Popen
+class SupervisedPipe():
+
+    def __init__(self):
+        self._waiting = []
+        self._eof = False
+        self._lock = threading.Lock()
+
+    def readline(self):
+        waiter = Queue(1)
+        with self._lock:
+            if self._eof:
+                return b''
+            self._waiting.append(waiter)
+        return waiter.get()
+
+    # Called from the event loop, returns True if the line was taken by readline()
+    def _deliver(self, line: bytes):
+        with self._lock:
+            if not self._waiting:
+                return False
+            waiter = self._waiting.pop(0)
+        waiter.put(line)
+        return True
+
+    # Wakes up anything still waiting on output
+    def _close(self):
+        with self._lock:
+            self._eof = True
+            waiting, self._waiting = self._waiting, []
+        for waiter in waiting:
+            waiter.put(b'')
+
+
+# Thread-safe stdin for SupervisedProcess, writes are handed to the event loop
+class SupervisedStdin():
+
+    def __init__(self, loop, writer):
+        self._loop = loop
+        self._writer = writer
+
+    def write(self, data: bytes):
+        if self._writer.is_closing():
+            raise OSError('stdin is closed')
+        self._loop.call_soon_threadsafe(self._writer.write, data)
+
+    def flush(self):
+        pass
+
+
+# Popen-like handle for a server process owned by ProcessSupervisor
+class SupervisedProcess():
+
+    def __init__(self, supervisor, process):
+        self._supervisor = supervisor
+        self._process = process
+        self._stderr = bytearray()
+        self._closed = threading.Event()
+
+        self.pid = process.pid
+        self.stdin = SupervisedStdin(supervisor.loop, process.stdin)
+        self.stdout = SupervisedPipe()
+        self.stderr = SupervisedPipe()
+
+    @property
+    def returncode(self):
+        return self._process.returncode
+
+    def poll(self):
+        return self._process.returncode
+
+    def kill(self):
+        def kill(*a):
+            try:
+                self._process.kill()
+            except ProcessLookupError:
+                pass
+        self._supervisor.loop.call_soon_threadsafe(kill)
+
+    # Only called once the process has closed, returns (stdout, stderr) like Popen
+    def communicate(self, timeout=None):
+        self._closed.wait(timeout)
+        return b'', bytes(self._stderr)
+
+    # Starts reading output and dispatching it to server_obj
+    def supervise(self, server_obj):
+        self._supervisor.submit(self._supervisor._supervise(server_obj, self))
+
+
+# Processes a server's output off the event loop, in the order it was read
+# Lines can block (player joins resolve UUIDs and update the ACL), so a slow server can't stall the others
+class _LineWorker():
+
+    def __init__(self, loop, executor, server_obj, legacy: bool):
+        self._loop = loop
+        self._executor = executor
+        self._server_obj = server_obj
+        self._legacy = legacy
+        self._lines = deque()
+        self._lock = threading.Lock()
+        self._active = False
+        self._future = None
+        self.error_list = []
+
+    # Called from the event loop, only holds a thread while there are lines waiting
+    def put(self, line: bytes):
+        with self._lock:
+            self._lines.append(line)
+            if self._active:
+                return
+            self._active = True
+        self._future = self._loop.run_in_executor(self._executor, self._run)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._lines:
+                    self._active = False
+                    return
+                line = self._lines.popleft()
+
+            try:
+                self._server_obj._process_line(line, self.error_list, self._legacy)
+                self._server_obj._run_process_hooks()
+            except Exception as e:
+                if constants.debug:
+                    print(f'Failed to process output from "{self._server_obj.name}": {e}')
+
+    # Waits until every line has been processed
+    async def join(self):
+        if self._future:
+            await self._future
+
+
+# Owns every server process from a single asyncio event loop, instead of a reader thread per server
+# Enabled with "async-supervisor" in app-config.json
+class ProcessSupervisor():
+
+    # Lines longer than this are dropped instead of raising in the stream reader
+    line_limit = 2 ** 20
+
+    # Keep the end of STDERR for crash reports
+    stderr_limit = 2 ** 20
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._line_pool = ThreadPoolExecutor(thread_name_prefix='process-lines')
+        self._thread = threading.Thread(target=self._run_loop, name='process-supervisor', daemon=True)
+        self._thread.start()
+        print("[INFO] [auto-mcs] Process Supervisor initialized")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+
+        # Avoid a waiter thread per child process when pidfd is available
+        if constants.os_name == 'linux':
+            try:
+                watcher = asyncio.PidfdChildWatcher()
+                watcher.attach_loop(self.loop)
+                asyncio.set_child_watcher(watcher)
+            except Exception:
+                pass
+
+        self.loop.run_forever()
+
+    # Runs a coroutine on the supervisor loop from any thread
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    # Runs a blocking function on the supervisor's threads from any thread, instead of starting a Timer for each call
+    def run(self, func, *args):
+        self.loop.call_soon_threadsafe(self.loop.run_in_executor, None, func, *args)
+
+    # Launches script_content in the server directory, blocks until the process has started
+    def launch(self, server_obj, script_content: str):
+        return self.submit(self._launch(server_obj.server_path, script_content)).result()
+
+    async def _launch(self, cwd: str, script_content: str):
+        process = await asyncio.create_subprocess_shell(script_content, stdout=PIPE, stdin=PIPE, stderr=PIPE, cwd=cwd, limit=self.line_limit)
+        return SupervisedProcess(self, process)
+
+    # Collects the pipe that isn't being logged so it can't fill up and stall the server
+    async def _drain(self, stream, buffer=None):
+        while True:
+            data = await stream.read(65536)
+            if not data:
+                break
+            if buffer is not None:
+                buffer.extend(data)
+                if len(buffer) > self.stderr_limit:
+                    del buffer[:len(buffer) - self.stderr_limit]
+
+    # Replaces process_thread() in ServerObject.launch()
+    async def _supervise(self, server_obj, handle: SupervisedProcess):
+        legacy = constants.version_check(server_obj.version, '<', '1.7')
+        process = handle._process
+        if legacy:
+            stream, pipe = process.stderr, handle.stderr
+            drain = self.loop.create_task(self._drain(process.stdout))
+        else:
+            stream, pipe = process.stdout, handle.stdout
+            drain = self.loop.create_task(self._drain(process.stderr, handle._stderr))
+
+        # Only reading stays on the loop, parsing and hooks go to the worker
+        worker = _LineWorker(self.loop, self._line_pool, server_obj, legacy)
+        while server_obj.running:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                continue
+            if not line:
+                break
+
+            if not pipe._deliver(line):
+                worker.put(line)
+
+        pipe._close()
+        await process.wait()
+        await drain
+        await worker.join()
+        handle._closed.set()
+
+        # Crash detection and close hooks (like auto back-ups) can block, so keep them off the loop
+        await self.loop.run_in_executor(None, self._close, server_obj, worker.error_list)
+
+    @staticmethod
+    def _close(server_obj, error_list: list):
+        try:
+            crash_info = server_obj._check_shutdown(error_list)
+            server_obj._run_process_hooks()
+            server_obj._run_close_hooks(crash_info)
+        finally:
+            if constants.debug:
+                print(f'Terminating "{server_obj.name}"')
+            server_obj.terminate()
+
+    # Async version of the thread in ServerObject.check_for_deadlock()
+    async def _watch_deadlock(self, server_obj, ip: str, port: int):
+        async def port_open():
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), 120)
+            except (OSError, asyncio.TimeoutError):
+                return False
+            writer.close()
+            return True
+
+        while server_obj.running and await port_open():
+            await asyncio.sleep(1)
+
+        await asyncio.sleep(1)
+        await self.loop.run_in_executor(None, server_obj._report_deadlock)
+
+
+# ------------------------------------------------ Log Parsing ---------------------------------------------------------
+
+# Precompiled patterns for ServerObject.update_log(), these run against every line the server prints
+log_float_pattern = re.compile(r'(?P<ip>\b\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\b)|(?<=[ |\]|\(]|,)(?P<float>[-+]?\d+\.\d+)')
+log_color_pattern = re.compile(r'§.?', re.DOTALL)
+log_user_pattern = re.compile(r'\[(\/color|color=#?\w*).+?\]?')
+log_number_pattern = re.compile(r'\d+')
+log_death_exclude = {'joined', 'left', 'Killed', 'logged', 'disconnected', 'Made', 'UUID', 'achievement'}
+log_death_pattern = re.compile('|'.join(re.escape(phrase) for phrase in (
+    'slain',
+    'went up in flames',
+    'fell out of the world',
+    'drowned',
+    'killed by',
+    'blown up by',
+    'suffocated in',
+    ' lava',
+    'hit the ground too hard',
+    'fell ',
+    'to fall',
+    'walked into the danger zone',
+    'struck by lightning',
+    ' froze',
+    'shot by',
+    'pummeled by',
+    'fireballed by',
+    'obliterated by',
+    'to death',
+    'squished too much',
+    'squished by',
+    'withered away',
+    ' died',
+    'impaled by',
+    'was killed',
+    'left the confines of this world'
+)))
+
+# Level keywords are checked against the raw line in this order
+log_levels = (
+    ('WARN', 'warn'),
+    ('ERROR', 'error'),
+    ('CRITICAL', 'critical'),
+    ('SEVERE', 'severe'),
+    ('FATAL', 'fatal')
+)
+
+# tag --> (type_label, type_color)
+log_styles = {
+    'alias': ("EXEC", (1, 0.298, 0.6, 1)),
+    'command': ("EXEC", (1, 0.298, 0.6, 1)),
+    'chat': ("CHAT", (0.439, 0.839, 1, 1)),
+    'broadcast': ("CHAT", (0.439, 0.839, 1, 1)),
+    'death': ("CHAT", (0.439, 0.839, 1, 1)),
+    'start': ("START", (0.3, 1, 0.6, 1)),
+    'stop': ("STOP", (0.3, 1, 0.6, 1)),
+    'join': ("PLAYER", (0.953, 0.929, 0.38, 1)),
+    'leave': ("PLAYER", (0.953, 0.929, 0.38, 1)),
+    'warn': ("WARN", (1, 0.804, 0.42, 1)),
+    'error': ("ERROR", (1, 0.5, 0.65, 1)),
+    'critical': ("CRIT", (1, 0.5, 0.65, 1)),
+    'severe': ("SEVERE", (1, 0.5, 0.65, 1)),
+    'fatal': ("FATAL", (1, 0.5, 0.65, 1)),
+    'other': ("INFO", (0.6, 0.6, 1, 1))
+}
+
+
+# Timestamps repeat for every line printed in the same second, so cache the conversion
+@functools.lru_cache(maxsize=256)
+def format_log_time(date_str: str):
+    try:
+        return dt.strptime(date_str, "%H:%M:%S").strftime(constants.fmt_date("%#I:%M:%S %p")).rjust(11)
+    except ValueError:
+        return ''
+
+
+# Shortens long coordinates, but leaves IP addresses alone
+def _round_log_float(match):
+    float_str = match.group('float')
+    if float_str and len(float_str) > 5:
+        return str(round(float(float_str), 2))
+    return match.group(0)
+
+
+# Converts '§' color codes to Kivy markup
+def _format_log_color(match):
+    code = match.group(0)
+    if 'r' in code:
+        return '[/color]'
+    return f'[color={constants.color_table[code]}]'
+
+
+def format_log_colors(message: str):
+    if '§' not in message:
+        return message
+
+    try:
+        formatted, count = log_color_pattern.subn(_format_log_color, escape_markup(message))
+    except KeyError:
+        return message
+
+    if count % 2 == 1:
+        formatted += '[/color]'
+    return formatted
+
+
+# Splits a raw line into its timestamp and message
+# line, new_format --> (date_label, message, main_label), date_label is blank if it couldn't be parsed
+def parse_log_line(line: str, new_format=True):
+    date_label = ''
+
+    # New log formatting (latest.log)
+    if new_format:
+        message = line.split("]: ", 1)[-1].strip()
+        date_label = format_log_time(line.split("]", 1)[0].strip().replace("[", ""))
+
+    # Old log formatting (server.log)
+    else:
+        message = line.split("] ", 1)[-1].strip()
+        try:
+            date_label = format_log_time(line.split(" ", 1)[1].split("[", 1)[0].strip())
+        except IndexError:
+            pass
+
+    if '.' in message:
+        message = log_float_pattern.sub(_round_log_float, message)
+
+    if message.endswith("[m"):
+        message = message.replace("[m", "").strip()
+
+    message = format_log_colors(message)
+    main_label = message.strip()
+    message = message.replace('[Not Secure]', '').strip()
+
+    return date_label, message, main_label
+
+
+# Tags a parsed line in a single pass, order matters here since the checks overlap
+# 'alias', 'chat', 'broadcast', 'command', 'start', 'stop', 'join', 'leave', 'death', 'ignore', 'other', or a level from log_levels
+def classify_log_line(line: str, message: str, main_label: str, aliases=None):
+
+    if (message.startswith("<") and ">" in message) or "[Async Chat Thread" in line:
+        if aliases and '>' in message:
+            possible_command = message.split('>', 1)[1].strip().split(" ")[0].strip()
+            if possible_command in aliases:
+                return 'alias'
+        return 'chat'
+
+    if message.startswith("[Server]"):
+        return 'broadcast'
+
+    if "issued server command: " in message:
+        return 'command'
+
+    if "Done" in line and "For help," in line:
+        return 'start'
+
+    if "Stopping server" in line:
+        return 'stop'
+
+    if "logged in with entity id" in message:
+        return 'join'
+
+    if "lost connection: " in message:
+        return 'leave'
+
+    for keyword, tag in log_levels:
+        if keyword in line:
+            return tag
+
+    if main_label.endswith(' left the game') or main_label.endswith(' joined the game'):
+        return 'broadcast'
+
+    if " has the following entity data: {" in main_label or ("Teleported " in main_label and " to " in main_label):
+        return 'ignore'
+
+    if log_death_exclude.isdisjoint(main_label.split(" ")) and log_death_pattern.search(main_label):
+        return 'death'
+
+    return 'other'
+
+
+# Fixed-capacity ring buffer for run_data['log'], appending and purging the oldest line are both O(1)
+# Lines are stored as (date, type, log, color) tuples and handed out as {'text': line} like the console expects
+class LogBuffer():
+    __slots__ = ('capacity', 'total', '_lines', '_start', '_size', '_count')
+
+    def __init__(self, capacity=800, lines=()):
+        self.capacity = max(int(capacity), 1)
+
+        # Amount of lines ever appended, used by the console to find what's new
+        self.total = 0
+
+        self._lines = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+
+        # line --> occurrences, for O(1) duplicate checks
+        self._count = {}
+
+        for line in lines:
+            self.append(line)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        lines, start, capacity = self._lines, self._start, self.capacity
+        for x in range(self._size):
+            yield {'text': lines[(start + x) % capacity]}
+
+    def __reversed__(self):
+        lines, start, capacity = self._lines, self._start, self.capacity
+        for x in range(self._size - 1, -1, -1):
+            yield {'text': lines[(start + x) % capacity]}
+
+    def __contains__(self, item):
+        return self._unwrap(item) in self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [{'text': self._lines[(self._start + x) % self.capacity]} for x in range(*index.indices(self._size))]
+        return {'text': self._lines[self._position(index)]}
+
+    # Only used to replace lines in place, like progress bars
+    def __setitem__(self, index, item):
+        position = self._position(index)
+        self._discard(self._lines[position])
+        self._lines[position] = self._unwrap(item)
+        self._add(self._lines[position])
+
+    # Accepts either {'text': line} or the line tuple itself
+    @staticmethod
+    def _unwrap(item):
+        return item['text'] if isinstance(item, dict) else item
+
+    def _position(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('log index out of range')
+        return (self._start + index) % self.capacity
+
+    def _add(self, line):
+        self._count[line] = self._count.get(line, 0) + 1
+
+    def _discard(self, line):
+        count = self._count.get(line, 0) - 1
+        if count > 0:
+            self._count[line] = count
+        else:
+            self._count.pop(line, None)
+
+    def append(self, item):
+        line = self._unwrap(item)
+
+        # Overwrite the oldest line when full
+        if self._size == self.capacity:
+            self._discard(self._lines[self._start])
+            self._lines[self._start] = line
+            self._start = (self._start + 1) % self.capacity
+        else:
+            self._lines[(self._start + self._size) % self.capacity] = line
+            self._size += 1
+
+        self._add(line)
+        self.total += 1
+
+    def clear(self):
+        self._lines = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+        self._count = {}
+
+    # Changes capacity, keeping the newest lines
+    def resize(self, capacity: int):
+        lines = [line['text'] for line in self[-max(int(capacity), 1):]]
+        total = self.total
+        self.__init__(capacity, lines)
+        self.total = total
+
+    # Copy of the current lines for the console and amscript
+    def snapshot(self):
+        return self[:]
+
+    # Lines appended after self.total was equal to "total", or None if they were already purged
+    def since(self, total: int):
+        new = self.total - total
+        if new > self._size or new < 0:
+            return None
+        return self[self._size - new:] if new else []
+
+
 # ---------------------------------------------- Usage Examples --------------------------------------------------------
 
 # sm = ServerManager()
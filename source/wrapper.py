@@ -147,6 +147,13 @@ if __name__ == '__main__':
         try:
             with open(constants.global_conf, 'r') as f:
                 file_contents = constants.json.loads(f.read())
+                constants.async_supervisor = file_contents.get('async-supervisor', False)
+                constants.backup_workers = file_contents.get('backup-workers', 0)
+                constants.backup_concurrency = file_contents.get('backup-concurrency', 1)
+                constants.backup_bandwidth = file_contents.get('backup-bandwidth', 0)
+                constants.update_concurrency = file_contents.get('update-concurrency', 8)
+                constants.download_concurrency = file_contents.get('download-concurrency', 4)
+                constants.artifact_cache_size = file_contents.get('artifact-cache-size', 2048)
                 constants.geometry = file_contents['geometry']
                 constants.fullscreen = file_contents['fullscreen']
                 constants.locale = file_contents['locale']